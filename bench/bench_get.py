@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# time GETs of a large file, with and without sendfile()
+#
+# usage: bench_get.py <port> <mimetypes> [size-in-MB] [count]
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import time
+import shutil
+import httplib
+import tempfile
+import subprocess
+
+#-----------------------------------------------------------------------------
+# start a server, returning the process
+#-----------------------------------------------------------------------------
+def start_server(port, root, mimetypes, options):
+    slowebs = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "slowebs.py")
+    args    = [sys.executable, slowebs] + options + [str(port), root, mimetypes]
+
+    process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=open(os.devnull, "w"), stderr=subprocess.STDOUT)
+    time.sleep(1)
+    return process
+
+#-----------------------------------------------------------------------------
+# stop a server, returning the cpu seconds it used
+#-----------------------------------------------------------------------------
+def stop_server(process):
+    process.stdin.write("\n")
+    process.stdin.close()
+
+    (pid, status, usage) = os.wait4(process.pid, 0)
+    return usage.ru_utime + usage.ru_stime
+
+#-----------------------------------------------------------------------------
+# get the file count times, returning the elapsed seconds
+#-----------------------------------------------------------------------------
+def get_file(port, url, count):
+    start = time.time()
+
+    for index in range(count):
+        connection = httplib.HTTPConnection("localhost", port)
+        connection.request("GET", url)
+        response = connection.getresponse()
+        while response.read(1024 * 1024): pass
+        connection.close()
+
+    return time.time() - start
+
+#-----------------------------------------------------------------------------
+# main
+#-----------------------------------------------------------------------------
+if len(sys.argv) < 3:
+    print "usage: %s <port> <mimetypes> [size-in-MB] [count]" % sys.argv[0]
+    sys.exit()
+
+port      = int(sys.argv[1])
+mimetypes = sys.argv[2]
+size      = int(sys.argv[3]) if len(sys.argv) > 3 else 256
+count     = int(sys.argv[4]) if len(sys.argv) > 4 else 10
+
+root = tempfile.mkdtemp()
+try:
+    block = os.urandom(1024 * 1024)
+    ofile = open(os.path.join(root, "big.bin"), "wb")
+    for index in range(size): ofile.write(block)
+    ofile.close()
+
+    print "GET of a %d MB file, %d times" % (size, count)
+    for (name, options) in (("sendfile", []), ("streaming", ["--no-sendfile"])):
+        process = start_server(port, root, mimetypes, options)
+        elapsed = get_file(port, "/big.bin", count)
+        cpu     = stop_server(process)
+
+        print "   %-10s %7.1f MB/s   server cpu %6.2fs" % (name, size * count / elapsed, cpu)
+finally:
+    shutil.rmtree(root)
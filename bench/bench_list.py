@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# time directory listings of large synthetic directories
+#
+# usage: bench_list.py [--stat-delay MS] [--query QUERY] [--list-cache-bytes N]
+#                      [entries ...]
+#
+# --stat-delay       adds a delay to every stat, like a network or FUSE file
+#                    system
+# --query            is a query string to list with, like "limit=100&sort=size"
+# --list-cache-bytes times listings from a listing cache of this size, which
+#                    is filled by listing once first
+#
+# Each listing is run in a child process, so the peak resident memory it
+# reports is that of the one request.
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import time
+import shutil
+import resource
+import optparse
+import StringIO
+import tempfile
+import wsgiref.util
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import slowebs
+
+#-----------------------------------------------------------------------------
+# count the stat calls made
+#-----------------------------------------------------------------------------
+counts     = {}
+stat_delay = [0]
+
+def counted(name, function):
+    def wrapper(*args, **kwargs):
+        counts[name] = counts.get(name, 0) + 1
+        if stat_delay[0]: time.sleep(stat_delay[0])
+        return function(*args, **kwargs)
+    return wrapper
+
+for name in ["stat", "lstat"]:
+    setattr(os, name, counted(name, getattr(os, name)))
+
+#-----------------------------------------------------------------------------
+# run a request through the application, returning the status, body size
+# and seconds until the first data of the body
+#-----------------------------------------------------------------------------
+def request(method, path, headers={}, query=""):
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO":      path,
+        "QUERY_STRING":   query,
+        "wsgi.input":     StringIO.StringIO(""),
+    }
+    for (key, value) in headers.items():
+        environ["HTTP_" + key.upper().replace("-", "_")] = value
+
+    wsgiref.util.setup_testing_defaults(environ)
+
+    result = []
+    def start_response(status, headers):
+        result.append(status)
+
+    start = time.time()
+    first = None
+    size  = 0
+    body  = slowebs.app_main(environ, start_response)
+    for data in body:
+        if first is None: first = time.time() - start
+        size += len(data)
+    if hasattr(body, "close"): body.close()
+
+    return (result[0], size, first)
+
+#-----------------------------------------------------------------------------
+# run a function in a child process, returning its result and peak RSS in KB
+#-----------------------------------------------------------------------------
+def run_child(function):
+    (read_fd, write_fd) = os.pipe()
+
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        result = function()
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        os.write(write_fd, repr((result, max_rss)))
+        os._exit(0)
+
+    os.close(write_fd)
+    data = ""
+    while True:
+        chunk = os.read(read_fd, 4096)
+        if not chunk: break
+        data += chunk
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+
+    return eval(data)
+
+#-----------------------------------------------------------------------------
+# create a directory with the specified number of files and directories
+#-----------------------------------------------------------------------------
+def create_dir(dir_name, entries):
+    os.mkdir(dir_name)
+
+    for index in range(entries):
+        name = os.path.join(dir_name, "entry-%06d" % index)
+        if index % 10 == 0:
+            os.mkdir(name)
+        else:
+            ofile = open(name, "w")
+            ofile.write("x" * (index % 100))
+            ofile.close()
+
+#-----------------------------------------------------------------------------
+# main
+#-----------------------------------------------------------------------------
+opt_parser = optparse.OptionParser(usage="%prog [--stat-delay MS] [--query QUERY] [--list-cache-bytes N] [entries ...]")
+opt_parser.add_option("--stat-delay", type="float", default=0)
+opt_parser.add_option("--query", default="")
+opt_parser.add_option("--list-cache-bytes", type="int", default=0)
+(options, args) = opt_parser.parse_args()
+
+sizes = [int(arg) for arg in args] or [1000, 10000, 100000]
+
+root = tempfile.mkdtemp()
+try:
+    slowebs.global_root = root
+
+    print "%10s %-6s %10s %10s %12s %10s %10s" % ("entries", "format", "seconds", "first", "bytes", "stats", "max-rss-KB")
+    for size in sizes:
+        create_dir(os.path.join(root, str(size)), size)
+
+        for (format, accept) in [("json", "application/json"), ("html", "text/html"), ("cols", "application/vnd.slowebs.columns+json")]:
+            def run():
+                if options.list_cache_bytes:
+                    slowebs.global_list_cache = slowebs.Content_Cache(options.list_cache_bytes, options.list_cache_bytes)
+                    request("GET", "/%d/" % size, {"Accept": accept}, options.query)
+                    counts.clear()
+
+                stat_delay[0] = options.stat_delay / 1000
+
+                start = time.time()
+                (status, length, first) = request("GET", "/%d/" % size, {"Accept": accept}, options.query)
+                elapsed = time.time() - start
+
+                return (elapsed, first, length, sum(counts.values()))
+
+            ((elapsed, first, length, stats), max_rss) = run_child(run)
+            print "%10d %-6s %10.3f %10.3f %12d %10d %10d" % (size, format, elapsed, first, length, stats, max_rss)
+finally:
+    shutil.rmtree(root)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# time route dispatch as the route table grows
+#
+# usage: bench_routes.py [count] [routes ...]
+#
+# each table has the given number of extra GET routes ahead of the file
+# routes: half literal paths, half patterns under their own first segment.
+# "in order" tries every route in turn, as dispatch used to; "indexed" is the
+# server's Route_Table
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import slowebs
+
+#-----------------------------------------------------------------------------
+# build a route table with extra routes
+#-----------------------------------------------------------------------------
+def make_routes(extra):
+    def handler(environ, start_response, match): pass
+
+    routes = []
+    for index in range(extra / 2):
+        routes.append(["GET", r'^/api/v1/endpoint%d$' % index, handler])
+    for index in range(extra - extra / 2):
+        routes.append(["GET", r'^/service%d/items/(\d+)$' % index, handler])
+
+    return routes + slowebs.global_routes
+
+#-----------------------------------------------------------------------------
+# microseconds per call of find(method, path)
+#-----------------------------------------------------------------------------
+def time_find(find, method, path, count):
+    if not find(method, path): raise Exception("no route for %s %s" % (method, path))
+
+    start = time.time()
+    for index in xrange(count): find(method, path)
+    return (time.time() - start) * 1000000 / count
+
+#-----------------------------------------------------------------------------
+# main
+#-----------------------------------------------------------------------------
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+sizes = [int(arg) for arg in sys.argv[2:]] or [0, 10, 100, 1000]
+
+print "%-7s %-28s %10s %10s" % ("routes", "request", "in order", "indexed")
+for size in sizes:
+    table = slowebs.Route_Table(make_routes(size))
+
+    requests = [
+        ("GET",  "/dir/"),
+        ("GET",  "/dir/file.txt"),
+        ("PUT",  "/dir/file.txt"),
+    ]
+    if size > 1:
+        requests.append(("GET", "/api/v1/endpoint%d" % (size / 2 - 1)))
+        requests.append(("GET", "/service%d/items/42" % (size - size / 2 - 1)))
+
+    for (method, path) in requests:
+        in_order = time_find(table.find_in_order, method, path, count)
+        indexed  = time_find(table.find,          method, path, count)
+
+        print "%-7d %-28s %9.2fus %9.2fus" % (size, method + " " + path, in_order, indexed)
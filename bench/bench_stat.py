@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# count the file system calls made per request
+#
+# usage: bench_stat.py [count] [stat-delay-ms] [stat-cache]
+#
+# stat-delay-ms adds a delay to every stat, like a network or FUSE file system
+# stat-cache is none (the default), inotify or ttl, as for --stat-cache
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import time
+import shutil
+import StringIO
+import tempfile
+import wsgiref.util
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import slowebs
+
+#-----------------------------------------------------------------------------
+# wrap the os functions which hit the file system, counting calls
+#-----------------------------------------------------------------------------
+counts     = {}
+counting   = [True]
+stat_delay = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0
+
+def counted(name, function):
+    def wrapper(*args, **kwargs):
+        if counting[0]: counts[name] = counts.get(name, 0) + 1
+        if stat_delay and name.endswith("stat"): time.sleep(stat_delay)
+        return function(*args, **kwargs)
+    return wrapper
+
+for name in ["stat", "lstat", "fstat", "listdir", "open"]:
+    if hasattr(os, name): setattr(os, name, counted(name, getattr(os, name)))
+
+if hasattr(os, "scandir"): os.scandir = counted("scandir", os.scandir)
+
+slowebs.open = counted("open", open)
+
+#-----------------------------------------------------------------------------
+# run a request through the application, returning the status
+#-----------------------------------------------------------------------------
+def request(method, path, headers={}, body=""):
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO":      path,
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input":     StringIO.StringIO(body),
+    }
+    for (key, value) in headers.items():
+        environ["HTTP_" + key.upper().replace("-", "_")] = value
+
+    wsgiref.util.setup_testing_defaults(environ)
+
+    result = []
+    def start_response(status, headers):
+        result.append(status)
+
+    body = slowebs.app_main(environ, start_response)
+    for data in body: pass
+    if hasattr(body, "close"): body.close()
+
+    return result[0]
+
+#-----------------------------------------------------------------------------
+# main
+#-----------------------------------------------------------------------------
+count      = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+stat_cache = sys.argv[3] if len(sys.argv) > 3 else "none"
+
+root = tempfile.mkdtemp()
+try:
+    slowebs.global_root = root
+
+    if stat_cache != "none":
+        slowebs.global_stat_cache = slowebs.Stat_Cache(root, 1.0, stat_cache == "inotify")
+
+    ofile = open(os.path.join(root, "file.txt"), "w")
+    ofile.write("file contents")
+    ofile.close()
+
+    os.mkdir(os.path.join(root, "dir"))
+    for index in range(10):
+        ofile = open(os.path.join(root, "dir", "file-%d.txt" % index), "w")
+        ofile.write("x" * index)
+        ofile.close()
+
+    open(os.path.join(root, "put.txt"), "w").close()
+
+    # the If-Match header for a PUT is the client's business; don't count it
+    def put():
+        counting[0] = False
+        headers = {"If-Match": '"%s"' % slowebs.get_etag(os.path.join(root, "put.txt"))}
+        counting[0] = True
+
+        request("PUT", "/put.txt", headers, "contents")
+
+    tests = [
+        ("GET file",           lambda: request("GET",  "/file.txt")),
+        ("HEAD file",          lambda: request("HEAD", "/file.txt")),
+        ("GET 10 entry list",  lambda: request("GET",  "/dir/")),
+        ("PUT file",           put),
+    ]
+
+    print "%-20s %10s  %s" % ("request", "usec/req", "calls per request")
+    for (name, test) in tests:
+        counts.clear()
+
+        start = time.time()
+        for index in range(count): test()
+        elapsed = time.time() - start
+
+        calls = ", ".join(["%s %g" % (key, float(counts[key]) / count) for key in sorted(counts) if counts[key]])
+        print "%-20s %10.1f  %s" % (name, elapsed * 1000000 / count, calls)
+finally:
+    shutil.rmtree(root)
@@ -29,12 +29,35 @@ import re
 import sys
 import cgi
 import time
+import stat
+import errno
+import struct
+import fcntl
+import socket
 import urllib
+import urlparse
+import zlib
+import anydbm
+import hashlib
+import heapq
+import itertools
+import Queue
 import select
+import asyncore
+import base64
+import binascii
+import fnmatch
+import tempfile
+import StringIO
+import collections
+import ctypes
+import ctypes.util
+import email.utils
 import optparse
 import textwrap
+import threading
+import traceback
 import wsgiref.simple_server
-import wsgiref.util
 
 #-----------------------------------------------------------------------------
 # program constants
@@ -70,11 +93,51 @@ def help():
     print "%s %s" % (program_name, program_vers)
     print
     print "usage:"
-    print "   %s <port> <root> <mimetypes>" % program_name
+    print "   %s [options] <port> <root> <mimetypes>" % program_name
     print "where:"
     print "   <port>      is the tcp/ip port number to run the http server"
     print "   <root>      is the directory to serve as the root for the http server"
     print "   <mimetypes> is the apache2 compatible mime.types file"
+    print "options:"
+    print "   --workers N serve requests with a pool of N threads"
+    print "   --engine E  wsgiref (the default), or async to multiplex"
+    print "               connections on one thread, running requests on"
+    print "               the worker pool (4 threads unless --workers is set)"
+    print "   --block-size N  read and send files N bytes at a time (default 65536)"
+    print "   --no-sendfile   don't use the zero-copy sendfile() to send files"
+    print "   --cache-bytes N keep up to N bytes of recently read files in memory"
+    print "   --cache-max-file N  largest file to keep in the cache (default 262144)"
+    print "   --list-cache-bytes N  keep up to N bytes of recent directory listings"
+    print "                   in memory"
+    print "   --gzip          send compressible files gzip'ed to clients accepting it;"
+    print "                   a file's .gz sidecar is sent instead when it's as new"
+    print "   --gzip-cache-bytes N  keep up to N bytes of gzip'ed files in memory"
+    print "   --cache-rules F file of rules giving the Cache-Control header sent with"
+    print "                   files, by path glob, path regex or content type; files"
+    print "                   no rule matches are sent with no-cache"
+    print "   --etag E        what file ETags are made from: stat, the date and size"
+    print "                   (the default), or content, a digest of the contents"
+    print "   --etag-index F  keep the digests of files in F between runs, for"
+    print "                   --etag content"
+    print "   --elide-writes  leave a file as it is when a PUT sends the contents it"
+    print "                   already has"
+    print "   --stat-cache M  cache file sizes and dates: none (the default), inotify"
+    print "                   (dropped as inotify reports changes), or ttl"
+    print "   --stat-cache-ttl S  seconds a cached stat is used, for ttl, or when"
+    print "                   inotify isn't available (default 1)"
+    print "   --change-feed   send changes to files as server-sent events, to clients"
+    print "                   asking for text/event-stream; needs --workers or"
+    print "                   --engine async"
+    print "   --change-feed-window S  wait S seconds for more changes before sending"
+    print "                   them (default 0.2)"
+    print "   --max-body-bytes N  refuse request bodies larger than N bytes"
+    print "   --fsync F       what PUTs flush to disk before responding: none (the"
+    print "                   default), file, or dir, for the file and its directory"
+    print "   --keep-alive S  keep idle HTTP/1.1 connections open S seconds for another"
+    print "                   request (default 15; 0 closes after each request); needs"
+    print "                   --workers or --engine async"
+    print "   --max-requests N  close a connection after N requests (default 100;"
+    print "                   0 for no limit)"
     print
     print "%s is a Simple LOcal WEB Server, that will make a directory on" % program_name
     print "your file system available via http://localhost:<port>/"
@@ -112,6 +175,79 @@ def parse_mimetypes(fileName):
         
     return result
 
+#-----------------------------------------------------------------------------
+# parse a --cache-rules file
+#
+# Each line is a kind, a pattern and the Cache-Control value for the files
+# it matches:
+#
+#    regex  \.[0-9a-f]{8,}\.(js|css)$   public, max-age=31536000, immutable
+#    glob   /private/*                  no-store
+#    type   image/*                     max-age=3600
+#
+# glob patterns without a "/" match file names, other globs and regexes match
+# paths from the root, starting with "/", and type patterns match content
+# types. The first matching rule is used.
+#-----------------------------------------------------------------------------
+def parse_cache_rules(fileName):
+    if not os.path.exists(fileName): 
+        error("cache rules file %s not found" % fileName)
+    
+    file = open(fileName)
+    lines = file.readlines()
+    file.close()
+
+    result = []
+    for (line_number, line) in enumerate(lines):
+        line = line.strip()
+        if line == "": continue
+        if line.startswith("#"): continue
+
+        words = line.split(None, 2)
+        if len(words) < 3:
+            error("%s:%d: expecting a kind, a pattern and a Cache-Control value" % (fileName, line_number + 1))
+
+        (kind, pattern, value) = words
+        if kind == "regex":
+            try:
+                pattern = re.compile(pattern)
+            except re.error, e:
+                error("%s:%d: invalid regex: %s" % (fileName, line_number + 1, e))
+        elif kind not in ("glob", "type"):
+            error("%s:%d: kind should be glob, regex or type: %s" % (fileName, line_number + 1, kind))
+
+        result.append((kind, pattern, value))
+
+    return result
+
+#-----------------------------------------------------------------------------
+# the Cache-Control value for a file, from the --cache-rules
+#-----------------------------------------------------------------------------
+def get_cache_control(path, content_type):
+    for (kind, pattern, value) in global_cache_rules:
+        if kind == "regex":
+            if pattern.search(path): return value
+        elif kind == "type":
+            if fnmatch.fnmatchcase(content_type, pattern): return value
+        elif "/" in pattern:
+            if fnmatch.fnmatchcase(path, pattern): return value
+        else:
+            if fnmatch.fnmatchcase(path.rsplit("/", 1)[-1], pattern): return value
+
+    return "no-cache"
+
+#-----------------------------------------------------------------------------
+# True if a path, with its symbolic links resolved, is within the root
+#-----------------------------------------------------------------------------
+def is_under_root(name):
+    root = os.path.realpath(global_root)
+    return (name == root) or name.startswith(os.path.join(root, ""))
+
+#-----------------------------------------------------------------------------
+# the prefix of the temporary files PUTs write to; they're never served
+#-----------------------------------------------------------------------------
+temp_prefix = ".slowebs-tmp-"
+
 #-----------------------------------------------------------------------------
 # make sure the path is legal
 #-----------------------------------------------------------------------------
@@ -126,6 +262,7 @@ def path_check(path):
     for part in parts:
         if part == ".": return False
         if part == "..": return False
+        if part.startswith(temp_prefix): return False
             
     return True
 
@@ -152,10 +289,12 @@ def handler_status(environ, start_response, status, reason, extra_headers=None):
     
     status = '%d %s' % (status, reason.upper())
     headers = [('Content-type','text/plain')]
-    headers.append(("Cache-Control", "no-cache"))
     if extra_headers:
         for header in extra_headers:
             headers.append(header)
+
+    if not [name for (name, value) in headers if name.lower() == "cache-control"]:
+        headers.append(("Cache-Control", "no-cache"))
         
     start_response(status, headers)
     
@@ -167,7 +306,7 @@ def handler_status(environ, start_response, status, reason, extra_headers=None):
 def handler_ok(environ, start_response, etag):
     headers = []
     headers.append(('ETag', etag))
-    return handler_status(environ, start_response, 200, "OK")
+    return handler_status(environ, start_response, 200, "OK", headers)
 
 #-----------------------------------------------------------------------------
 # wsgi responder for 201
@@ -180,9 +319,10 @@ def handler_created(environ, start_response, etag):
 #-----------------------------------------------------------------------------
 # wsgi responder for 304
 #-----------------------------------------------------------------------------
-def handler_not_modified(environ, start_response, etag):
+def handler_not_modified(environ, start_response, etag, extra_headers=()):
     headers = []
     headers.append(('ETag', etag))
+    headers.extend(extra_headers)
     return handler_status(environ, start_response, 304, "Not modified", headers)
 
 #-----------------------------------------------------------------------------
@@ -217,6 +357,20 @@ def handler_forbidden(environ, start_response):
 def handler_precondition_failed(environ, start_response):
     return handler_status(environ, start_response, 412, "Precondition failed")
 
+#-----------------------------------------------------------------------------
+# wsgi responder for 416
+#-----------------------------------------------------------------------------
+def handler_range_not_satisfiable(environ, start_response, size):
+    headers = []
+    headers.append(("Content-Range", "bytes */%d" % size))
+    return handler_status(environ, start_response, 416, "Requested range not satisfiable", headers)
+
+#-----------------------------------------------------------------------------
+# wsgi responder for 413
+#-----------------------------------------------------------------------------
+def handler_request_entity_too_large(environ, start_response):
+    return handler_status(environ, start_response, 413, "Request entity too large")
+
 #-----------------------------------------------------------------------------
 # wsgi responder for 501
 #-----------------------------------------------------------------------------
@@ -250,421 +404,4041 @@ def get_preferred_content_type(available_types, accept_header):
 #-----------------------------------------------------------------------------
 # calculate the ETag
 #-----------------------------------------------------------------------------
-def get_etag(name):
-    if not os.path.exists(name): return None
+def get_etag(name, path_stat=None):
+    if path_stat is None: path_stat = Path_Stat(name)
+    if not path_stat.exists: return None
     
-    date = os.path.getmtime(name)
-    size = os.path.getsize(name)
-    return "%d-%d" % (date, size)
+    return "%d-%d" % (path_stat.mtime, path_stat.size)
 
 #-----------------------------------------------------------------------------
-# determine if the specified referer is our server
+# the quoted ETag of a file
+#
+# With --etag content, this is a digest of the file's contents.  A digest
+# that isn't known yet is computed if the file is no larger than max_size
+# (None for any size); otherwise the usual date and size are sent as a weak
+# ETag, until the digest is known.
 #-----------------------------------------------------------------------------
-def referer_is_self(referer):
-    if global_port == 80:
-        test = "http://localhost/"
-        if referer.find(test) == 0:
-            return True
+digest_max_sync_size = 1024 * 1024
 
-        test = "http://localhost"
-        if referer.find(test) == 0:
-            return True
+def get_file_etag(name, path_stat=None, max_size=digest_max_sync_size):
+    if path_stat is None: path_stat = Path_Stat(name)
+    if not path_stat.exists: return None
 
-    test = "http://localhost:%d/" % global_port
-    if referer.find(test) == 0:
-        return True
+    if not global_digest_index or path_stat.is_dir:
+        return '"%s"' % get_etag(name, path_stat)
 
-    test = "http://localhost:%d" % global_port
-    if referer.find(test) == 0:
-        return True
+    digest = global_digest_index.get(path_stat)
+    if (digest is None) and ((max_size is None) or (path_stat.size <= max_size)):
+        digest = digest_file(path_stat)
 
-    return False
+    if digest is None:
+        return 'W/"%s"' % get_etag(name, path_stat)
+
+    return '"%s"' % digest
 
 #-----------------------------------------------------------------------------
-# class describing file info
+# the entity tags in an If-Match or If-None-Match header, such as
+# '"a", W/"b"'; '*' is returned as it is
 #-----------------------------------------------------------------------------
-class File_Info:
+etag_pattern = re.compile(r'(?:W/)?"[^"]*"|\*')
 
-    def __init__(self, dir, name):
-        self.dir           = dir
-        self.name          = name
-        self.full_name     = os.path.join(dir,name)
-        self.qname          = urllib.quote(name)
-        self.exists         = os.path.exists(self.full_name)
+def parse_etags(header):
+    return etag_pattern.findall(header)
 
-        debug("File_Info(%s): %s" % (name, self.full_name))
+#-----------------------------------------------------------------------------
+# compare entity tags; weak comparison ignores W/, strong comparison fails
+# if either tag is weak
+#-----------------------------------------------------------------------------
+def etags_match(etag1, etag2, weak):
+    if weak:
+        if etag1.startswith("W/"): etag1 = etag1[2:]
+        if etag2.startswith("W/"): etag2 = etag2[2:]
+    elif etag1.startswith("W/") or etag2.startswith("W/"):
+        return False
 
-        if not self.exists: return
+    return etag1 == etag2
 
-        self.is_dir           = os.path.isdir(self.full_name)
-        self.size             = os.path.getsize(self.full_name)
-        self.size_print       = re.sub(r'(\d{3})(?=\d)', r'\1,', str(self.size)[::-1])[::-1]
-        self.date_ms_utc      = os.path.getmtime(self.full_name)
-        self.date_print_local = time.strftime("%Y/%m/%d %H:%M:%S", time.localtime(self.date_ms_utc))
-        self.date_rfc3339     = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.date_ms_utc))
+#-----------------------------------------------------------------------------
+# True if an If-Match or If-None-Match header matches a resource's ETag,
+# which is None if it doesn't exist
+#-----------------------------------------------------------------------------
+def etag_list_matches(header, etag, weak):
+    if etag is None: return False
 
-        # self.psize calculation from: http://code.activestate.com/recipes/498181/
+    for tag in parse_etags(header):
+        if tag == "*": return True
+        if etags_match(tag, etag, weak): return True
+
+    return False
 
 #-----------------------------------------------------------------------------
-# wsgi responder for redirect adding a / at the end of the URL
+# the time of an HTTP date, or None if it isn't one
 #-----------------------------------------------------------------------------
-def handler_redirect_with_slash(environ, start_response, match):
-    debug("handler_redirect_with_slash()")
-    
-    protocol = environ["wsgi.url_scheme"]
-    host     = environ["REMOTE_HOST"]
-    port     = environ["SERVER_PORT"]
-    path     = environ["PATH_INFO"]
-    verb     = environ["REQUEST_METHOD"]
-    
-    path = urllib.quote(path)
-    
-    if   protocol == "http"  and port == "80":  port = ""
-    elif protocol == "https" and port == "443": port = ""
-    else:                                       port = ":%s" % port
-    
-    url = "%s://%s%s%s/" % (protocol, host, port, path)
-    
-    return handler_temporary_redirect(environ, start_response, url)
+def parse_http_date(value):
+    date = email.utils.parsedate_tz(value)
+    if date is None: return None
+
+    try:
+        return email.utils.mktime_tz(date)
+    except (OverflowError, ValueError):
+        return None
 
 #-----------------------------------------------------------------------------
-# get a directory listing
+# evaluate a request's preconditions against a resource, in the order of
+# RFC 7232 section 6; etag is None if the resource doesn't exist, and mtime
+# None if it has no Last-Modified date.  Returns 412 or 304 if the request
+# shouldn't go ahead, else None.
+#
+# Last-Modified dates are in whole seconds, so that's how dates compare.
 #-----------------------------------------------------------------------------
-def handler_file_list(environ, start_response, match):
-    debug("handler_file_list()")
-    
-    dir_name = match.group(1)
-    dir_name = os.path.join(global_root, dir_name)
+def check_preconditions(environ, etag, mtime=None):
+    method = environ["REQUEST_METHOD"]
 
-    if not os.path.isdir(dir_name):
-        return handler_not_found(environ, start_response)
-    
-    available_types = ["application/json", "text/json", "text/html"]
-    accept_header = environ.get("HTTP_ACCEPT", "*/*")
-    content_type = get_preferred_content_type(available_types, accept_header)
+    if_match = environ.get("HTTP_IF_MATCH")
+    if if_match:
+        if not etag_list_matches(if_match, etag, False): return 412
 
-    useJSON = True
-    if content_type == "text/html": useJSON = False
-    
-    files = os.listdir(dir_name)
-    files.sort()
+    elif (etag is not None) and (mtime is not None):
+        date = parse_http_date(environ.get("HTTP_IF_UNMODIFIED_SINCE", ""))
+        if (date is not None) and (int(mtime) > date): return 412
 
-    # build array of files, each on is [name, isDir, mDate, size]
-    file_infos = []
-    for file in files:
-        if not path_check(file): continue
-        
-        file_infos.append(File_Info(dir_name, file))
-        
-    content = ""
-    if useJSON:
-        content = '{"dir": [\n'
-        for (index, file_info) in enumerate(file_infos):
-            is_dir = "false"
-            if file_info.is_dir: is_dir = "true"
-            content += "   { "
-            content +=   '"name": "%s"' % string_escape(file_info.qname)
-            content += ', "is_dir": %s'  % is_dir
-            content += ', "date_ms_utc": "%d"' % file_info.date_ms_utc
-            content += ', "date_print_local": "%s"' % file_info.date_print_local
-            content += ', "date_rfc3339": "%s"' % file_info.date_rfc3339
-            content += ', "size": %d' % file_info.size
-            content += "   } "
-            if index + 1 < len(file_infos): content += ","
-            content += "\n"
-        content += "]}\n"
-        
-    else:
-        header = textwrap.dedent('''\
-            <html>
-            <head>
-            <title>%s: %s</title>
-            <style>
-            .col-date { 
-                padding-left: 3em;
-            }
-            .col-size { 
-                padding-left: 3em;
-                text-align:   right;
-            }
-            tr:nth-child(odd) {
-                background: #DDD
-            }            
-            </style>
-            </head>
-            <body>
-            <h1>%s: %s</h1>
-            <table cellpadding=5 cellspacing=0>
-            ''' % (program_name, dir_name, program_name, dir_name))
-
-        trailer = textwrap.dedent('''\
-            </table>
-            </body>
-            </html>
-            ''')
-
-        content = header
-        for file_info in file_infos:
-            if file_info.is_dir:
-                name = "<a href='%s/'>%s/</a>"
-            else:
-                name = "<a href='%s'>%s</a>"
-                
-            name = name % (file_info.qname, file_info.name)
-                
-            content += "<tr><td>%s<td class='col-date'>%s<td class='col-size'>%s bytes" % (
-                name, file_info.date_print_local, file_info.size_print
-            )
+    if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+    if if_none_match:
+        if etag_list_matches(if_none_match, etag, True):
+            if method in ("GET", "HEAD"): return 304
+            return 412
 
-        content += trailer
-    
-    status = '200 OK'
-    headers = [('Content-type',content_type)]
-    headers.append(("Cache-Control", "no-cache"))
-    start_response(status, headers)
+    elif (etag is not None) and (mtime is not None) and (method in ("GET", "HEAD")):
+        date = parse_http_date(environ.get("HTTP_IF_MODIFIED_SINCE", ""))
+        if (date is not None) and (int(mtime) <= date): return 304
 
-    if environ["REQUEST_METHOD"] == "HEAD": return [""]
+    return None
 
-    return [content]
+#-----------------------------------------------------------------------------
+# the result of a single os.stat() of a path
+#
+# File systems can be slow to stat - network and FUSE file systems make a
+# round trip each time - so a request stats each path it uses once, and
+# passes the Path_Stat to anything needing to know about the path.
+#-----------------------------------------------------------------------------
+class Path_Stat:
+
+    def __init__(self, name, file_stat=None):
+        if file_stat is None: file_stat = stat_path(name)
+
+        self.name   = name
+        self.exists = file_stat is not None
+        self.is_dir = False
+        if not self.exists: return
+
+        self.is_dir = stat.S_ISDIR(file_stat.st_mode)
+        self.size   = file_stat.st_size
+        self.mtime  = file_stat.st_mtime
+        self.mode   = file_stat.st_mode
+        self.dev    = file_stat.st_dev
+        self.ino    = file_stat.st_ino
 
 #-----------------------------------------------------------------------------
-# read a file
+# get the Path_Stat for a path, made at most once per request
 #-----------------------------------------------------------------------------
-def handler_file_get(environ, start_response, match):
-    debug("handler_file_get()")
-    
-    file_name = match.group(1)
-    file_name = os.path.join(global_root, file_name)
-    
-    if not os.path.exists(file_name):
-        return handler_not_found(environ, start_response)
-    
-    if os.path.isdir(file_name):
-        return handler_redirect_with_slash(environ, start_response, match)
-        
-    # values may be '"foo-bar-baz"' or '*'
-    if_none_match = environ.get("HTTP_IF_NONE_MATCH")
-    
-    file_etag = '"%s"' % get_etag(file_name)
+def get_path_stat(environ, name):
+    path_stats = environ.setdefault("slowebs.path_stats", {})
 
-    if if_none_match and (if_none_match == file_etag):
-        return handler_not_modified(environ, start_response, file_etag)
-    
-    ext = os.path.splitext(file_name)[1]
-    if ext == "":
-        content_type = "application/octet-stream"
-    else:
-        ext = ext[1:].lower()
-        content_type = global_mimetypes.get(ext, "application/octet-stream")
-        
-    # // Mon, 17 Aug 2009 07:06:44 GMT
-    last_modified = os.path.getmtime(file_name)
-    last_modified = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(last_modified))
-    
-    status = '200 OK'
-    headers = []
-    headers.append(('Last-Modified',last_modified))
-    headers.append(('Content-type',content_type))
-    headers.append(("Cache-Control", "no-cache"))
-    headers.append(("ETag", file_etag))
-    start_response(status, headers)
-    
-    file = open(file_name)
-    
-    if environ["REQUEST_METHOD"] == "HEAD": return [""]
-    
-    return list(wsgiref.util.FileWrapper(file))
+    path_stat = path_stats.get(name)
+    if path_stat is None:
+        path_stat = path_stats[name] = Path_Stat(name)
+
+    return path_stat
 
 #-----------------------------------------------------------------------------
-# write a file
+# record a path's new Path_Stat for the request, after changing it
 #-----------------------------------------------------------------------------
-def handler_file_put(environ, start_response, match):
-    debug("handler_file_put()")
+def set_path_stat(environ, path_stat):
+    environ.setdefault("slowebs.path_stats", {})[path_stat.name] = path_stat
+
+#-----------------------------------------------------------------------------
+# stat a path, through the stat cache when there is one; None if missing
+#-----------------------------------------------------------------------------
+def stat_path(name):
+    if global_stat_cache: return global_stat_cache.stat(name)
 
-    content_length = environ.get("CONTENT_LENGTH", None)
-    if not content_length: 
-        return handler_bad_request(environ, start_response)
-        
     try:
-        content_length = int(content_length)
-    except:
-        return handler_bad_request(environ, start_response)
-    
-    # values may be '"foo-bar-baz"' or '*'
-    if_match      = environ.get("HTTP_IF_MATCH", None)
-    if_none_match = environ.get("HTTP_IF_NONE_MATCH", None)
-    
-#    print "handler_file_put():"
-#    print "   if_match:      %s" % if_match
-#    print "   if_none_match: %s" % if_none_match
+        return os.stat(name)
+    except OSError:
+        return None
 
-    if not if_match and not if_none_match:
-        return handler_precondition_failed(environ, start_response)
+#-----------------------------------------------------------------------------
+# linux inotify, through libc; None if it's not available
+#-----------------------------------------------------------------------------
+IN_MODIFY      = 0x00000002
+IN_ATTRIB      = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+IN_ONLYDIR     = 0x01000000
+IN_ISDIR       = 0x40000000
+IN_NONBLOCK    = os.O_NONBLOCK
+IN_CLOEXEC     = 0x00080000
 
-    if if_match and if_none_match:
-        return handler_precondition_failed(environ, start_response)
+inotify_mask = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+    IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
 
-    file_name = match.group(1)
-    file_name = os.path.join(global_root, file_name)
+inotify_event = struct.Struct("iIII")
 
-    dir_name = os.path.dirname(file_name)
-    if not os.path.exists(dir_name) or not os.path.isdir(dir_name):
-        return handler_not_found(environ, start_response)
-        
-    file_etag = get_etag(file_name)
-    if file_etag: file_etag = '"%s"' % file_etag
+class Inotify:
 
-    if not os.path.exists(file_name):
-        creating = True
-        if if_none_match == "*":
-            pass
-        else:
-            return handler_precondition_failed(environ, start_response)
+    def __init__(self, libc):
+        self.libc = libc
+        self.fd   = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0: raise self.error()
 
-    elif os.path.exists(file_name):
-        creating = False
-        if if_match == file_etag:
-            pass
-        else:
-            return handler_precondition_failed(environ, start_response)
-    
-    i_file = environ.get("wsgi.input", None)
-    if not i_file:
-        return handler_bad_request(environ, start_response)
-        
-    try:
-        o_file = file(file_name, "w")
-    except:
-        return handler_forbidden(environ, start_response)
-        
-    content = i_file.read(content_length)
-    o_file.write(content)
-        
-    i_file.close()
-    o_file.close()
+    def error(self):
+        code = ctypes.get_errno()
+        return OSError(code, os.strerror(code))
 
-    file_etag = '"%s"' % get_etag(file_name)
-        
-    if creating:
-        return handler_created(environ, start_response, file_etag)
-    else:
-        return handler_ok(environ, start_response, file_etag)
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, path, inotify_mask)
+        if wd < 0: raise self.error()
+        return wd
 
-#-----------------------------------------------------------------------------
-# main wsgi entry point - dispatch request based on route
-#-----------------------------------------------------------------------------
-def app_main(environ, start_response):
-    if not True: dump_environ(environ)
-    
-    path   = environ["PATH_INFO"]
-    method = environ["REQUEST_METHOD"]
-    
-    origin  = environ.get("HTTP_ORIGIN", None)
-    referer = environ.get("HTTP_REFERER", None)
-    
-    if origin:
-        if not referer_is_self(origin):
-            return handler_forbidden(environ, start_response)
+    def rm_watch(self, wd):
+        self.libc.inotify_rm_watch(self.fd, wd)
 
-    if referer:
-        if not referer_is_self(referer):
-            return handler_forbidden(environ, start_response)
+    # returns a list of (wd, mask, name) for the events waiting to be read
+    def read_events(self):
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except OSError, e:
+                if e.errno in (errno.EAGAIN, errno.EINTR): return events
+                raise
 
-    path = urllib.unquote(path)
-    if not path_check(path): 
-        return handler_not_found(environ, start_response)
-        
-    for (route_method, route_pattern, route_function) in global_routes:
-        if (route_method != "*") and (route_method != method): continue
+            offset = 0
+            while offset < len(data):
+                (wd, mask, cookie, length) = inotify_event.unpack_from(data, offset)
+                offset += inotify_event.size
+                name    = data[offset:offset + length].rstrip("\0")
+                offset += length
+
+                events.append((wd, mask, name))
 
-        match = route_pattern.match(path)
-        if match:
-            return route_function(environ, start_response, match)
+def find_inotify():
+    if not sys.platform.startswith("linux"): return None
 
-    return handler_not_implemented(environ, start_response)
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1
+        return Inotify(libc)
+    except (OSError, AttributeError):
+        return None
 
 #-----------------------------------------------------------------------------
-# routes for this application
+# a cache of os.stat() results for paths under the root, for --stat-cache
+#
+# With inotify, each cached path's directory is watched - a directory is
+# watched itself, anything else through its parent - along with the
+# directories above it, and entries are dropped when an event says the path,
+# or something above or below it, changed.  Events are
+# read before every lookup, so a change made before a request is never
+# missed.  A stat made while an event was being handled may already be out
+# of date, so it isn't kept.  Paths whose directory can't be watched, when
+# the watch limit is reached, or when there's no inotify, are cached for ttl
+# seconds instead.
+#
+# Events for a directory's entries also bump its Dir_Generations count, so
+# listing ETags change when a file in a directory changes behind our back.
 #-----------------------------------------------------------------------------
-global_routes = [
-    [ "HEAD",    r'^/?(.*)/$',        handler_file_list ],
-    [ "GET",     r'^/?(.*)/$',        handler_file_list ],
-    [ "HEAD",    r'^/?(.*)$',         handler_file_get ],
-    [ "GET",     r'^/?(.*)$',         handler_file_get ],
-    [ "PUT",     r'^/?(.*)$',         handler_file_put ],
-]
+stat_cache_max_entries = 100000
 
-global_routes = [
-    (method, re.compile(pattern), function) for 
-        (method, pattern, function) in global_routes
-]
+class Stat_Cache:
 
-#-----------------------------------------------------------------------------
-# main program
-#-----------------------------------------------------------------------------
+    def __init__(self, root, ttl, use_inotify=True):
+        self.root        = os.path.normpath(root)
+        self.ttl         = ttl
+        self.inotify     = find_inotify() if use_inotify else None
+        self.entries     = {}
+        self.watches     = {}
+        self.watch_paths = {}
+        self.generation  = 0
+        self.lock        = threading.Lock()
+        self.hits        = 0
+        self.misses      = 0
 
-#-----------------------------------------------------------------------------
-# parse options
-#-----------------------------------------------------------------------------
-opt_parser = optparse.OptionParser()
-(options, args) = opt_parser.parse_args()
+    # returns the os.stat() result for a path, or None if it doesn't exist
+    def stat(self, name):
+        name = os.path.normpath(name)
 
-if (len(args) < 3):
-    help()
-    
-global_port      = args[0]
-global_root      = args[1]
-global_mimetypes = args[2]
-
-try: 
-    global_port = int(global_port)
-except:
-    error("port argument was not numeric: %s" % global_port)
-    
-if (global_port <= 0) or (global_port >= 65536):
-    error("port argument should be between 1 and 65545")
+        with self.lock:
+            self.read_events()
 
-if not os.path.exists(global_root):
-    error("root directory does not exist: %s" % global_root)
+            entry = self.entries.get(name)
+            if entry and ((entry[1] is None) or (entry[1] > time.time())):
+                self.hits += 1
+                return entry[0]
 
-if not os.path.isdir(global_root):
-    error("root directory is actually a file: %s" % global_root)
-    
-global_root = os.path.abspath(global_root)
+            self.misses += 1
+            generation = self.generation
 
-global_mimetypes = parse_mimetypes(global_mimetypes)
+        file_stat = self.os_stat(name)
 
-#-----------------------------------------------------------------------------
-# create the server, print some help
-#-----------------------------------------------------------------------------
-global_httpd = wsgiref.simple_server.make_server('localhost', global_port, app_main)
+        # a link's target may be anywhere, and changes to it have no event
+        # here, so its entry expires instead
+        if os.path.islink(name):
+            watched = False
 
-print "Serving HTTP for root %s as http://localhost:%d/" % (global_root, global_port)
-print "Press Enter to stop the server."
-print
+        else:
+            if (file_stat is not None) and stat.S_ISDIR(file_stat.st_mode):
+                watch_name = name
+            else:
+                watch_name = os.path.dirname(name)
 
-#-----------------------------------------------------------------------------
-# process server requests in a loop, waiting also for stdin input
-# note: I don't think this works on windows
-#-----------------------------------------------------------------------------
-h_stdin = sys.stdin.fileno()
-h_httpd = global_httpd.fileno()
-while True:
-    test_handles = [h_stdin, h_httpd]
-    
-    (ready_read, ready_write, ready_error) = select.select(test_handles, [], test_handles)
-    
-    if ready_error:
-        print
-        if h_stdin in ready_error: print "Error reading stdin."
-        if h_httpd in ready_error: print "Error reading socket."
-        sys.exit()
-        
-    if h_stdin in ready_read:
-        os.close(h_httpd)
-        print "Shutting down."
-        sys.stdin.readline()
-        sys.exit()
+            (watched, added) = self.watch(watch_name)
+            if watched is None: return file_stat
+
+            # a change made before the watch was added has no event
+            if added:
+                file_stat = self.os_stat(name)
+                is_dir    = (file_stat is not None) and stat.S_ISDIR(file_stat.st_mode)
+                if is_dir != (watch_name == name): return file_stat
+
+        expires = None
+        if not watched: expires = time.time() + self.ttl
+
+        with self.lock:
+            self.read_events()
+            if self.generation != generation: return file_stat
+
+            if len(self.entries) >= stat_cache_max_entries: self.entries.clear()
+            self.entries[name] = (file_stat, expires)
+
+        return file_stat
+
+    def os_stat(self, name):
+        try:
+            return os.stat(name)
+        except OSError:
+            return None
+
+    # watch a directory, and the directories above it up to the root, which
+    # see it being moved or deleted.  Returns (watched, added): watched is
+    # True if they're watched, False if entries should expire, None if they
+    # shouldn't be cached
+    def watch(self, dir_name):
+        if not self.inotify: return (False, False)
+
+        dir_names = [dir_name]
+        while (dir_name != self.root) and dir_name.startswith(self.root):
+            dir_name = os.path.dirname(dir_name)
+            dir_names.append(dir_name)
+
+        added = False
+        with self.lock:
+            for dir_name in reversed(dir_names):
+                if dir_name in self.watches: continue
+
+                try:
+                    wd = self.inotify.add_watch(dir_name)
+                except OSError, e:
+                    if e.errno == errno.ENOSPC: return (False, added)
+                    return (None, added)
+
+                self.watches[dir_name] = wd
+                self.watch_paths.setdefault(wd, set()).add(dir_name)
+                added = True
+
+        return (True, added)
+
+    # drop a path's entry, after changing it
+    def invalidate(self, name):
+        with self.lock:
+            self.drop(os.path.normpath(name))
+            self.generation += 1
+
+    # handle inotify events; called with the lock held
+    def read_events(self):
+        if not self.inotify: return
+
+        events = self.inotify.read_events()
+        if not events: return
+
+        self.generation += 1
+
+        for (wd, mask, name) in events:
+            if mask & IN_Q_OVERFLOW:
+                self.entries.clear()
+                for dir_name in self.watches: dir_generations.bump(dir_name)
+                continue
+
+            for dir_name in list(self.watch_paths.get(wd, ())):
+                if not name:
+                    self.drop(dir_name, mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED))
+                    if mask & (IN_DELETE_SELF | IN_MOVE_SELF): self.unwatch(dir_name, True)
+                    if mask & IN_IGNORED: self.unwatch(dir_name, False)
+                    continue
+
+                path  = os.path.join(dir_name, name)
+                moved = mask & IN_ISDIR and mask & (IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_CREATE)
+
+                self.drop(path, moved)
+                self.drop(dir_name)
+                if moved: self.unwatch(path, True)
+
+                dir_generations.bump(dir_name)
+
+    # drop a path's entry, and optionally the entries below it
+    def drop(self, name, tree=False):
+        self.entries.pop(name, None)
+        if not tree: return
+
+        prefix = name + os.sep
+        for key in [key for key in self.entries if key.startswith(prefix)]:
+            del self.entries[key]
+
+    # stop watching a directory, and optionally the directories below it
+    def unwatch(self, dir_name, tree):
+        prefix = dir_name + os.sep
+        for path in self.watches.keys():
+            if (path != dir_name) and not (tree and path.startswith(prefix)): continue
+
+            wd    = self.watches.pop(path)
+            paths = self.watch_paths.get(wd, set())
+            paths.discard(path)
+            if paths: continue
+
+            self.watch_paths.pop(wd, None)
+            self.inotify.rm_watch(wd)
+
+    def stats(self):
+        with self.lock:
+            return "%d hits, %d misses, %d entries, %d watches%s" % (
+                self.hits, self.misses, len(self.entries), len(self.watches),
+                "" if self.inotify else " (no inotify; %gs ttl)" % self.ttl
+            )
+
+#-----------------------------------------------------------------------------
+# a journal of changes to the files under the root, for --change-feed
+#
+# Every directory under the root is watched with inotify, by a thread of its
+# own.  An event only says which path to look at: the path is stat'ed and
+# compared with an index of every file's ETag, so a change is reported once,
+# as created, modified or deleted, with the ETag a GET would return.
+# Directories are reported when they're created or deleted; a new directory
+# is walked, since files may have been written in it before it was watched.
+# Changes are numbered, and the last change_feed_journal of them are kept
+# for clients to read, or to catch up on when they reconnect.
+#-----------------------------------------------------------------------------
+change_feed_journal   = 10000           # changes kept for clients to catch up on
+change_feed_heartbeat = 15              # seconds between comments on a quiet feed
+
+class Change_Feed:
+
+    # window is how long to wait for more changes before sending them;
+    # max_clients, if not 0, limits the feeds served at once
+    def __init__(self, root, window, max_clients):
+        self.root        = root
+        self.window      = window
+        self.max_clients = max_clients
+        self.inotify     = find_inotify()
+        self.token       = dir_generations.token
+        self.index       = {}
+        self.watches     = {}
+        self.watch_limit = False
+        self.journal     = collections.deque(maxlen=change_feed_journal)
+        self.seq         = 0
+        self.clients     = 0
+        self.listeners   = []
+        self.running     = True
+        self.cond        = threading.Condition()
+
+    # index and watch the tree, then watch for changes on a thread
+    def start(self):
+        if not self.inotify: raise OSError(errno.ENOSYS, "inotify is not available")
+
+        self.add_tree("", False)
+
+        thread = threading.Thread(target=self.run, name="change-feed")
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def run(self):
+        while self.running:
+            (ready, _, _) = select.select([self.inotify.fd], [], [], 1)
+            if not ready: continue
+
+            for (wd, mask, name) in self.inotify.read_events():
+                self.handle_event(wd, mask, name)
+
+    def handle_event(self, wd, mask, name):
+        # events were lost, so clients have to start over
+        if mask & IN_Q_OVERFLOW:
+            self.index = {}
+            self.add_tree("", False)
+            self.add_change("reset", "", True, None)
+            return
+
+        dir_path = self.watches.get(wd)
+        if dir_path is None: return
+
+        if mask & IN_IGNORED:
+            del self.watches[wd]
+            return
+
+        # a directory's own events are reported by its parent's watch
+        if not name: return
+
+        path = join_path(dir_path, name)
+        if path_check(path): self.check(path)
+
+    # look at a path again, reporting any change
+    def check(self, path):
+        path_stat = self.get_path_stat(path)
+
+        if not path_stat:
+            if path in self.index: self.remove(path)
+            return
+
+        if self.update(path, path_stat):
+            self.add_tree(path, True)
+
+    # stat a path afresh, not through the stat cache; None if it's missing
+    def get_path_stat(self, path):
+        name = os.path.join(self.root, path)
+        try:
+            return Path_Stat(name, os.stat(name))
+        except OSError:
+            return None
+
+    # record a path's Path_Stat, reporting a change if reporting; returns
+    # True for a new directory, which should be walked
+    def update(self, path, path_stat, report=True):
+        # files found while indexing use the digests already known
+        etag = None
+        if not path_stat.is_dir:
+            max_size = 0
+            if report: max_size = digest_max_sync_size
+            etag = get_file_etag(path_stat.name, path_stat, max_size)
+
+        known = path in self.index
+        if known and ((self.index[path] is None) != (etag is None)):
+            self.remove(path)
+            known = False
+
+        if known and (self.index[path] == etag): return False
+
+        self.index[path] = etag
+        if report:
+            if known: self.add_change("modified", path, False, etag)
+            else:     self.add_change("created",  path, etag is None, etag)
+
+        return (etag is None) and not os.path.islink(path_stat.name)
+
+    # forget a deleted path, and the tree below it
+    def remove(self, path):
+        prefix = path + "/"
+
+        if self.index.pop(path) is None:
+            for key in sorted((key for key in self.index if key.startswith(prefix)), reverse=True):
+                self.add_change("deleted", key, self.index.pop(key) is None, None)
+
+            for (wd, dir_path) in self.watches.items():
+                if (dir_path == path) or dir_path.startswith(prefix):
+                    self.inotify.rm_watch(wd)
+                    del self.watches[wd]
+
+            self.add_change("deleted", path, True, None)
+        else:
+            self.add_change("deleted", path, False, None)
+
+    # watch a directory and the directories below it, recording their entries
+    def add_tree(self, path, report):
+        stack = [path]
+        while stack:
+            dir_path = stack.pop()
+            dir_name = os.path.join(self.root, dir_path)
+
+            try:
+                self.watches[self.inotify.add_watch(dir_name)] = dir_path
+            except OSError, e:
+                if (e.errno == errno.ENOSPC) and not self.watch_limit:
+                    log("inotify watch limit reached; changes below %s won't be reported" % dir_name)
+                    self.watch_limit = True
+                continue
+
+            try:
+                names = os.listdir(dir_name)
+            except OSError:
+                continue
+
+            for name in sorted(names):
+                sub_path = join_path(dir_path, name)
+                if not path_check(sub_path): continue
+
+                path_stat = self.get_path_stat(sub_path)
+                if not path_stat: continue
+
+                if self.update(sub_path, path_stat, report): stack.append(sub_path)
+
+    def add_change(self, kind, path, is_dir, etag):
+        with self.cond:
+            self.seq += 1
+            self.journal.append((self.seq, kind, path, is_dir, etag))
+            self.cond.notify_all()
+
+        for listener in self.listeners: listener()
+
+    # have a function called, on the feed's thread, after each change
+    def add_listener(self, function):
+        self.listeners.append(function)
+
+    # a client starts reading the feed; returns the number of the last change
+    # it has seen, and the first event to send it
+    def open_client(self, last_id):
+        with self.cond:
+            self.clients += 1
+
+            seq  = None
+            kind = "ready"
+            if last_id:
+                seq = self.get_resume_seq(last_id)
+                if seq is None: kind = "reset"
+
+            if seq is None: seq = self.seq
+
+        return (seq, self.format_event(seq, kind, "", True, None))
+
+    def close_client(self):
+        with self.cond:
+            self.clients -= 1
+
+    # the number of the last change a client saw, from its last event id;
+    # None if the changes after it aren't in the journal any more
+    def get_resume_seq(self, last_id):
+        (token, sep, seq) = last_id.rpartition("-")
+        if (token != self.token) or not seq.isdigit(): return None
+
+        seq = int(seq)
+        if seq > self.seq: return None
+        if self.journal and (seq < self.journal[0][0] - 1): return None
+
+        return seq
+
+    # wait for changes after seq, then for window seconds more; returns the
+    # changes, [] after timeout seconds without any, or None when stopping or
+    # once client_closed() says the client has gone
+    def wait(self, seq, timeout, client_closed=None):
+        with self.cond:
+            limit = time.time() + timeout
+            while self.running and (self.seq <= seq):
+                wait = limit - time.time()
+                if wait <= 0: return []
+                self.cond.wait(min(wait, 1))
+
+                if client_closed and client_closed(): return None
+
+        if self.window: time.sleep(self.window)
+
+        with self.cond:
+            if not self.running: return None
+
+        return self.get_changes(seq)
+
+    # the changes after seq, or a reset if they aren't all in the journal
+    def get_changes(self, seq):
+        with self.cond:
+            if self.seq <= seq: return []
+
+            first = self.journal[0][0]
+            if first > seq + 1: return [(self.seq, "reset", "", True, None)]
+
+            return list(itertools.islice(self.journal, seq + 1 - first, None))
+
+    # the events for the changes below a directory, with the number of the
+    # last change; "" if none of them are below it
+    def format_changes(self, changes, dir_path):
+        seq = changes[-1][0]
+
+        events = []
+        for change in coalesce_changes(changes):
+            (change_seq, kind, path, is_dir, etag) = change
+
+            if kind == "reset":
+                return (seq, self.format_event(seq, kind, "", True, None))
+
+            if dir_path:
+                if path == dir_path:                  path = ""
+                elif path.startswith(dir_path + "/"): path = path[len(dir_path) + 1:]
+                else:                                 continue
+
+            events.append(self.format_event(change_seq, kind, path, is_dir, etag))
+
+        return (seq, "".join(events))
+
+    # generate server-sent events for the changes below a directory, after
+    # the change last_id was sent with, if given and still in the journal;
+    # the client holds the thread reading this until it goes
+    def feed(self, dir_path, last_id, client_closed=None):
+        (seq, event) = self.open_client(last_id)
+        try:
+            yield event
+
+            while True:
+                changes = self.wait(seq, change_feed_heartbeat, client_closed)
+                if changes is None: return
+
+                if not changes:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                (seq, events) = self.format_changes(changes, dir_path)
+                if events: yield events
+        finally:
+            self.close_client()
+
+    def format_event(self, seq, kind, path, is_dir, etag):
+        data = '{"type": "%s", "path": "%s", "is_dir": %s, "etag": %s}' % (
+            kind,
+            string_escape(urllib.quote(path)),
+            is_dir and "true" or "false",
+            etag and ('"%s"' % string_escape(etag)) or "null"
+        )
+
+        return "id: %s-%d\nevent: %s\ndata: %s\n\n" % (self.token, seq, kind, data)
+
+#-----------------------------------------------------------------------------
+# join a path relative to the root, which is "", with a name
+#-----------------------------------------------------------------------------
+def join_path(dir_path, name):
+    if not dir_path: return name
+    return dir_path + "/" + name
+
+#-----------------------------------------------------------------------------
+# merge the changes to each path into one, ordered by the last change
+#
+# A path created and then deleted never existed, as far as a client is
+# concerned; one deleted and then created again was modified.
+#-----------------------------------------------------------------------------
+def coalesce_changes(changes):
+    merged = {}
+    for change in changes:
+        path = change[2]
+        first_kind = merged[path][0] if path in merged else change[1]
+        merged[path] = (first_kind, change)
+
+    result = []
+    for (first_kind, (seq, kind, path, is_dir, etag)) in merged.values():
+        if first_kind == "created":
+            if kind == "deleted": continue
+            kind = "created"
+        elif kind == "created":
+            kind = "modified"
+        elif (first_kind == "deleted") and (kind != "deleted"):
+            kind = "modified"
+
+        result.append((seq, kind, path, is_dir, etag))
+
+    result.sort()
+    return result
+
+#-----------------------------------------------------------------------------
+# parse a Range header value into a list of (first, last) byte positions
+# returns None if the header should be ignored, [] if no range is satisfiable
+#-----------------------------------------------------------------------------
+max_ranges = 100
+
+def parse_range(range_header, size):
+    (unit, sep, specs) = range_header.partition("=")
+    if not sep or (unit.strip().lower() != "bytes"): return None
+
+    specs = [spec.strip() for spec in specs.split(",") if spec.strip()]
+    if not specs or (len(specs) > max_ranges): return None
+
+    ranges = []
+    for spec in specs:
+        (first, sep, last) = spec.partition("-")
+        if not sep: return None
+
+        try:
+            if first == "":
+                length = int(last)
+                if length <= 0: continue
+
+                first = max(0, size - length)
+                last  = size - 1
+            else:
+                first = int(first)
+                if last == "":
+                    last = size - 1
+                else:
+                    last = int(last)
+
+                if (first < 0) or (last < first): return None
+                last = min(last, size - 1)
+        except ValueError:
+            return None
+
+        if first >= size: continue
+
+        ranges.append((first, last))
+
+    return ranges
+
+#-----------------------------------------------------------------------------
+# get the ranges requested for a file, taking If-Range into account
+#-----------------------------------------------------------------------------
+def get_ranges(environ, size, etag, last_modified):
+    range_header = environ.get("HTTP_RANGE")
+    if not range_header: return None
+
+    # If-Range is a strong ETag or an exact Last-Modified date
+    if_range = environ.get("HTTP_IF_RANGE")
+    if if_range:
+        if_range = if_range.strip()
+        if if_range.startswith("W/"):
+            return None
+        elif if_range.startswith('"'):
+            if if_range != etag: return None
+        elif if_range != last_modified:
+            return None
+
+    return parse_range(range_header, size)
+
+#-----------------------------------------------------------------------------
+# determine if the specified referer is our server
+#-----------------------------------------------------------------------------
+def referer_is_self(referer):
+    if global_port == 80:
+        test = "http://localhost/"
+        if referer.find(test) == 0:
+            return True
+
+        test = "http://localhost"
+        if referer.find(test) == 0:
+            return True
+
+    test = "http://localhost:%d/" % global_port
+    if referer.find(test) == 0:
+        return True
+
+    test = "http://localhost:%d" % global_port
+    if referer.find(test) == 0:
+        return True
+
+    return False
+
+#-----------------------------------------------------------------------------
+# class describing file info
+#
+# Listings can hold a File_Info for every entry of a large directory, so
+# instances only keep the stat values they need, in __slots__, and strings
+# derived from them are formatted when used, not when the entry is read.
+#-----------------------------------------------------------------------------
+class File_Info(object):
+
+    __slots__ = ["dir", "name", "exists", "is_dir", "size", "date_ms_utc"]
+
+    # file_stat is the os.stat() result for the file, if already known
+    def __init__(self, dir, name, file_stat=None):
+        self.dir           = dir
+        self.name          = name
+
+        debug("File_Info(%s)" % name)
+
+        if file_stat is None: file_stat = stat_path(self.full_name)
+
+        self.exists = file_stat is not None
+        self.is_dir = False
+        if not self.exists: return
+
+        self.is_dir      = stat.S_ISDIR(file_stat.st_mode)
+        self.size        = file_stat.st_size
+        self.date_ms_utc = file_stat.st_mtime
+
+    @property
+    def full_name(self):
+        return os.path.join(self.dir, self.name)
+
+    @property
+    def qname(self):
+        return urllib.quote(self.name)
+
+    # self.psize calculation from: http://code.activestate.com/recipes/498181/
+    @property
+    def size_print(self):
+        return re.sub(r'(\d{3})(?=\d)', r'\1,', str(self.size)[::-1])[::-1]
+
+    @property
+    def date_print_local(self):
+        return time.strftime("%Y/%m/%d %H:%M:%S", time.localtime(self.date_ms_utc))
+
+    @property
+    def date_rfc3339(self):
+        return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.date_ms_utc))
+
+#-----------------------------------------------------------------------------
+# find a scandir(), which reads each entry's type along with its name
+#-----------------------------------------------------------------------------
+def find_scandir():
+    if hasattr(os, "scandir"): return os.scandir
+
+    try:
+        import scandir
+        return scandir.scandir
+    except ImportError:
+        return None
+
+scandir = find_scandir()
+
+#-----------------------------------------------------------------------------
+# generate a File_Info for each legal entry in a directory, sorted by name
+#
+# The directory is read right away, so errors reading it are raised here;
+# each entry is stat'ed once, as it is generated.  With scandir(), that stat
+# is free on Windows, and entries of unknown type are never stat'ed twice.
+# Entries which can't be stat'ed, like dangling symlinks, are skipped.
+#-----------------------------------------------------------------------------
+def iter_dir(dir_name):
+    return iter_dir_entries(dir_name, read_dir(dir_name))
+
+#-----------------------------------------------------------------------------
+# return a sorted list of (name, scandir entry or None) for each legal entry
+#-----------------------------------------------------------------------------
+def read_dir(dir_name):
+    if scandir:
+        entries = [(entry.name, entry) for entry in scandir(dir_name) if path_check(entry.name)]
+        entries.sort(key=lambda (name, entry): name)
+        return entries
+
+    names = [name for name in os.listdir(dir_name) if path_check(name)]
+    names.sort()
+
+    return [(name, None) for name in names]
+
+#-----------------------------------------------------------------------------
+# generate a File_Info for each (name, scandir entry or None)
+#-----------------------------------------------------------------------------
+def iter_dir_entries(dir_name, entries):
+    for (name, entry) in entries:
+        try:
+            if entry and not global_stat_cache:
+                file_stat = entry.stat()
+            else:
+                file_stat = stat_path(os.path.join(dir_name, name))
+        except OSError:
+            continue
+
+        if file_stat is None: continue
+
+        yield File_Info(dir_name, name, file_stat)
+
+#-----------------------------------------------------------------------------
+# the query parameters of a directory listing
+#
+#    limit=N              list at most N entries
+#    cursor=C             continue after the last entry of a previous listing
+#    sort=name|date|size  the key to sort entries by (default name)
+#    order=asc|desc       the order to sort in (default asc)
+#    glob=PATTERN         only list names matching a shell-style pattern
+#    prefix=STRING        only list names starting with STRING
+#    dates=0|1            include date strings in compact and recursive
+#                         listings (default 0)
+#    recursive=0|1        list the whole tree below the directory, as NDJSON
+#    depth=N              only list N levels of a recursive listing
+#    include=GLOB         only list paths or names matching a glob, in a
+#                         recursive listing; may be repeated
+#    exclude=GLOB         skip paths or names matching a glob, and the trees
+#                         below them, in a recursive listing; may be repeated
+#
+# Recursive listings can't be paged, sorted or filtered by glob or prefix.
+#
+# A cursor holds the sort key and name of the last entry listed, and the next
+# listing starts with the entries after it, so cursors stay valid while the
+# directory is unchanged, and even after entries are added or removed.
+# A ValueError is raised for bad values.
+#-----------------------------------------------------------------------------
+class List_Query:
+
+    sorts  = ["name", "date", "size"]
+    orders = ["asc", "desc"]
+
+    def __init__(self, query_string=""):
+        self.params = urlparse.parse_qs(query_string)
+
+        self.limit = self.get_count_param("limit")
+
+        self.sort = self.get_param("sort", "name")
+        if self.sort not in self.sorts:
+            raise ValueError("invalid sort: %s" % self.sort)
+
+        self.order = self.get_param("order", "asc")
+        if self.order not in self.orders:
+            raise ValueError("invalid order: %s" % self.order)
+
+        self.glob   = self.get_param("glob")
+        self.prefix = self.get_param("prefix")
+
+        self.dates = self.get_flag_param("dates")
+
+        self.cursor = self.get_param("cursor")
+        if self.cursor is not None:
+            self.cursor = self.decode_cursor(self.cursor)
+
+        self.recursive = self.get_flag_param("recursive")
+        self.depth     = self.get_count_param("depth")
+        self.includes  = self.params.get("include", [])
+        self.excludes  = self.params.get("exclude", [])
+
+        if self.recursive:
+            for name in ["limit", "cursor", "sort", "order", "glob", "prefix"]:
+                if name in self.params:
+                    raise ValueError("%s can't be used with recursive" % name)
+
+        elif self.depth or self.includes or self.excludes:
+            raise ValueError("depth, include and exclude need recursive")
+
+    def get_param(self, name, default=None):
+        values = self.params.get(name)
+        if not values: return default
+
+        if len(values) > 1:
+            raise ValueError("%s specified more than once" % name)
+
+        return values[0]
+
+    # a positive integer, or None
+    def get_count_param(self, name):
+        value = self.get_param(name)
+        if value is None: return None
+
+        if not re.match(r"^\d+$", value) or (int(value) == 0):
+            raise ValueError("invalid %s: %s" % (name, value))
+
+        return int(value)
+
+    # 0 or 1, as a bool
+    def get_flag_param(self, name):
+        value = self.get_param(name, "0")
+        if value not in ["0", "1"]:
+            raise ValueError("invalid %s: %s" % (name, value))
+
+        return value == "1"
+
+    def matches(self, name):
+        if self.prefix and not name.startswith(self.prefix): return False
+        if self.glob and not fnmatch.fnmatchcase(name, self.glob): return False
+        return True
+
+    # for recursive listings, paths are relative to the listed directory
+    def is_included(self, path, name):
+        if not self.includes: return True
+        for glob in self.includes:
+            if fnmatch.fnmatchcase(path, glob) or fnmatch.fnmatchcase(name, glob): return True
+        return False
+
+    def is_excluded(self, path, name):
+        for glob in self.excludes:
+            if fnmatch.fnmatchcase(path, glob) or fnmatch.fnmatchcase(name, glob): return True
+        return False
+
+    def key(self, file_info):
+        if self.sort == "date": return (file_info.date_ms_utc, file_info.name)
+        if self.sort == "size": return (file_info.size, file_info.name)
+        return (file_info.name,)
+
+    def after_cursor(self, key):
+        if self.cursor is None:  return True
+        if self.order == "desc": return key < self.cursor
+        return key > self.cursor
+
+    def encode_cursor(self, file_info):
+        key = self.key(file_info)
+
+        value = ""
+        if len(key) > 1: value = repr(key[0])
+
+        cursor = "%s:%s:%s" % (self.sort, value, file_info.name)
+        return base64.urlsafe_b64encode(cursor).rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            cursor = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        except (TypeError, binascii.Error):
+            raise ValueError("invalid cursor")
+
+        parts = cursor.split(":", 2)
+        if len(parts) != 3 or parts[0] != self.sort:
+            raise ValueError("invalid cursor")
+
+        (sort, value, name) = parts
+        try:
+            if sort == "date": return (float(value), name)
+            if sort == "size": return (int(value), name)
+        except ValueError:
+            raise ValueError("invalid cursor")
+
+        return (name,)
+
+    # the query string for the listing which follows this one
+    def next_query(self, cursor):
+        params = [(name, values[0]) for (name, values) in sorted(self.params.items()) if name != "cursor"]
+        params.append(("cursor", cursor))
+        return urllib.urlencode(params)
+
+#-----------------------------------------------------------------------------
+# the File_Infos of a directory listing, filtered, sorted and paged by query
+#
+# Sorted by name, only the entries listed are stat'ed; sorted by date or
+# size, every matching entry is, but only a page of them is kept.  Once
+# iterated, next_cursor is the cursor of the following page, or None if
+# this was the last.
+#-----------------------------------------------------------------------------
+class Dir_Listing:
+
+    def __init__(self, dir_name, query=None):
+        if query is None: query = List_Query()
+
+        self.query       = query
+        self.next_cursor = None
+
+        entries = [(name, entry) for (name, entry) in read_dir(dir_name) if query.matches(name)]
+
+        if query.sort == "name":
+            if query.order == "desc": entries.reverse()
+            if query.cursor: entries = [(name, entry) for (name, entry) in entries if query.after_cursor((name,))]
+            self.file_infos = iter_dir_entries(dir_name, entries)
+
+        else:
+            file_infos = iter_dir_entries(dir_name, entries)
+            if query.cursor: file_infos = (file_info for file_info in file_infos if query.after_cursor(query.key(file_info)))
+
+            # only keep the page, and the entry which shows there's another
+            if query.limit is None:
+                file_infos = sorted(file_infos, key=query.key, reverse=(query.order == "desc"))
+            elif query.order == "desc":
+                file_infos = heapq.nlargest(query.limit + 1, file_infos, key=query.key)
+            else:
+                file_infos = heapq.nsmallest(query.limit + 1, file_infos, key=query.key)
+
+            self.file_infos = iter(file_infos)
+
+    def __iter__(self):
+        limit = self.query.limit
+        count = 0
+        last  = None
+
+        for file_info in self.file_infos:
+            if count == limit:
+                self.next_cursor = self.query.encode_cursor(last)
+                return
+
+            yield file_info
+            last   = file_info
+            count += 1
+
+#-----------------------------------------------------------------------------
+# generate a (path, File_Info) for each entry in a tree, depth first, with
+# the path relative to dir_name
+#
+# A directory's entries follow it, and only the directories on the way down
+# to the current one are held open, so memory doesn't grow with the size of
+# the tree.  Symbolic links to directories are listed, but not followed, and
+# directories that can't be read are listed, but not descended into.  The
+# top directory is read right away, so errors reading it are raised here.
+#-----------------------------------------------------------------------------
+def walk_tree(dir_name, query):
+    return walk_tree_entries([("", iter_dir(dir_name))], query)
+
+def walk_tree_entries(stack, query):
+    while stack:
+        (prefix, file_infos) = stack[-1]
+
+        for file_info in file_infos:
+            path = prefix + file_info.name
+            if query.is_excluded(path, file_info.name): continue
+
+            if query.is_included(path, file_info.name):
+                yield (path, file_info)
+
+            if not file_info.is_dir: continue
+            if query.depth and (len(stack) >= query.depth): continue
+            if os.path.islink(file_info.full_name): continue
+
+            try:
+                sub_file_infos = iter_dir(file_info.full_name)
+            except OSError:
+                continue
+
+            stack.append((path + "/", sub_file_infos))
+            break
+
+        else:
+            stack.pop()
+
+#-----------------------------------------------------------------------------
+# a generation count for each directory, bumped when a file in it is written
+#
+# A file written in place changes its size and date, but not the date of its
+# directory, so listings are validated with the directory's date and its
+# generation.  Counts start over when the server does, so the token, which
+# is different for each run of the server, is part of listing ETags too.
+#-----------------------------------------------------------------------------
+class Dir_Generations:
+
+    def __init__(self):
+        self.token       = "%x" % int(time.time() * 1000)
+        self.generations = {}
+        self.lock        = threading.Lock()
+
+    def get(self, dir_name):
+        dir_name = os.path.normpath(dir_name)
+        with self.lock:
+            return self.generations.get(dir_name, 0)
+
+    def bump(self, dir_name):
+        dir_name = os.path.normpath(dir_name)
+        with self.lock:
+            self.generations[dir_name] = self.generations.get(dir_name, 0) + 1
+
+dir_generations = Dir_Generations()
+
+#-----------------------------------------------------------------------------
+# get the ETag of a directory listing, in a given format and with a query
+#-----------------------------------------------------------------------------
+def get_list_etag(dir_stat, content_type, query_string):
+    variant = binascii.crc32("%s?%s" % (content_type, query_string)) & 0xffffffff
+
+    return '"%s-%x-%d-%d-%08x"' % (
+        dir_generations.token,
+        int(dir_stat.mtime * 1000000),
+        dir_stat.size,
+        dir_generations.get(dir_stat.name),
+        variant
+    )
+
+#-----------------------------------------------------------------------------
+# a cache of file contents, keyed by name and validated by ETag
+#
+# Least recently used entries are dropped to keep the total size within
+# max_bytes; contents larger than max_item_bytes are never cached.
+#-----------------------------------------------------------------------------
+class Content_Cache:
+
+    def __init__(self, max_bytes, max_item_bytes):
+        self.max_bytes      = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self.bytes          = 0
+        self.items          = collections.OrderedDict()
+        self.lock           = threading.Lock()
+        self.hits           = 0
+        self.misses         = 0
+        self.evictions      = 0
+
+    # returns the cached content, or None if missing or the ETag differs
+    def get(self, key, etag):
+        with self.lock:
+            item = self.items.pop(key, None)
+            if item and (item[0] == etag):
+                self.items[key] = item
+                self.hits += 1
+                return item[1]
+
+            if item: self.bytes -= len(item[1])
+            self.misses += 1
+            return None
+
+    def put(self, key, etag, content):
+        if len(content) > self.max_item_bytes: return
+
+        with self.lock:
+            item = self.items.pop(key, None)
+            if item: self.bytes -= len(item[1])
+
+            self.items[key] = (etag, content)
+            self.bytes += len(content)
+
+            while self.bytes > self.max_bytes:
+                (old_key, item) = self.items.popitem(last=False)
+                self.bytes -= len(item[1])
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self.lock:
+            item = self.items.pop(key, None)
+            if item: self.bytes -= len(item[1])
+
+    def stats(self):
+        with self.lock:
+            return "%d hits, %d misses, %d evictions, %d entries, %d bytes" % (
+                self.hits, self.misses, self.evictions, len(self.items), self.bytes
+            )
+
+#-----------------------------------------------------------------------------
+# content digests of files, for --etag content
+#
+# Digests are keyed by device and inode, and kept with the mtime and size of
+# the file they were computed for; one whose file's mtime or size has since
+# changed is computed again the next time it's needed, so a touched file
+# keeps its ETag.  With an index file, digests are kept in an anydbm
+# database, so they're still there after a restart.
+#-----------------------------------------------------------------------------
+class Digest_Index:
+
+    def __init__(self, file_name=None):
+        self.db     = {}
+        self.lock   = threading.Lock()
+        self.hits   = 0
+        self.misses = 0
+
+        if file_name: self.db = anydbm.open(file_name, "c")
+
+    def get_key(self, path_stat):
+        return "%d:%d" % (path_stat.dev, path_stat.ino)
+
+    def get_stamp(self, path_stat):
+        return "%r:%d" % (path_stat.mtime, path_stat.size)
+
+    # returns the file's digest, or None if it isn't known
+    def get(self, path_stat):
+        key = self.get_key(path_stat)
+        with self.lock:
+            # not self.db.get(), which gdbm databases don't have
+            value = None
+            if key in self.db: value = self.db[key]
+            if value:
+                (stamp, sep, digest) = value.rpartition(":")
+                if stamp == self.get_stamp(path_stat):
+                    self.hits += 1
+                    return digest
+
+            self.misses += 1
+            return None
+
+    def put(self, path_stat, digest):
+        key = self.get_key(path_stat)
+        with self.lock:
+            self.db[key] = "%s:%s" % (self.get_stamp(path_stat), digest)
+
+    # drop the digest of a file which has been replaced
+    def remove(self, path_stat):
+        key = self.get_key(path_stat)
+        with self.lock:
+            if key in self.db: del self.db[key]
+
+    def close(self):
+        with self.lock:
+            if hasattr(self.db, "close"): self.db.close()
+
+    def stats(self):
+        with self.lock:
+            return "%d hits, %d misses, %d entries" % (self.hits, self.misses, len(self.db))
+
+#-----------------------------------------------------------------------------
+# compute a file's digest, recording it in the digest index, if there is one,
+# if the file didn't change meanwhile; returns None if it can't be read
+#-----------------------------------------------------------------------------
+def digest_file(path_stat):
+    digest = hashlib.sha1()
+    try:
+        file = open(path_stat.name, "rb")
+        try:
+            while True:
+                data = file.read(global_block_size)
+                if not data: break
+                digest.update(data)
+
+            new_stat = Path_Stat(path_stat.name, os.fstat(file.fileno()))
+        finally:
+            file.close()
+    except (IOError, OSError):
+        return None
+
+    digest = digest.hexdigest()
+    if global_digest_index and (global_digest_index.get_stamp(new_stat) == global_digest_index.get_stamp(path_stat)):
+        global_digest_index.put(new_stat, digest)
+
+    return digest
+
+#-----------------------------------------------------------------------------
+# a file's digest, from the digest index when it's known there
+#-----------------------------------------------------------------------------
+def get_digest(path_stat):
+    digest = None
+    if global_digest_index: digest = global_digest_index.get(path_stat)
+    if digest is None: digest = digest_file(path_stat)
+
+    return digest
+
+#-----------------------------------------------------------------------------
+# raised when a request body is larger than --max-body-bytes allows
+#-----------------------------------------------------------------------------
+class Body_Too_Large(Exception):
+    pass
+
+#-----------------------------------------------------------------------------
+# read the data of a chunked request body, from the file it arrives on
+#
+# read() returns "" at the end of the body, having read the trailers, and
+# never reads past the body.  A malformed or truncated body raises a
+# ValueError, and a body of more than max_bytes (when not 0) raises
+# Body_Too_Large.
+#-----------------------------------------------------------------------------
+class Chunked_Reader:
+
+    def __init__(self, file, max_bytes=0):
+        self.file       = file
+        self.max_bytes  = max_bytes
+        self.chunk_left = 0
+        self.length     = 0
+        self.done       = False
+
+    def read(self, size=-1):
+        if self.done: return ""
+
+        if not self.chunk_left:
+            self.read_chunk_size()
+            if self.done: return ""
+
+        if (size < 0) or (size > self.chunk_left): size = self.chunk_left
+
+        data = self.file.read(size)
+        if not data: raise ValueError("chunked body ended early")
+
+        self.chunk_left -= len(data)
+        if not self.chunk_left: self.read_line()
+
+        return data
+
+    def read_chunk_size(self):
+        line = self.read_line()
+
+        size = line.split(";", 1)[0].strip()
+        if not re.match(r"^[0-9a-fA-F]{1,16}$", size):
+            raise ValueError("invalid chunk size: %r" % size)
+
+        size = int(size, 16)
+        if size == 0:
+            while self.read_line(): pass
+            self.done = True
+            return
+
+        self.length += size
+        if self.max_bytes and (self.length > self.max_bytes):
+            raise Body_Too_Large()
+
+        self.chunk_left = size
+
+    # lines are chunk sizes, trailers and the ends of chunks, all short
+    def read_line(self):
+        line = self.file.readline(1024)
+        if not line.endswith("\n"): raise ValueError("chunked body ended early")
+
+        return line.rstrip("\r\n")
+
+    def close(self):
+        self.file.close()
+
+#-----------------------------------------------------------------------------
+# iterate over the contents of a file a block at a time, for a response body
+#
+# Never returns more than length bytes, when length is given, so the body
+# matches the Content-Length sent even if the file grows.  The server closes
+# the file by calling close() once the response is done.
+#-----------------------------------------------------------------------------
+class File_Iterator:
+
+    def __init__(self, file, block_size=8192, length=None):
+        self.file       = file
+        self.block_size = block_size
+        self.length     = length
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        size = self.block_size
+        if self.length is not None:
+            if self.length <= 0: raise StopIteration
+            size = min(size, self.length)
+
+        data = self.file.read(size)
+        if not data: raise StopIteration
+
+        if self.length is not None: self.length -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+#-----------------------------------------------------------------------------
+# iterate over a whole file, recording its digest once it's all been read;
+# not a File_Iterator, since sendfile() would bypass the digest
+#-----------------------------------------------------------------------------
+class Digest_Iterator:
+
+    def __init__(self, file, block_size, path_stat):
+        self.file       = file
+        self.block_size = block_size
+        self.path_stat  = path_stat
+        self.length     = path_stat.size
+        self.digest     = hashlib.sha1()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        if self.length <= 0: raise StopIteration
+
+        data = self.file.read(min(self.block_size, self.length))
+        if not data: raise StopIteration
+
+        self.length -= len(data)
+        self.digest.update(data)
+        if self.length == 0: self.finish()
+
+        return data
+
+    def finish(self):
+        new_stat = Path_Stat(self.path_stat.name, os.fstat(self.file.fileno()))
+        if global_digest_index.get_stamp(new_stat) == global_digest_index.get_stamp(self.path_stat):
+            global_digest_index.put(new_stat, self.digest.hexdigest())
+
+    def close(self):
+        self.file.close()
+
+#-----------------------------------------------------------------------------
+# iterate over a multipart/byteranges body for several ranges of a file
+#-----------------------------------------------------------------------------
+class Byte_Ranges_Iterator:
+
+    def __init__(self, file, block_size, ranges, size, content_type):
+        boundary = binascii.hexlify(os.urandom(12))
+
+        self.file         = file
+        self.block_size   = block_size
+        self.content_type = "multipart/byteranges; boundary=%s" % boundary
+        self.parts        = []
+        self.trailer      = "\r\n--%s--\r\n" % boundary
+        self.length       = len(self.trailer)
+
+        for (first, last) in ranges:
+            head = "\r\n--%s\r\nContent-type: %s\r\nContent-Range: bytes %d-%d/%d\r\n\r\n" % (
+                boundary, content_type, first, last, size
+            )
+            self.parts.append((head, first, last - first + 1))
+            self.length += len(head) + last - first + 1
+
+        self.iterator = self.generate()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        return self.iterator.next()
+
+    def generate(self):
+        for (head, first, length) in self.parts:
+            yield head
+
+            self.file.seek(first)
+            while length > 0:
+                data = self.file.read(min(self.block_size, length))
+                if not data: return
+
+                length -= len(data)
+                yield data
+
+        yield self.trailer
+
+    def close(self):
+        self.file.close()
+
+#-----------------------------------------------------------------------------
+# wsgi responder for redirect adding a / at the end of the URL
+#-----------------------------------------------------------------------------
+def handler_redirect_with_slash(environ, start_response, match):
+    debug("handler_redirect_with_slash()")
+    
+    protocol = environ["wsgi.url_scheme"]
+    host     = environ["REMOTE_HOST"]
+    port     = environ["SERVER_PORT"]
+    path     = environ["PATH_INFO"]
+    verb     = environ["REQUEST_METHOD"]
+    
+    path = urllib.quote(path)
+    
+    if   protocol == "http"  and port == "80":  port = ""
+    elif protocol == "https" and port == "443": port = ""
+    else:                                       port = ":%s" % port
+    
+    url = "%s://%s%s%s/" % (protocol, host, port, path)
+    
+    return handler_temporary_redirect(environ, start_response, url)
+
+#-----------------------------------------------------------------------------
+# get a directory listing
+#-----------------------------------------------------------------------------
+def handler_file_list(environ, start_response, match):
+    debug("handler_file_list()")
+    
+    dir_name = match.group(1)
+    dir_name = os.path.join(global_root, dir_name)
+
+    dir_stat = get_path_stat(environ, dir_name)
+    if not dir_stat.is_dir:
+        return handler_not_found(environ, start_response)
+    
+    available_types = ["application/json", "text/json", "text/html", "application/vnd.slowebs.columns+json", "text/event-stream"]
+    accept_header = environ.get("HTTP_ACCEPT", "*/*")
+    content_type = get_preferred_content_type(available_types, accept_header)
+
+    if content_type == "text/event-stream":
+        return handler_change_feed(environ, start_response, match.group(1))
+
+    useJSON = True
+    if content_type == "text/html": useJSON = False
+    
+    query_string = environ.get("QUERY_STRING", "")
+    try:
+        query = List_Query(query_string)
+    except ValueError, e:
+        log("bad listing query: %s" % e)
+        return handler_bad_request(environ, start_response)
+
+    if query.recursive:
+        return handler_tree_list(environ, start_response, dir_name, query)
+
+    list_etag = get_list_etag(dir_stat, content_type, query_string)
+
+    status = check_preconditions(environ, list_etag)
+    if status == 304:
+        return handler_not_modified(environ, start_response, list_etag, [("Vary", "Accept")])
+    if status == 412:
+        return handler_precondition_failed(environ, start_response)
+
+    status = '200 OK'
+    headers = [('Content-type',content_type)]
+    headers.append(("Cache-Control", "no-cache"))
+    headers.append(("ETag", list_etag))
+    headers.append(("Vary", "Accept"))
+
+    if environ["REQUEST_METHOD"] == "HEAD":
+        start_response(status, headers)
+        return [""]
+
+    cache_key = (dir_name, content_type, query_string)
+    if global_list_cache:
+        content = global_list_cache.get(cache_key, list_etag)
+        if content is not None:
+            headers.append(("X-Cache", "HIT"))
+            headers.append(('Content-Length',str(len(content))))
+            start_response(status, headers)
+            return [content]
+
+        headers.append(("X-Cache", "MISS"))
+
+    listing = Dir_Listing(dir_name, query)
+
+    if content_type == "application/vnd.slowebs.columns+json":
+        content = list_columns(listing, query.dates)
+    elif useJSON:
+        content = list_json(listing)
+    else:
+        content = list_html(dir_name, listing)
+
+    start_response(status, headers)
+
+    content = join_blocks(content, global_block_size)
+    if global_list_cache:
+        content = cache_blocks(content, global_list_cache, cache_key, list_etag)
+
+    return content
+
+#-----------------------------------------------------------------------------
+# list a tree as NDJSON, one JSON object per line
+#
+# A directory's date doesn't change when something deeper in the tree does,
+# so recursive listings have no ETag, and aren't cached.
+#-----------------------------------------------------------------------------
+def handler_tree_list(environ, start_response, dir_name, query):
+    headers = [('Content-type', "application/x-ndjson")]
+    headers.append(("Cache-Control", "no-cache"))
+
+    if environ["REQUEST_METHOD"] == "HEAD":
+        start_response('200 OK', headers)
+        return [""]
+
+    records = walk_tree(dir_name, query)
+
+    start_response('200 OK', headers)
+
+    return join_blocks(list_ndjson(records, query.dates), global_block_size)
+
+#-----------------------------------------------------------------------------
+# stream changes to the files below a directory as server-sent events
+#-----------------------------------------------------------------------------
+def handler_change_feed(environ, start_response, dir_path):
+    if not global_change_feed:
+        return handler_not_implemented(environ, start_response)
+
+    max_clients = global_change_feed.max_clients
+    if max_clients and (global_change_feed.clients >= max_clients):
+        return handler_status(environ, start_response, 503, "Too many change feeds", [("Retry-After", "10")])
+
+    headers = [('Content-type', "text/event-stream")]
+    headers.append(("Cache-Control", "no-cache"))
+
+    start_response('200 OK', headers)
+
+    if environ["REQUEST_METHOD"] == "HEAD":
+        return [""]
+
+    dir_path = "/".join(part for part in dir_path.split("/") if part)
+    last_id = environ.get("HTTP_LAST_EVENT_ID", "")
+
+    # the async engine sends the feed from its loop, without holding a worker
+    if environ.get("slowebs.engine") == "async":
+        return Feed_Request(dir_path, last_id)
+
+    return global_change_feed.feed(dir_path, last_id, environ.get("slowebs.client_closed"))
+
+#-----------------------------------------------------------------------------
+# a change feed response for the async engine to send
+#-----------------------------------------------------------------------------
+class Feed_Request:
+
+    def __init__(self, dir_path, last_id):
+        self.dir_path = dir_path
+        self.last_id  = last_id
+
+    def __iter__(self):
+        return iter([])
+
+#-----------------------------------------------------------------------------
+# generate NDJSON lines for (path, File_Info)s
+#-----------------------------------------------------------------------------
+def list_ndjson(records, dates=False):
+    for (path, file_info) in records:
+        is_dir = "false"
+        if file_info.is_dir: is_dir = "true"
+
+        line = '{"path": "%s", "is_dir": %s, "date_ms_utc": %d, "size": %d' % (
+            string_escape(urllib.quote(path)), is_dir, file_info.date_ms_utc, file_info.size
+        )
+
+        if dates:
+            line += ', "date_print_local": "%s", "date_rfc3339": "%s"' % (
+                file_info.date_print_local, file_info.date_rfc3339
+            )
+
+        yield line + "}\n"
+
+#-----------------------------------------------------------------------------
+# generate a JSON listing, a row at a time
+#
+# A "next" property holds the cursor for the next page, if there is one.
+#-----------------------------------------------------------------------------
+def list_json(listing):
+    yield '{"dir": [\n'
+
+    # a row is only finished once we know whether another follows it
+    row = None
+    for file_info in listing:
+        if row: yield row + ",\n"
+
+        is_dir = "false"
+        if file_info.is_dir: is_dir = "true"
+
+        row = "".join([
+            "   { ",
+              '"name": "%s"' % string_escape(file_info.qname),
+            ', "is_dir": %s'  % is_dir,
+            ', "date_ms_utc": "%d"' % file_info.date_ms_utc,
+            ', "date_print_local": "%s"' % file_info.date_print_local,
+            ', "date_rfc3339": "%s"' % file_info.date_rfc3339,
+            ', "size": %d' % file_info.size,
+            "   } ",
+        ])
+
+    if row: yield row + "\n"
+
+    if listing.next_cursor:
+        yield '], "next": "%s"}\n' % listing.next_cursor
+    else:
+        yield "]}\n"
+
+#-----------------------------------------------------------------------------
+# generate a compact JSON listing, with an array for each property
+#
+# The names are sent as they're read; the other columns are collected as
+# numbers, and sent after.  Dates are numbers, and the date strings, which
+# clients can derive from them, are only included when asked for.
+#-----------------------------------------------------------------------------
+def list_columns(listing, dates=False):
+    yield '{"name": ['
+
+    is_dirs      = []
+    dates_ms_utc = []
+    sizes        = []
+    dates_local  = []
+    dates_utc    = []
+
+    separator = ""
+    for file_info in listing:
+        yield '%s"%s"' % (separator, string_escape(file_info.qname))
+        separator = ","
+
+        is_dirs.append(file_info.is_dir)
+        dates_ms_utc.append(file_info.date_ms_utc)
+        sizes.append(file_info.size)
+
+        if dates:
+            dates_local.append(file_info.date_print_local)
+            dates_utc.append(file_info.date_rfc3339)
+
+    yield '],\n"is_dir": [%s]' % ",".join([is_dir and "true" or "false" for is_dir in is_dirs])
+    yield ',\n"date_ms_utc": [%s]' % ",".join(["%d" % date for date in dates_ms_utc])
+    yield ',\n"size": [%s]' % ",".join(["%d" % size for size in sizes])
+
+    if dates:
+        yield ',\n"date_print_local": [%s]' % ",".join(['"%s"' % date for date in dates_local])
+        yield ',\n"date_rfc3339": [%s]' % ",".join(['"%s"' % date for date in dates_utc])
+
+    if listing.next_cursor:
+        yield ',\n"next": "%s"' % listing.next_cursor
+
+    yield "}\n"
+
+#-----------------------------------------------------------------------------
+# generate an HTML listing, a row at a time, linking to the next page
+#-----------------------------------------------------------------------------
+def list_html(dir_name, listing):
+    yield textwrap.dedent('''\
+        <html>
+        <head>
+        <title>%s: %s</title>
+        <style>
+        .col-date { 
+            padding-left: 3em;
+        }
+        .col-size { 
+            padding-left: 3em;
+            text-align:   right;
+        }
+        tr:nth-child(odd) {
+            background: #DDD
+        }            
+        </style>
+        </head>
+        <body>
+        <h1>%s: %s</h1>
+        <table cellpadding=5 cellspacing=0>
+        ''' % (program_name, dir_name, program_name, dir_name))
+
+    for file_info in listing:
+        if file_info.is_dir:
+            name = "<a href='%s/'>%s/</a>"
+        else:
+            name = "<a href='%s'>%s</a>"
+            
+        name = name % (file_info.qname, file_info.name)
+            
+        yield "<tr><td>%s<td class='col-date'>%s<td class='col-size'>%s bytes" % (
+            name, file_info.date_print_local, file_info.size_print
+        )
+
+    yield "</table>\n"
+
+    if listing.next_cursor:
+        next_query = listing.query.next_query(listing.next_cursor)
+        yield "<p><a href='?%s'>next</a>\n" % cgi.escape(next_query, True)
+
+    yield textwrap.dedent('''\
+        </body>
+        </html>
+        ''')
+
+#-----------------------------------------------------------------------------
+# join small strings into blocks of about block_size bytes
+#
+# Servers write each string of a body separately, so rows are batched to
+# keep the writes few, while only a block's worth is ever held in memory.
+#-----------------------------------------------------------------------------
+def join_blocks(strings, block_size):
+    block  = []
+    length = 0
+    for string in strings:
+        block.append(string)
+        length += len(string)
+        if length >= block_size:
+            yield "".join(block)
+            block  = []
+            length = 0
+
+    if block: yield "".join(block)
+
+#-----------------------------------------------------------------------------
+# pass blocks through, putting them in a cache once they're all sent
+#
+# Nothing is cached if the client goes away first, or if there's too much.
+#-----------------------------------------------------------------------------
+def cache_blocks(blocks, cache, key, etag):
+    content = []
+    length  = 0
+    for block in blocks:
+        if content is not None:
+            length += len(block)
+            if length <= cache.max_item_bytes:
+                content.append(block)
+            else:
+                content = None
+
+        yield block
+
+    if content is not None:
+        cache.put(key, etag, "".join(content))
+
+#-----------------------------------------------------------------------------
+# read a file
+#-----------------------------------------------------------------------------
+def handler_file_get(environ, start_response, match):
+    debug("handler_file_get()")
+    
+    file_name = match.group(1)
+    file_name = os.path.join(global_root, file_name)
+    
+    file_stat = get_path_stat(environ, file_name)
+
+    if not file_stat.exists:
+        return handler_not_found(environ, start_response)
+    
+    if file_stat.is_dir:
+        return handler_redirect_with_slash(environ, start_response, match)
+        
+    ext = os.path.splitext(file_name)[1]
+    if ext == "":
+        content_type = "application/octet-stream"
+    else:
+        ext = ext[1:].lower()
+        content_type = global_mimetypes.get(ext, "application/octet-stream")
+
+    file_etag = get_file_etag(file_name, file_stat)
+
+    cache_control = get_cache_control("/" + match.group(1), content_type)
+
+    # the gzip'ed variant has its own ETag; ranges are of the file itself
+    vary_headers = []
+    sidecar_stat = None
+    use_gzip     = False
+    if global_gzip and is_compressible(content_type):
+        vary_headers.append(("Vary", "Accept-Encoding"))
+
+        if accepts_gzip(environ.get("HTTP_ACCEPT_ENCODING", "")) and not environ.get("HTTP_RANGE"):
+            sidecar_stat = get_gzip_sidecar(environ, file_name, file_stat)
+            if sidecar_stat:
+                use_gzip  = True
+                file_etag = '%s-gz-%s"' % (file_etag[:-1], get_etag(sidecar_stat.name, sidecar_stat))
+            elif file_stat.size >= gzip_min_size:
+                use_gzip  = True
+                file_etag = '%s-gzip"' % file_etag[:-1]
+
+    status = check_preconditions(environ, file_etag, file_stat.mtime)
+    if status == 304:
+        return handler_not_modified(environ, start_response, file_etag, [("Cache-Control", cache_control)] + vary_headers)
+    if status == 412:
+        return handler_precondition_failed(environ, start_response)
+        
+    # // Mon, 17 Aug 2009 07:06:44 GMT
+    last_modified = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(file_stat.mtime))
+    
+    size = file_stat.size
+
+    # Range is only honored for GET
+    ranges = None
+    if environ["REQUEST_METHOD"] == "GET":
+        ranges = get_ranges(environ, size, file_etag, last_modified)
+
+    if ranges == []:
+        return handler_range_not_satisfiable(environ, start_response, size)
+
+    headers = []
+    headers.append(('Last-Modified',last_modified))
+    headers.append(("Cache-Control", cache_control))
+    headers.append(("ETag", file_etag))
+    headers.append(("Accept-Ranges", "bytes"))
+    headers.extend(vary_headers)
+
+    if use_gzip:
+        headers.append(('Content-type',content_type))
+        return send_gzip(environ, start_response, file_name, size, sidecar_stat, file_etag, headers)
+
+    if environ["REQUEST_METHOD"] == "HEAD":
+        headers.append(('Content-type',content_type))
+        headers.append(('Content-Length',str(size)))
+        start_response('200 OK', headers)
+        return [""]
+
+    if not ranges and global_content_cache and (size <= global_content_cache.max_item_bytes):
+        content = global_content_cache.get(file_name, file_etag)
+        if content is not None:
+            headers.append(("X-Cache", "HIT"))
+        else:
+            headers.append(("X-Cache", "MISS"))
+            try:
+                file = open(file_name, "rb")
+                content = file.read()
+                file.close()
+            except IOError:
+                return handler_forbidden(environ, start_response)
+
+            # the file changed since it was stat'ed; don't cache it under the old ETag
+            if len(content) == size:
+                global_content_cache.put(file_name, file_etag, content)
+
+        headers.append(('Content-type',content_type))
+        headers.append(('Content-Length',str(len(content))))
+        start_response('200 OK', headers)
+        return [content]
+
+    try:
+        file = open(file_name, "rb")
+    except IOError:
+        return handler_forbidden(environ, start_response)
+
+    if not ranges:
+        headers.append(('Content-type',content_type))
+        headers.append(('Content-Length',str(size)))
+        start_response('200 OK', headers)
+
+        # the digest of a large file is worked out as it's first sent
+        if file_etag.startswith("W/") and global_digest_index:
+            return Digest_Iterator(file, global_block_size, file_stat)
+
+        return File_Iterator(file, global_block_size, size)
+
+    if len(ranges) == 1:
+        (first, last) = ranges[0]
+        file.seek(first)
+
+        headers.append(('Content-type',content_type))
+        headers.append(('Content-Length',str(last - first + 1)))
+        headers.append(('Content-Range',"bytes %d-%d/%d" % (first, last, size)))
+        start_response('206 Partial Content', headers)
+        return File_Iterator(file, global_block_size, last - first + 1)
+
+    result = Byte_Ranges_Iterator(file, global_block_size, ranges, size, content_type)
+
+    headers.append(('Content-type',result.content_type))
+    headers.append(('Content-Length',str(result.length)))
+    start_response('206 Partial Content', headers)
+    return result
+
+#-----------------------------------------------------------------------------
+# gzip'ed variants of files, for --gzip
+#
+# Files of types which are already compressed - most images, audio and
+# video, archives, fonts - are sent as they are, as are unknown types,
+# which are usually binary.
+#-----------------------------------------------------------------------------
+gzip_min_size    = 256                  # smaller files aren't worth compressing
+gzip_memory_size = 1024 * 1024          # larger files are compressed as they're sent
+gzip_level       = 6
+
+compressed_types = set([
+    "application/octet-stream",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-bzip2",
+    "application/x-xz",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/x-compress",
+    "application/zstd",
+    "application/java-archive",
+    "application/pdf",
+    "application/font-woff",
+    "application/x-font-woff",
+    "font/woff",
+    "font/woff2",
+])
+
+def is_compressible(content_type):
+    if content_type in compressed_types: return False
+
+    (major, sep, minor) = content_type.partition("/")
+    if major in ("image", "audio", "video"): return minor.endswith("+xml")
+
+    return True
+
+#-----------------------------------------------------------------------------
+# True if an Accept-Encoding header value accepts gzip
+#-----------------------------------------------------------------------------
+def accepts_gzip(accept_encoding):
+    any_q = 0
+    for coding in accept_encoding.split(","):
+        (coding, params) = cgi.parse_header(coding)
+        coding = coding.lower()
+
+        try:
+            q = float(params.get("q", 1))
+        except ValueError:
+            q = 0
+
+        if coding in ("gzip", "x-gzip"): return q > 0
+        if coding == "*": any_q = q
+
+    return any_q > 0
+
+#-----------------------------------------------------------------------------
+# the Path_Stat of a file's precompressed .gz sidecar, if it's up to date
+#-----------------------------------------------------------------------------
+def get_gzip_sidecar(environ, file_name, file_stat):
+    sidecar_stat = get_path_stat(environ, file_name + ".gz")
+
+    if not sidecar_stat.exists or sidecar_stat.is_dir: return None
+    if sidecar_stat.mtime < file_stat.mtime:            return None
+
+    return sidecar_stat
+
+#-----------------------------------------------------------------------------
+# gzip a string; the header has no date, so the result is always the same
+#-----------------------------------------------------------------------------
+def gzip_string(data):
+    compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+#-----------------------------------------------------------------------------
+# generate the gzip'ed contents of a file, a block at a time
+#-----------------------------------------------------------------------------
+def gzip_blocks(file, block_size):
+    compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        while True:
+            data = file.read(block_size)
+            if not data: break
+
+            data = compressor.compress(data)
+            if data: yield data
+
+        yield compressor.flush()
+    finally:
+        file.close()
+
+#-----------------------------------------------------------------------------
+# send a file gzip'ed: its sidecar if it has one, else compressed here, and
+# kept in the gzip cache when it's small enough
+#-----------------------------------------------------------------------------
+def send_gzip(environ, start_response, file_name, size, sidecar_stat, etag, headers):
+    headers.append(("Content-Encoding", "gzip"))
+
+    if sidecar_stat:
+        headers.append(('Content-Length', str(sidecar_stat.size)))
+        if environ["REQUEST_METHOD"] == "HEAD":
+            start_response('200 OK', headers)
+            return [""]
+
+        try:
+            file = open(sidecar_stat.name, "rb")
+        except IOError:
+            return handler_forbidden(environ, start_response)
+
+        start_response('200 OK', headers)
+        return File_Iterator(file, global_block_size, sidecar_stat.size)
+
+    if size > gzip_memory_size:
+        if environ["REQUEST_METHOD"] == "HEAD":
+            start_response('200 OK', headers)
+            return [""]
+
+        try:
+            file = open(file_name, "rb")
+        except IOError:
+            return handler_forbidden(environ, start_response)
+
+        start_response('200 OK', headers)
+        return gzip_blocks(file, global_block_size)
+
+    content = None
+    if global_gzip_cache:
+        content = global_gzip_cache.get(file_name, etag)
+        headers.append(("X-Cache", content is None and "MISS" or "HIT"))
+
+    if content is None:
+        try:
+            file = open(file_name, "rb")
+            data = file.read()
+            file.close()
+        except IOError:
+            return handler_forbidden(environ, start_response)
+
+        content = gzip_string(data)
+
+        # the file changed since it was stat'ed; don't cache it under the old ETag
+        if global_gzip_cache and (len(data) == size):
+            global_gzip_cache.put(file_name, etag, content)
+
+    headers.append(('Content-Length', str(len(content))))
+    start_response('200 OK', headers)
+
+    if environ["REQUEST_METHOD"] == "HEAD": return [""]
+    return [content]
+
+#-----------------------------------------------------------------------------
+# write a file
+#-----------------------------------------------------------------------------
+def handler_file_put(environ, start_response, match):
+    debug("handler_file_put()")
+
+    # a chunked body's length isn't known until it's been read
+    transfer_encoding = environ.get("HTTP_TRANSFER_ENCODING", "").lower()
+    if transfer_encoding:
+        if transfer_encoding != "chunked":
+            return handler_not_implemented(environ, start_response)
+
+        content_length = None
+
+    else:
+        content_length = environ.get("CONTENT_LENGTH", None)
+        if not content_length: 
+            return handler_bad_request(environ, start_response)
+            
+        try:
+            content_length = int(content_length)
+        except:
+            return handler_bad_request(environ, start_response)
+
+        if content_length < 0:
+            return handler_bad_request(environ, start_response)
+
+        if global_max_body_bytes and (content_length > global_max_body_bytes):
+            return handler_request_entity_too_large(environ, start_response)
+    
+    # values may be lists of ETags, such as '"foo-bar-baz", W/"qux"', or '*'
+    if_match      = environ.get("HTTP_IF_MATCH", None)
+    if_none_match = environ.get("HTTP_IF_NONE_MATCH", None)
+    
+#    print "handler_file_put():"
+#    print "   if_match:      %s" % if_match
+#    print "   if_none_match: %s" % if_none_match
+
+    if not if_match and not if_none_match:
+        return handler_precondition_failed(environ, start_response)
+
+    if if_match and if_none_match:
+        return handler_precondition_failed(environ, start_response)
+
+    file_name = match.group(1)
+    file_name = os.path.join(global_root, file_name)
+
+    dir_name = os.path.dirname(file_name)
+    if not get_path_stat(environ, dir_name).is_dir:
+        return handler_not_found(environ, start_response)
+        
+    file_stat = get_path_stat(environ, file_name)
+
+    # If-Match needs a strong ETag, so the digest is worked out whatever the size
+    file_etag = get_file_etag(file_name, file_stat, None)
+
+    # creating a file takes If-None-Match, updating one If-Match
+    creating = not file_stat.exists
+    if creating and not if_none_match:
+        return handler_precondition_failed(environ, start_response)
+    if not creating and not if_match:
+        return handler_precondition_failed(environ, start_response)
+
+    mtime = None
+    if file_stat.exists: mtime = file_stat.mtime
+
+    if check_preconditions(environ, file_etag, mtime):
+        return handler_precondition_failed(environ, start_response)
+    
+    if file_stat.is_dir:
+        return handler_forbidden(environ, start_response)
+
+    i_file = environ.get("wsgi.input", None)
+    if not i_file:
+        return handler_bad_request(environ, start_response)
+
+    # a PUT to a symbolic link writes the file it links to, if that's under
+    # the root; the new file replaces the target, and the link is left as it is
+    target_name = os.path.realpath(file_name)
+    if not is_under_root(target_name):
+        return handler_forbidden(environ, start_response)
+
+    if content_length is None:
+        i_file = Chunked_Reader(i_file, global_max_body_bytes)
+        
+    old_stat = file_stat
+    try:
+        file_stat = write_file(target_name, file_stat, i_file, content_length, global_elide_writes)
+    except Body_Too_Large:
+        return handler_request_entity_too_large(environ, start_response)
+    except ValueError, e:
+        log("bad body for %s: %s" % (file_name, e))
+        return handler_bad_request(environ, start_response)
+    except (IOError, OSError), e:
+        log("error writing %s: %s" % (file_name, e))
+        return handler_forbidden(environ, start_response)
+
+    i_file.close()
+
+    if not file_stat:
+        return handler_bad_request(environ, start_response)
+
+    # an elided write leaves the file, and everything cached about it, as it was
+    if file_stat is not old_stat:
+        environ.get("slowebs.path_stats", {}).pop(file_name, None)
+        set_path_stat(environ, file_stat)
+
+        for name in set([file_name, target_name]):
+            if global_stat_cache:
+                global_stat_cache.invalidate(name)
+                global_stat_cache.invalidate(os.path.dirname(name))
+
+            if global_content_cache: global_content_cache.invalidate(name)
+            if global_gzip_cache:    global_gzip_cache.invalidate(name)
+            dir_generations.bump(os.path.dirname(name))
+
+    file_etag = get_file_etag(file_name, file_stat)
+        
+    if creating:
+        return handler_created(environ, start_response, file_etag)
+    else:
+        return handler_ok(environ, start_response, file_etag)
+
+#-----------------------------------------------------------------------------
+# write a request body to a file, returning the file's new Path_Stat, or None
+# if the body was shorter than length; with no length, i_file is read to
+# its end
+#
+# With elide set, a body the same size as the file, with the same digest,
+# isn't written over it; file_stat itself is returned, as the file's
+# Path_Stat is unchanged.
+#
+# The body is copied a block at a time to a temporary file in the same
+# directory, which is renamed over the file once it's complete, so readers
+# never see a partly written file, even if the server dies.  The file keeps
+# the mode of the file it replaces; new files get the usual mode, less the
+# umask.  global_fsync decides what's flushed to disk before returning:
+# nothing, the file, or the file and then its directory.
+#-----------------------------------------------------------------------------
+def write_file(file_name, file_stat, i_file, length, elide=False):
+    dir_name = os.path.dirname(file_name)
+
+    if file_stat.exists:
+        mode = stat.S_IMODE(file_stat.mode)
+    else:
+        mode = 0666 & ~process_umask
+
+    # a body of a different length can't be the same
+    elide = elide and file_stat.exists and ((length is None) or (length == file_stat.size))
+
+    digest = None
+    if global_digest_index or elide: digest = hashlib.sha1()
+
+    written = 0
+
+    (fd, temp_name) = tempfile.mkstemp(prefix=temp_prefix, dir=dir_name)
+    try:
+        os.fchmod(fd, mode)
+
+        while (length is None) or (length > 0):
+            size = global_block_size
+            if length is not None: size = min(size, length)
+
+            data = i_file.read(size)
+            if not data: break
+
+            write_all(fd, data)
+            if digest: digest.update(data)
+            written += len(data)
+            if length is not None: length -= len(data)
+
+        if length > 0:
+            os.close(fd)
+            fd = None
+            os.remove(temp_name)
+            return None
+
+        if elide and (written == file_stat.size) and (digest.hexdigest() == get_digest(file_stat)):
+            os.close(fd)
+            fd = None
+            os.remove(temp_name)
+            return file_stat
+
+        if global_fsync != "none": os.fsync(fd)
+
+        new_stat = Path_Stat(file_name, os.fstat(fd))
+        if global_digest_index:
+            if file_stat.exists: global_digest_index.remove(file_stat)
+            global_digest_index.put(new_stat, digest.hexdigest())
+
+        os.close(fd)
+        fd = None
+
+        os.rename(temp_name, file_name)
+
+    except:
+        if fd is not None: os.close(fd)
+        if os.path.exists(temp_name): os.remove(temp_name)
+        raise
+
+    if global_fsync == "dir":
+        dir_fd = os.open(dir_name, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    return new_stat
+
+#-----------------------------------------------------------------------------
+# write all of a string to a file descriptor
+#-----------------------------------------------------------------------------
+def write_all(fd, data):
+    while data:
+        written = os.write(fd, data)
+        data = data[written:]
+
+#-----------------------------------------------------------------------------
+# get the process's umask, which can only be read by setting it
+#-----------------------------------------------------------------------------
+def get_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+process_umask = get_umask()
+
+#-----------------------------------------------------------------------------
+# main wsgi entry point - dispatch request based on route
+#-----------------------------------------------------------------------------
+def app_main(environ, start_response):
+    if not True: dump_environ(environ)
+    
+    path   = environ["PATH_INFO"]
+    method = environ["REQUEST_METHOD"]
+    
+    origin  = environ.get("HTTP_ORIGIN", None)
+    referer = environ.get("HTTP_REFERER", None)
+    
+    if origin:
+        if not referer_is_self(origin):
+            return handler_forbidden(environ, start_response)
+
+    if referer:
+        if not referer_is_self(referer):
+            return handler_forbidden(environ, start_response)
+
+    path = urllib.unquote(path)
+    if not path_check(path): 
+        return handler_not_found(environ, start_response)
+        
+    route = global_route_table.find(method, path)
+    if not route:
+        return handler_not_implemented(environ, start_response)
+
+    (route_function, match) = route
+    return route_function(environ, start_response, match)
+
+#-----------------------------------------------------------------------------
+# routes for this application; for each method (or "*", any method), the
+# first route whose pattern matches the path handles the request
+#-----------------------------------------------------------------------------
+global_routes = [
+    [ "HEAD",    r'^/?(.*)/$',        handler_file_list ],
+    [ "GET",     r'^/?(.*)/$',        handler_file_list ],
+    [ "HEAD",    r'^/?(.*)$',         handler_file_get ],
+    [ "GET",     r'^/?(.*)$',         handler_file_get ],
+    [ "PUT",     r'^/?(.*)$',         handler_file_put ],
+]
+
+#-----------------------------------------------------------------------------
+# match for a literal route, found without a regex; acts like a regex match
+#-----------------------------------------------------------------------------
+class Route_Match:
+
+    def __init__(self, string, groups=()):
+        self.string  = string
+        self.matched = groups
+
+    def group(self, index=0):
+        if index == 0: return self.string
+        return self.matched[index - 1]
+
+    def groups(self):
+        return self.matched
+
+#-----------------------------------------------------------------------------
+# matchers for the common patterns, which skip the regex when the path can't
+# match: only directory paths end with a slash
+#-----------------------------------------------------------------------------
+def get_dir_path_matcher(regex):
+    def match(path):
+        if path.endswith("/"): return regex.match(path)
+        return None
+    return match
+
+route_matchers = {
+    r'^/?(.*)/$': get_dir_path_matcher,
+}
+
+route_meta_chars = "\\.^$*+?{}[]|()"
+
+#-----------------------------------------------------------------------------
+# routes indexed for dispatch.  Each method gets its own table: a dict of the
+# routes whose pattern is a literal path, and the remaining routes in order,
+# narrowed to those which can match a path's first segment when a pattern
+# starts with a literal one.  Matching is the same as trying every route in
+# order, which is still done for paths containing a newline, since $ matches
+# before a trailing one.
+#-----------------------------------------------------------------------------
+class Route_Table:
+
+    def __init__(self, routes):
+        self.routes = []
+        for (index, (method, pattern, function)) in enumerate(routes):
+            regex = re.compile(pattern)
+            match = regex.match
+            if pattern in route_matchers: match = route_matchers[pattern](regex)
+            self.routes.append((index, method, pattern, regex, match, function))
+
+        methods = set(route[1] for route in self.routes)
+        methods.add("*")
+
+        self.tables = {}
+        for method in methods:
+            self.tables[method] = self.build_table([
+                route for route in self.routes if route[1] in (method, "*")
+            ])
+
+    # returns (exact, general, segments) for the routes of one method
+    def build_table(self, routes):
+        exact    = {}
+        general  = []
+        prefixed = []
+
+        for (index, method, pattern, regex, match, function) in routes:
+            path = get_pattern_literal(pattern)
+            if path is not None:
+                exact.setdefault(path, (index, function))
+                continue
+
+            segment = get_pattern_segment(pattern)
+            if segment is None:
+                general.append((index, match, function))
+            else:
+                prefixed.append((segment, (index, match, function)))
+
+        segments = {}
+        for (segment, route) in prefixed:
+            segments.setdefault(segment, list(general)).append(route)
+
+        for routes in segments.values():
+            routes.sort()
+
+        return (exact, general, segments)
+
+    # returns (function, match) for the route handling a request, or None
+    def find(self, method, path):
+        if "\n" in path: return self.find_in_order(method, path)
+
+        (exact, general, segments) = self.tables.get(method) or self.tables["*"]
+
+        routes = general
+        if segments:
+            parts = path.split("/", 2)
+            if len(parts) == 3: routes = segments.get(parts[1], general)
+
+        found = exact.get(path)
+        for (index, match, function) in routes:
+            if found and (found[0] < index): break
+
+            matched = match(path)
+            if matched: return (function, matched)
+
+        if found: return (found[1], Route_Match(path))
+        return None
+
+    def find_in_order(self, method, path):
+        for (index, route_method, pattern, regex, match, function) in self.routes:
+            if (route_method != "*") and (route_method != method): continue
+
+            matched = regex.match(path)
+            if matched: return (function, matched)
+
+        return None
+
+#-----------------------------------------------------------------------------
+# the path a pattern matches, when it's a literal one like ^/status$
+#-----------------------------------------------------------------------------
+def get_pattern_literal(pattern):
+    if not pattern.startswith("^/") or not pattern.endswith("$"): return None
+
+    for char in pattern[1:-1]:
+        if char in route_meta_chars: return None
+
+    return pattern[1:-1]
+
+#-----------------------------------------------------------------------------
+# the first segment of the paths a pattern matches, when the pattern starts
+# with one, like ^/api/(.*)$
+#-----------------------------------------------------------------------------
+def get_pattern_segment(pattern):
+    if not pattern.startswith("^/"): return None
+
+    prefix = ""
+    for char in pattern[2:]:
+        if char in route_meta_chars: break
+        prefix += char
+
+    # a quantifier after the prefix applies to its last character
+    rest = pattern[2 + len(prefix):]
+    if rest[:1] in ("?", "*", "{"): prefix = prefix[:-1]
+
+    if "/" not in prefix: return None
+    return prefix.split("/", 1)[0]
+
+global_route_table = Route_Table(global_routes)
+
+#-----------------------------------------------------------------------------
+# a fixed-size pool of threads running queued functions
+#-----------------------------------------------------------------------------
+class Thread_Pool:
+
+    # backlog is how much work may wait for a worker; 0 is unlimited
+    def __init__(self, count, backlog=None):
+        if backlog is None: backlog = count
+
+        self.count   = count
+        self.queue   = Queue.Queue(backlog)
+        self.threads = []
+
+        for index in range(count):
+            thread = threading.Thread(target=self.run_worker, name="worker-%d" % index)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    # queue a function to run; blocks while the backlog is full
+    def submit(self, function, *args):
+        self.queue.put((function, args))
+
+    def run_worker(self):
+        while True:
+            work = self.queue.get()
+            if work is None: return
+
+            (function, args) = work
+            try:
+                function(*args)
+            except:
+                log("exception in %s:" % threading.currentThread().getName())
+                traceback.print_exc()
+
+    # let queued work finish, then stop the workers
+    def stop(self, timeout=5):
+        for thread in self.threads:
+            self.queue.put(None)
+
+        for thread in self.threads:
+            thread.join(timeout)
+
+#-----------------------------------------------------------------------------
+# find a zero-copy sendfile(out_fd, in_fd, offset, count): python 3 has
+# os.sendfile, python 2 has the pysendfile package, or we call libc ourselves
+#-----------------------------------------------------------------------------
+def find_sendfile():
+    if hasattr(os, "sendfile"): return os.sendfile
+
+    try:
+        import sendfile
+        return sendfile.sendfile
+    except ImportError:
+        pass
+
+    if not sys.platform.startswith("linux"): return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc_sendfile = libc.sendfile
+    except (OSError, AttributeError):
+        return None
+
+    libc_sendfile.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_int64), ctypes.c_size_t]
+    libc_sendfile.restype  = ctypes.c_ssize_t
+
+    def sendfile(out_fd, in_fd, offset, count):
+        offset = ctypes.c_int64(offset)
+        sent = libc_sendfile(out_fd, in_fd, ctypes.byref(offset), count)
+        if sent < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+        return sent
+
+    return sendfile
+
+#-----------------------------------------------------------------------------
+# True once a client has closed its connection; only useful while it isn't
+# expected to send anything, since what it sends is left unread
+#-----------------------------------------------------------------------------
+def client_closed(sock):
+    try:
+        (ready, _, _) = select.select([sock], [], [], 0)
+        if not ready: return False
+
+        return not sock.recv(1, socket.MSG_PEEK)
+    except (socket.error, select.error, ValueError):
+        return True
+
+#-----------------------------------------------------------------------------
+# send small writes straight away: on a kept-alive connection, Nagle's
+# algorithm holds a response's body back until the client acknowledges its
+# headers, which it delays, costing 40ms a request
+#-----------------------------------------------------------------------------
+def set_no_delay(sock):
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except socket.error:
+        pass
+
+#-----------------------------------------------------------------------------
+# buffered reader for a connection's requests, which can say whether it holds
+# input it's read ahead of the current request, from a pipelining client
+#-----------------------------------------------------------------------------
+class Socket_Reader:
+
+    def __init__(self, sock, block_size=65536):
+        self.sock       = sock
+        self.block_size = block_size
+        self.buffer     = ""
+
+    def buffered(self):
+        return len(self.buffer)
+
+    def read(self, size=-1):
+        parts = [self.buffer]
+        have  = len(self.buffer)
+        while (size < 0) or (have < size):
+            want = self.block_size
+            if size >= 0: want = min(size - have, 1024 * 1024)
+
+            data = self.sock.recv(want)
+            if not data: break
+
+            parts.append(data)
+            have += len(data)
+
+        data = "".join(parts)
+        if (size < 0) or (len(data) <= size):
+            self.buffer = ""
+            return data
+
+        self.buffer = data[size:]
+        return data[:size]
+
+    def readline(self, size=-1):
+        start = 0
+        while True:
+            end = self.buffer.find("\n", start)
+            if end >= 0:
+                end += 1
+                break
+
+            if (size >= 0) and (len(self.buffer) >= size):
+                end = size
+                break
+
+            start = len(self.buffer)
+            data  = self.sock.recv(self.block_size)
+            if not data:
+                end = len(self.buffer)
+                break
+
+            self.buffer += data
+
+        if (size >= 0) and (end > size): end = size
+
+        line        = self.buffer[:end]
+        self.buffer = self.buffer[end:]
+        return line
+
+    def close(self):
+        pass
+
+#-----------------------------------------------------------------------------
+# request body handed to the application: never reads past the end of the
+# body, so the next request on a kept-alive connection is left intact
+#-----------------------------------------------------------------------------
+class Request_Body:
+
+    # length None is a body of unknown length, read until the client stops
+    def __init__(self, file, length):
+        self.file = file
+        self.left = length
+
+    def read(self, size=-1):
+        if self.left is None: return self.file.read(size)
+        if self.left <= 0: return ""
+
+        if (size < 0) or (size > self.left): size = self.left
+        data = self.file.read(size)
+        self.left -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if self.left is None: return self.file.readline(size)
+        if self.left <= 0: return ""
+
+        if (size < 0) or (size > self.left): size = self.left
+        data = self.file.readline(size)
+        self.left -= len(data)
+        return data
+
+    def readlines(self, hint=-1):
+        return list(iter(self.readline, ""))
+
+    def __iter__(self):
+        return iter(self.readline, "")
+
+    # the connection stays open for the next request
+    def close(self):
+        pass
+
+    # read and drop what the application left unread; False if that was
+    # too much to bother with, or the body's end can't be found
+    def drain(self, max_bytes=64 * 1024):
+        if self.left is None:     return False
+        if self.left > max_bytes: return False
+
+        while self.left > 0:
+            if not self.read(min(self.left, 8192)): return False
+
+        return True
+
+#-----------------------------------------------------------------------------
+# wsgi handler which sends File_Iterator bodies with sendfile(), when it can,
+# and frames responses so HTTP/1.1 connections can be kept alive
+#-----------------------------------------------------------------------------
+class Server_Handler(wsgiref.simple_server.ServerHandler):
+
+    wsgi_file_wrapper = File_Iterator
+
+    chunked = False
+    no_body = False
+
+    def cleanup_headers(self):
+        wsgiref.simple_server.ServerHandler.cleanup_headers(self)
+
+        request = self.request_handler
+        code    = int(self.status.split(" ", 1)[0])
+
+        self.no_body = (self.environ["REQUEST_METHOD"] == "HEAD") or (code < 200) or (code in (204, 304))
+
+        if code in (204, 304):
+            del self.headers["Content-Length"]
+        elif ("Content-Length" in self.headers) or self.no_body:
+            pass
+        elif (request.close_connection == 0) and (request.request_version == "HTTP/1.1"):
+            self.headers["Transfer-Encoding"] = "chunked"
+            self.chunked = True
+        else:
+            request.close_connection = 1
+
+        if not request.keep_alive:
+            pass
+        elif request.close_connection:
+            self.headers["Connection"] = "close"
+        elif request.request_version == "HTTP/1.0":
+            self.headers["Connection"] = "keep-alive"
+
+    def write(self, data):
+        assert type(data) is str, "write() argument must be string"
+
+        if not self.status:
+            raise AssertionError("write() before start_response()")
+        elif not self.headers_sent:
+            self.bytes_sent = len(data)
+            self.send_headers()
+        else:
+            self.bytes_sent += len(data)
+
+        if data and not self.no_body:
+            if self.chunked:
+                data = "%x\r\n%s\r\n" % (len(data), data)
+            self._write(data)
+
+        self._flush()
+
+    def finish_content(self):
+        if not self.headers_sent:
+            wsgiref.simple_server.ServerHandler.finish_content(self)
+        elif self.chunked:
+            self._write("0\r\n\r\n")
+            self._flush()
+
+        self.check_length()
+
+    # a body shorter than its Content-Length, from a file which shrank after
+    # it was stat'ed, leaves the client unable to find the next response
+    def check_length(self):
+        length = self.headers.get("Content-Length")
+        if length and not self.no_body and (self.bytes_sent != int(length)):
+            self.request_handler.close_connection = 1
+
+    # the client can't find the end of a response which failed part way
+    def handle_error(self):
+        self.request_handler.close_connection = 1
+        wsgiref.simple_server.ServerHandler.handle_error(self)
+
+    def sendfile(self):
+        if not global_sendfile: return False
+
+        file   = self.result.file
+        length = self.result.length
+        try:
+            in_fd  = file.fileno()
+            out_fd = self.request_handler.connection.fileno()
+            offset = file.tell()
+        except (AttributeError, IOError):
+            return False
+
+        if length is None:
+            length = os.fstat(in_fd).st_size - offset
+
+        if not self.headers_sent:
+            self.send_headers()
+        self._flush()
+
+        if self.chunked or self.no_body: return False
+
+        while length > 0:
+            sent = global_sendfile(out_fd, in_fd, offset, min(length, 1024 * 1024 * 1024))
+            if not sent: break
+
+            offset          += sent
+            length          -= sent
+            self.bytes_sent += sent
+
+        # finish_content() isn't called after sendfile()
+        self.check_length()
+        return True
+
+#-----------------------------------------------------------------------------
+# wsgi request handler using our Server_Handler.  With a worker pool, HTTP/1.1
+# connections are kept alive, and pipelined requests answered in order;
+# otherwise one request per connection, since an idle client would hold up
+# the only thread
+#-----------------------------------------------------------------------------
+class Request_Handler(wsgiref.simple_server.WSGIRequestHandler):
+
+    # requests are read with a Socket_Reader, which knows when pipelined
+    # requests are already waiting in its buffer
+    def setup(self):
+        wsgiref.simple_server.WSGIRequestHandler.setup(self)
+        self.rfile.close()
+        self.rfile = Socket_Reader(self.connection)
+
+        set_no_delay(self.connection)
+
+    def handle(self):
+        self.pool       = getattr(self.server, "pool", None)
+        self.keep_alive = (self.pool is not None) and (global_keep_alive > 0)
+        self.requests   = 0
+
+        if self.keep_alive: self.protocol_version = "HTTP/1.1"
+
+        while True:
+            self.handle_one_request()
+            if self.close_connection:        return
+            if not self.wait_for_request():  return
+
+    def handle_one_request(self):
+        self.close_connection = 1
+
+        # clients may send blank lines between requests
+        self.raw_requestline = "\r\n"
+        while self.raw_requestline in ("\r\n", "\n"):
+            self.raw_requestline = self.rfile.readline(65537)
+
+        if not self.raw_requestline: return
+
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            return
+
+        if not self.parse_request(): return
+
+        self.requests += 1
+        if not self.keep_alive:                        self.close_connection = 1
+        if global_max_requests and (self.requests >= global_max_requests): self.close_connection = 1
+
+        environ = self.get_environ()
+        environ["slowebs.client_closed"] = lambda: client_closed(self.connection)
+
+        length = environ.get("CONTENT_LENGTH", "")
+        try:
+            length = int(length or 0)
+        except ValueError:
+            length = None
+
+        if (length is not None) and (length < 0): length = None
+        if environ.get("HTTP_TRANSFER_ENCODING"): length = None
+        if length is None: self.close_connection = 1
+
+        if self.keep_alive and (environ.get("HTTP_EXPECT", "").lower() == "100-continue"):
+            self.wfile.write("HTTP/1.1 100 Continue\r\n\r\n")
+
+        body    = Request_Body(self.rfile, length)
+        handler = Server_Handler(body, self.wfile, self.get_stderr(), environ)
+        handler.request_handler = self
+        if self.keep_alive: handler.http_version = "1.1"
+        handler.run(self.server.get_app())
+
+        # the next request starts after the end of this one's body
+        if not self.close_connection and not body.drain():
+            self.close_connection = 1
+
+    # True once the next request arrives on a kept-alive connection; False if
+    # the client stays quiet, or other connections are waiting for a worker
+    def wait_for_request(self):
+        if self.rfile.buffered(): return True
+
+        limit = time.time() + global_keep_alive
+        while True:
+            wait = limit - time.time()
+            if wait <= 0: return False
+
+            (ready, _, _) = select.select([self.connection], [], [], min(wait, 0.1))
+            if ready: return True
+
+            if not self.pool.queue.empty(): return False
+
+#-----------------------------------------------------------------------------
+# wsgi server which hands accepted connections off to a thread pool
+#-----------------------------------------------------------------------------
+class Thread_Pool_Server(wsgiref.simple_server.WSGIServer):
+
+    pool = None
+
+    def start_workers(self, count):
+        self.pool = Thread_Pool(count)
+
+    def stop_workers(self):
+        if self.pool: self.pool.stop()
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_worker, request, client_address)
+
+    def process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except:
+            self.handle_error(request, client_address)
+
+        self.shutdown_request(request)
+
+#-----------------------------------------------------------------------------
+# async engine settings
+#-----------------------------------------------------------------------------
+async_idle_timeout = 15                 # seconds to wait for a request, without keep-alive
+async_max_header   = 64 * 1024          # largest request head accepted
+async_spool_size   = 1024 * 1024        # request bodies past this go to disk
+async_high_water   = 256 * 1024         # unsent bytes before a worker waits
+async_sweep_time   = 1                  # seconds between looks for idle connections
+async_feed_backlog = 1024 * 1024        # unsent change feed bytes before its client is dropped
+
+#-----------------------------------------------------------------------------
+# async engine: listening socket, event loop and worker pool
+#
+# Connections are multiplexed with poll() on one thread, so idle and
+# keep-alive connections cost a socket, not a thread.  Applications run on
+# the worker pool, since every handler does blocking disk i/o.
+#-----------------------------------------------------------------------------
+class Async_Server(asyncore.dispatcher):
+
+    def __init__(self, host, port, application, workers):
+        self.map = {}
+        asyncore.dispatcher.__init__(self, map=self.map)
+
+        self.application = application
+        self.pool        = Thread_Pool(workers, 0)
+        self.calls       = collections.deque()
+        self.running     = True
+        self.next_sweep  = 0
+        self.timers      = []
+        self.timer_count = itertools.count()
+        self.feeds       = set()
+        self.feeds_due   = False
+
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(socket.SOMAXCONN)
+
+        self.server_name = socket.getfqdn(host)
+        self.server_port = str(port)
+
+        (self.wake_read, self.wake_write) = os.pipe()
+        flags = fcntl.fcntl(self.wake_write, fcntl.F_GETFL)
+        fcntl.fcntl(self.wake_write, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+        Async_Waker(self)
+        Async_Stdin(self)
+
+        if global_change_feed: global_change_feed.add_listener(self.feed_changed)
+
+    # run the loop until something is typed on stdin
+    def serve(self):
+        while self.running:
+            timeout = 1
+            if self.timers: timeout = max(0, min(1, self.timers[0][0] - time.time()))
+
+            asyncore.loop(timeout, True, self.map, 1)
+            self.run_calls()
+            self.run_timers()
+
+            # each look at every connection, so not after every event
+            now = time.time()
+            if now >= self.next_sweep:
+                self.close_idle()
+                self.next_sweep = now + async_sweep_time
+
+    def stop(self):
+        for channel in self.map.values():
+            if isinstance(channel, Async_Connection): channel.close()
+
+        self.close()
+        self.pool.stop()
+
+    # run a function on the loop thread; callable from any thread
+    def call_soon(self, function, *args):
+        self.calls.append((function, args))
+        try:
+            os.write(self.wake_write, "x")
+        except OSError:
+            pass
+
+    def run_calls(self):
+        while self.calls:
+            (function, args) = self.calls.popleft()
+            function(*args)
+
+    # run a function on the loop thread after a delay; loop thread only
+    def call_later(self, delay, function, *args):
+        heapq.heappush(self.timers, (time.time() + delay, next(self.timer_count), function, args))
+
+    def run_timers(self):
+        now = time.time()
+        while self.timers and (self.timers[0][0] <= now):
+            (when, count, function, args) = heapq.heappop(self.timers)
+            function(*args)
+
+    # called on the change feed's thread after each change; the feeds are
+    # sent what changed once the window for more changes has passed
+    def feed_changed(self):
+        if self.feeds_due: return
+
+        self.feeds_due = True
+        self.call_soon(self.call_later, global_change_feed.window, self.send_feeds)
+
+    def send_feeds(self):
+        self.feeds_due = False
+        for feed in list(self.feeds):
+            feed.send_changes()
+
+    def close_idle(self):
+        now = time.time()
+        for feed in list(self.feeds):
+            feed.send_heartbeat(now)
+
+        limit = now - (global_keep_alive or async_idle_timeout)
+        for channel in self.map.values():
+            if not isinstance(channel, Async_Connection): continue
+            if channel.busy or channel.out_queue:       continue
+            if channel.last_used < limit: channel.close()
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is None: return
+
+        (sock, address) = pair
+        Async_Connection(self, sock, address)
+
+    # a failed accept (say, out of file handles) must not close the server
+    def handle_error(self):
+        log("error accepting connection:")
+        traceback.print_exc()
+
+    def log_request(self, address, request_line, code, size):
+        sys.stderr.write('%s - - [%s] "%s" %s %s\n' % (
+            address, time.strftime("%d/%b/%Y %H:%M:%S"), request_line, code, size
+        ))
+
+#-----------------------------------------------------------------------------
+# async engine: wakes the loop when call_soon() is used
+#-----------------------------------------------------------------------------
+class Async_Waker(asyncore.file_dispatcher):
+
+    def __init__(self, server):
+        asyncore.file_dispatcher.__init__(self, server.wake_read, server.map)
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        try:
+            self.recv(4096)
+        except OSError:
+            pass
+
+#-----------------------------------------------------------------------------
+# async engine: stops the server when stdin is readable
+#-----------------------------------------------------------------------------
+class Async_Stdin(asyncore.dispatcher):
+
+    def __init__(self, server):
+        asyncore.dispatcher.__init__(self, map=server.map)
+        self.server    = server
+        self.connected = True
+        self._fileno   = sys.stdin.fileno()
+        self.add_channel()
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        self.server.running = False
+
+    def handle_close(self):
+        self.server.running = False
+
+    def close(self):
+        self.del_channel()
+
+#-----------------------------------------------------------------------------
+# async engine: one client connection
+#
+# Only the loop thread touches the buffers; workers hand output over with
+# send_from_thread(), which also makes them wait while too much is unsent.
+#-----------------------------------------------------------------------------
+class Async_Connection(asyncore.dispatcher):
+
+    def __init__(self, server, sock, address):
+        asyncore.dispatcher.__init__(self, sock, server.map)
+        set_no_delay(sock)
+
+        self.server      = server
+        self.in_buffer   = ""
+        self.out_queue   = collections.deque()
+        self.out_pending = 0
+        self.out_cond    = threading.Condition()
+        self.gone        = False
+        self.busy        = False
+        self.close_after = False
+        self.environ     = None
+        self.body        = None
+        self.body_left   = 0
+        self.chunked     = False
+        self.chunk_state = None
+        self.chunk_left  = 0
+        self.body_length = 0
+        self.keep_alive  = False
+        self.requests    = 0
+        self.lingering   = False
+        self.feed        = None
+        self.last_used   = time.time()
+
+    # feeds are read only to see the client close
+    def readable(self):
+        if self.lingering or self.feed: return True
+        return not self.busy and not self.close_after
+
+    def writable(self):
+        return bool(self.out_queue)
+
+    def handle_read(self):
+        data = self.recv(65536)
+        if not data: return
+
+        # lingering connections are left to close, or to time out
+        if self.lingering or self.feed: return
+
+        self.last_used = time.time()
+        self.in_buffer += data
+        self.process_input()
+
+    # parse as many requests out of the input as we can
+    def process_input(self):
+        while not self.busy and not self.close_after:
+            if self.environ is None:
+                if not self.read_head(): return
+
+            if self.chunked:
+                if not self.read_chunks(): return
+
+            elif self.body_left:
+                data = self.in_buffer[:self.body_left]
+                self.in_buffer = self.in_buffer[self.body_left:]
+                self.body.write(data)
+                self.body_left -= len(data)
+                if self.body_left: return
+
+            self.start_request()
+
+    def read_head(self):
+        self.in_buffer = self.in_buffer.lstrip("\r\n")
+
+        index = self.in_buffer.find("\r\n\r\n")
+        if index < 0:
+            if len(self.in_buffer) > async_max_header:
+                self.send_error(400, "Bad request")
+            return False
+
+        head = self.in_buffer[:index]
+        self.in_buffer = self.in_buffer[index+4:]
+
+        environ = self.parse_head(head)
+        if not environ:
+            self.send_error(400, "Bad request")
+            return False
+
+        transfer_encoding = environ.get("HTTP_TRANSFER_ENCODING", "").lower()
+        if transfer_encoding and (transfer_encoding != "chunked"):
+            self.send_error(501, "Not implemented")
+            return False
+
+        self.chunked = transfer_encoding == "chunked"
+
+        try:
+            self.body_left = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            self.send_error(400, "Bad request")
+            return False
+
+        if self.chunked:
+            self.body_left   = 0
+            self.chunk_state = "size"
+            self.chunk_left  = 0
+            self.body_length = 0
+
+        if self.body_left < 0:
+            self.send_error(400, "Bad request")
+            return False
+
+        if global_max_body_bytes and (self.body_left > global_max_body_bytes):
+            self.send_error(413, "Request entity too large")
+            return False
+
+        self.body = None
+        if self.body_left or self.chunked:
+            self.body = tempfile.SpooledTemporaryFile(async_spool_size)
+            if environ.get("HTTP_EXPECT", "").lower() == "100-continue":
+                self.push("HTTP/1.1 100 Continue\r\n\r\n")
+
+        connection = environ.get("HTTP_CONNECTION", "").lower()
+        if environ["SERVER_PROTOCOL"] == "HTTP/1.1":
+            self.keep_alive = "close" not in connection
+        else:
+            self.keep_alive = "keep-alive" in connection
+
+        self.requests += 1
+        if global_keep_alive <= 0:                       self.keep_alive = False
+        if global_max_requests and (self.requests >= global_max_requests): self.keep_alive = False
+
+        self.environ = environ
+        return True
+
+    # decode a chunked body into self.body as it arrives; True once it's all
+    # here, when the application is given it as a body with a Content-Length
+    def read_chunks(self):
+        while True:
+            if self.chunk_left:
+                data = self.in_buffer[:self.chunk_left]
+                self.in_buffer = self.in_buffer[self.chunk_left:]
+                self.body.write(data)
+                self.chunk_left -= len(data)
+                if self.chunk_left: return False
+
+                self.chunk_state = "end"
+
+            index = self.in_buffer.find("\n")
+            if index < 0:
+                if len(self.in_buffer) > 1024:
+                    self.send_error(400, "Bad request")
+                return False
+
+            line = self.in_buffer[:index].rstrip("\r")
+            self.in_buffer = self.in_buffer[index+1:]
+
+            if self.chunk_state == "end":
+                if line:
+                    self.send_error(400, "Bad request")
+                    return False
+
+                self.chunk_state = "size"
+
+            elif self.chunk_state == "size":
+                size = line.split(";", 1)[0].strip()
+                if not re.match(r"^[0-9a-fA-F]{1,16}$", size):
+                    self.send_error(400, "Bad request")
+                    return False
+
+                size = int(size, 16)
+                if size == 0:
+                    self.chunk_state = "trailer"
+                    continue
+
+                self.body_length += size
+                if global_max_body_bytes and (self.body_length > global_max_body_bytes):
+                    self.send_error(413, "Request entity too large")
+                    return False
+
+                self.chunk_left = size
+
+            # trailers are read, and dropped
+            elif not line:
+                self.environ["CONTENT_LENGTH"] = str(self.body_length)
+                del self.environ["HTTP_TRANSFER_ENCODING"]
+                self.chunked = False
+                return True
+
+    # build a wsgi environment from the request line and headers
+    def parse_head(self, head):
+        lines = head.split("\r\n")
+
+        words = lines[0].split()
+        if len(words) != 3: return None
+
+        (method, uri, version) = words
+        if version not in ("HTTP/1.0", "HTTP/1.1"): return None
+
+        if "?" in uri:
+            (path, query) = uri.split("?", 1)
+        else:
+            (path, query) = (uri, "")
+
+        environ = {
+            "wsgi.version":      (1, 0),
+            "wsgi.url_scheme":   "http",
+            "wsgi.errors":       sys.stderr,
+            "wsgi.multithread":  True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once":     False,
+            "SERVER_SOFTWARE":   "%s/%s" % (program_name, program_vers),
+            "SERVER_NAME":       self.server.server_name,
+            "SERVER_PORT":       self.server.server_port,
+            "SERVER_PROTOCOL":   version,
+            "GATEWAY_INTERFACE": "CGI/1.1",
+            "SCRIPT_NAME":       "",
+            "REQUEST_METHOD":    method,
+            "PATH_INFO":         urllib.unquote(path),
+            "QUERY_STRING":      query,
+            "REMOTE_ADDR":       self.addr[0],
+            "CONTENT_TYPE":      "text/plain",
+            "CONTENT_LENGTH":    "",
+            "slowebs.request_line": lines[0],
+        }
+
+        key = None
+        for line in lines[1:]:
+            if line[:1] in (" ", "\t"):
+                if not key: return None
+                environ[key] += " " + line.strip()
+                continue
+
+            (name, sep, value) = line.partition(":")
+            if not sep: return None
+
+            name  = name.strip().replace("-", "_").upper()
+            value = value.strip()
+
+            if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                key = name
+                environ[key] = value
+                continue
+
+            key = "HTTP_" + name
+            if key in environ:
+                environ[key] += "," + value
+            else:
+                environ[key] = value
+
+        return environ
+
+    def start_request(self):
+        environ = self.environ
+
+        if self.body:
+            self.body.seek(0)
+            environ["wsgi.input"] = self.body
+        else:
+            environ["wsgi.input"] = StringIO.StringIO("")
+
+        environ["slowebs.engine"] = "async"
+        environ["slowebs.client_closed"] = lambda: self.gone or client_closed(self.socket)
+
+        self.busy = True
+        self.server.pool.submit(Async_Response(self, environ, self.keep_alive).run)
+
+    # called on the loop thread once a worker has produced a response
+    def finish_request(self, keep_alive):
+        if self.body: self.body.close()
+
+        self.busy      = False
+        self.environ   = None
+        self.body      = None
+        self.last_used = time.time()
+
+        if not keep_alive:
+            self.close_after = True
+            if not self.out_queue: self.linger()
+            return
+
+        self.process_input()
+
+    # called on the loop thread once a worker has sent a change feed's
+    # headers; the connection serves the feed until one of them closes
+    def start_feed(self, request, chunked):
+        if self.gone: return
+
+        self.feed = Async_Feed(self, request.dir_path, chunked)
+        self.feed.start(request.last_id)
+
+    # canned response for requests we can not hand to the application
+    def send_error(self, code, reason):
+        self.close_after = True
+        self.push("HTTP/1.1 %d %s\r\nContent-Type: text/plain\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s" % (
+            code, reason.upper(), len(reason), reason
+        ))
+
+    # queue output from the loop thread
+    def push(self, data):
+        with self.out_cond:
+            self.out_pending += len(data)
+
+        self.queue_output(data)
+
+    # queue output from a worker thread; False if the client went away
+    def send_from_thread(self, data):
+        with self.out_cond:
+            while (self.out_pending > async_high_water) and not self.gone:
+                self.out_cond.wait()
+
+            if self.gone: return False
+            self.out_pending += len(data)
+
+        self.server.call_soon(self.queue_output, data)
+        return True
+
+    def queue_output(self, data):
+        if self.gone: return
+
+        self.out_queue.append(data)
+        self.handle_write()
+
+    def handle_write(self):
+        while self.out_queue:
+            data = self.out_queue[0]
+            sent = self.send(data)
+            if not sent: break
+
+            if sent < len(data):
+                self.out_queue[0] = data[sent:]
+            else:
+                self.out_queue.popleft()
+
+            with self.out_cond:
+                self.out_pending -= sent
+                self.out_cond.notify_all()
+
+            self.last_used = time.time()
+
+        if self.close_after and not self.busy and not self.out_queue:
+            self.linger()
+
+    # stop sending, and drop whatever the client sends until it closes;
+    # closing with unread data (say, the rest of a refused body) would
+    # reset the connection, and the client might lose the response
+    def linger(self):
+        if self.lingering: return
+
+        try:
+            self.socket.shutdown(socket.SHUT_WR)
+        except socket.error:
+            self.close()
+            return
+
+        self.lingering = True
+
+    def handle_close(self):
+        self.close()
+
+    def handle_error(self):
+        log("error on connection from %s:" % self.addr[0])
+        traceback.print_exc()
+        self.close()
+
+    def close(self):
+        with self.out_cond:
+            self.gone = True
+            self.out_cond.notify_all()
+
+        if self.feed: self.feed.close()
+
+        self.out_queue.clear()
+        asyncore.dispatcher.close(self)
+
+#-----------------------------------------------------------------------------
+# async engine: a change feed client
+#
+# Events are sent from the loop thread, as the server is told of changes,
+# so a feed costs a connection, not a worker.
+#-----------------------------------------------------------------------------
+class Async_Feed:
+
+    def __init__(self, connection, dir_path, chunked):
+        self.connection = connection
+        self.server     = connection.server
+        self.dir_path   = dir_path
+        self.chunked    = chunked
+        self.seq        = None
+        self.last_sent  = 0
+        self.open       = False
+
+    def start(self, last_id):
+        (self.seq, event) = global_change_feed.open_client(last_id)
+        self.open = True
+        self.server.feeds.add(self)
+        self.send(event)
+
+    def send_changes(self):
+        changes = global_change_feed.get_changes(self.seq)
+        if not changes: return
+
+        (self.seq, events) = global_change_feed.format_changes(changes, self.dir_path)
+        if events: self.send(events)
+
+    def send_heartbeat(self, now):
+        if now - self.last_sent >= change_feed_heartbeat:
+            self.send(": keep-alive\n\n")
+
+    # a client this far behind is dropped; it can catch up with Last-Event-ID
+    def send(self, data):
+        connection = self.connection
+        if connection.out_pending > async_feed_backlog:
+            connection.close()
+            return
+
+        self.last_sent = time.time()
+        if self.chunked:
+            data = "%x\r\n%s\r\n" % (len(data), data)
+
+        connection.push(data)
+
+    def close(self):
+        if not self.open: return
+
+        self.open = False
+        self.server.feeds.discard(self)
+        global_change_feed.close_client()
+
+#-----------------------------------------------------------------------------
+# async engine: runs the application for one request on a worker thread
+#-----------------------------------------------------------------------------
+class Async_Response:
+
+    def __init__(self, connection, environ, keep_alive):
+        self.connection   = connection
+        self.environ      = environ
+        self.keep_alive   = keep_alive
+        self.status       = None
+        self.headers      = None
+        self.headers_sent = False
+        self.has_body     = True
+        self.chunked      = False
+        self.length       = None
+        self.bytes_sent   = 0
+
+    def start_response(self, status, headers, exc_info=None):
+        if exc_info:
+            try:
+                if self.headers_sent:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+            finally:
+                exc_info = None
+
+        elif self.status is not None:
+            raise AssertionError("start_response() called twice")
+
+        self.status  = status
+        self.headers = list(headers)
+        return self.write
+
+    def run(self):
+        connection = self.connection
+        environ    = self.environ
+
+        environ["REMOTE_HOST"] = socket.getfqdn(environ["REMOTE_ADDR"])
+
+        try:
+            result = connection.server.application(environ, self.start_response)
+
+            # the loop thread sends the feed; this worker is done with it
+            if isinstance(result, Feed_Request):
+                self.send_headers()
+                connection.server.log_request(environ["REMOTE_ADDR"], environ["slowebs.request_line"], "200", 0)
+                connection.server.call_soon(connection.start_feed, result, self.chunked)
+                return
+
+            try:
+                if isinstance(result, list) and (len(result) == 1):
+                    if not self.get_header("Content-Length"):
+                        self.headers.append(("Content-Length", str(len(result[0]))))
+
+                for data in result:
+                    if not data: continue
+                    self.write(data)
+                    if connection.gone: break
+
+                self.finish()
+            finally:
+                if hasattr(result, "close"): result.close()
+        except:
+            traceback.print_exc()
+            if self.headers_sent:
+                self.keep_alive = False
+            else:
+                self.status  = "500 INTERNAL SERVER ERROR"
+                self.headers = [("Content-Type", "text/plain"), ("Content-Length", "0")]
+                self.finish()
+
+        code = self.status.split(" ", 1)[0]
+        connection.server.log_request(environ["REMOTE_ADDR"], environ["slowebs.request_line"], code, self.bytes_sent)
+        connection.server.call_soon(connection.finish_request, self.keep_alive)
+
+    def get_header(self, name):
+        name = name.lower()
+        for (key, value) in self.headers:
+            if key.lower() == name: return value
+        return None
+
+    # pick the framing of the body, and send the status and headers
+    def send_headers(self):
+        environ = self.environ
+        code    = int(self.status[:3])
+
+        self.has_body = (environ["REQUEST_METHOD"] != "HEAD") and (code >= 200) and (code not in (204, 304))
+
+        length = self.get_header("Content-Length")
+        if length is not None:
+            self.length = int(length)
+        elif not self.has_body:
+            pass
+        elif environ["SERVER_PROTOCOL"] == "HTTP/1.1":
+            self.headers.append(("Transfer-Encoding", "chunked"))
+            self.chunked = True
+        else:
+            self.keep_alive = False
+
+        if not self.keep_alive:
+            self.headers.append(("Connection", "close"))
+        elif environ["SERVER_PROTOCOL"] == "HTTP/1.0":
+            self.headers.append(("Connection", "keep-alive"))
+
+        lines = ["HTTP/1.1 %s" % self.status]
+        lines.append("Date: %s" % email.utils.formatdate(usegmt=True))
+        lines.append("Server: %s/%s" % (program_name, program_vers))
+        for (key, value) in self.headers:
+            lines.append("%s: %s" % (key, value))
+
+        self.headers_sent = True
+        self.connection.send_from_thread("\r\n".join(lines) + "\r\n\r\n")
+
+    def write(self, data):
+        if not self.headers_sent: self.send_headers()
+        if not self.has_body: return
+
+        self.bytes_sent += len(data)
+        if self.chunked:
+            data = "%x\r\n%s\r\n" % (len(data), data)
+
+        self.connection.send_from_thread(data)
+
+    def finish(self):
+        if not self.headers_sent: self.send_headers()
+
+        if self.chunked:
+            self.connection.send_from_thread("0\r\n\r\n")
+
+        # a short body leaves the client unable to find the next response
+        if self.has_body and (self.length is not None) and (self.bytes_sent != self.length):
+            self.keep_alive = False
+
+#-----------------------------------------------------------------------------
+# print cache statistics, when shutting down
+#-----------------------------------------------------------------------------
+def log_stats():
+    if global_stat_cache:
+        log("stat cache: %s" % global_stat_cache.stats())
+    if global_content_cache:
+        log("content cache: %s" % global_content_cache.stats())
+    if global_list_cache:
+        log("listing cache: %s" % global_list_cache.stats())
+    if global_gzip_cache:
+        log("gzip cache: %s" % global_gzip_cache.stats())
+    if global_digest_index:
+        log("digest index: %s" % global_digest_index.stats())
+
+#-----------------------------------------------------------------------------
+# settings; the main program sets these from the command line
+#-----------------------------------------------------------------------------
+global_port          = 8080
+global_root          = os.getcwd()
+global_mimetypes     = {}
+global_workers       = 0
+global_engine        = "wsgiref"
+global_block_size    = 64 * 1024
+global_sendfile      = None
+global_content_cache = None
+global_list_cache    = None
+global_stat_cache    = None
+global_change_feed   = None
+global_gzip          = False
+global_cache_rules   = []
+global_digest_index  = None
+global_elide_writes  = False
+global_gzip_cache    = None
+global_fsync         = "none"
+global_max_body_bytes = 0
+global_keep_alive    = 15
+global_max_requests  = 100
+
+#-----------------------------------------------------------------------------
+# main program, when not imported (by the benchmarks, say)
+#-----------------------------------------------------------------------------
+if __name__ == "__main__":
+    #-------------------------------------------------------------------------
+    # parse options
+    #-------------------------------------------------------------------------
+    opt_parser = optparse.OptionParser()
+    opt_parser.add_option("--workers", type="int", default=0,
+        help="number of threads serving requests; 0 serves one request at a time")
+    opt_parser.add_option("--engine", choices=["wsgiref", "async"], default="wsgiref",
+        help="server engine: wsgiref (the default) or async")
+    opt_parser.add_option("--block-size", type="int", default=64 * 1024,
+        help="size of the blocks files are read and sent in")
+    opt_parser.add_option("--no-sendfile", action="store_false", dest="sendfile", default=True,
+        help="always copy file contents through python, instead of using sendfile()")
+    opt_parser.add_option("--cache-bytes", type="int", default=0,
+        help="keep up to this many bytes of recently read files in memory")
+    opt_parser.add_option("--cache-max-file", type="int", default=256 * 1024,
+        help="largest file kept in the cache")
+    opt_parser.add_option("--list-cache-bytes", type="int", default=0,
+        help="keep up to this many bytes of recently sent directory listings in memory")
+    opt_parser.add_option("--gzip", action="store_true", default=False,
+        help="send files gzip'ed to clients accepting it, from .gz files next to them when they're up to date")
+    opt_parser.add_option("--gzip-cache-bytes", type="int", default=0,
+        help="keep up to this many bytes of recently gzip'ed files in memory")
+    opt_parser.add_option("--cache-rules", metavar="FILE",
+        help="file of rules giving the Cache-Control header sent with files, by path or content type")
+    opt_parser.add_option("--etag", choices=["stat", "content"], default="stat",
+        help="what file ETags are made from: stat (date and size) or content (a digest)")
+    opt_parser.add_option("--etag-index", metavar="FILE",
+        help="keep the digests of files in this file between runs, for --etag content")
+    opt_parser.add_option("--elide-writes", action="store_true", default=False,
+        help="leave a file as it is when a PUT sends the contents it already has")
+    opt_parser.add_option("--stat-cache", choices=["none", "inotify", "ttl"], default="none",
+        help="cache file sizes and dates: none, inotify (kept up to date with inotify), or ttl")
+    opt_parser.add_option("--stat-cache-ttl", type="float", default=1.0,
+        help="seconds a cached stat is used for, when it isn't kept up to date with inotify")
+    opt_parser.add_option("--change-feed", action="store_true", default=False,
+        help="send changes to files to clients asking for text/event-stream; needs --workers or --engine async")
+    opt_parser.add_option("--change-feed-window", type="float", default=0.2,
+        help="seconds to wait for more changes before sending them to change feed clients")
+    opt_parser.add_option("--max-body-bytes", type="int", default=0,
+        help="largest request body accepted; 0 for no limit")
+    opt_parser.add_option("--fsync", choices=["none", "file", "dir"], default="none",
+        help="what to flush to disk before answering a PUT: none, file, or dir (the file and its directory)")
+    opt_parser.add_option("--keep-alive", type="int", default=15,
+        help="seconds an idle connection is kept open for another request; 0 closes after every request")
+    opt_parser.add_option("--max-requests", type="int", default=100,
+        help="requests answered on one connection before it is closed; 0 for no limit")
+    (options, args) = opt_parser.parse_args()
+
+    if (len(args) < 3):
+        help()
+
+    global_port       = args[0]
+    global_root       = args[1]
+    global_mimetypes  = args[2]
+    global_workers    = options.workers
+    global_engine     = options.engine
+    global_block_size = options.block_size
+    global_sendfile   = options.sendfile
+    global_fsync      = options.fsync
+
+    global_elide_writes   = options.elide_writes
+    global_max_body_bytes = options.max_body_bytes
+    global_keep_alive     = options.keep_alive
+    global_max_requests   = options.max_requests
+
+    global_content_cache = None
+    if options.cache_bytes > 0:
+        global_content_cache = Content_Cache(options.cache_bytes, options.cache_max_file)
+
+    global_list_cache = None
+    if options.list_cache_bytes > 0:
+        global_list_cache = Content_Cache(options.list_cache_bytes, options.list_cache_bytes)
+
+    global_gzip       = options.gzip
+    global_gzip_cache = None
+    if options.gzip and (options.gzip_cache_bytes > 0):
+        global_gzip_cache = Content_Cache(options.gzip_cache_bytes, options.gzip_cache_bytes)
+
+    try: 
+        global_port = int(global_port)
+    except:
+        error("port argument was not numeric: %s" % global_port)
+
+    if (global_port <= 0) or (global_port >= 65536):
+        error("port argument should be between 1 and 65545")
+
+    if not os.path.exists(global_root):
+        error("root directory does not exist: %s" % global_root)
+
+    if not os.path.isdir(global_root):
+        error("root directory is actually a file: %s" % global_root)
+
+    global_root = os.path.abspath(global_root)
+
+    if options.stat_cache != "none":
+        global_stat_cache = Stat_Cache(global_root, options.stat_cache_ttl, options.stat_cache == "inotify")
+
+    global_mimetypes = parse_mimetypes(global_mimetypes)
+
+    if options.cache_rules:
+        global_cache_rules = parse_cache_rules(options.cache_rules)
+
+    if options.etag_index and (options.etag != "content"):
+        error("etag-index option needs --etag content")
+
+    if options.etag == "content":
+        try:
+            global_digest_index = Digest_Index(options.etag_index)
+        except anydbm.error + (IOError, OSError), e:
+            error("can't open etag index %s: %s" % (options.etag_index, e))
+
+    if global_workers < 0:
+        error("workers option should not be negative")
+
+    if global_block_size <= 0:
+        error("block-size option should be positive")
+
+    if global_max_body_bytes < 0:
+        error("max-body-bytes option should not be negative")
+
+    if options.change_feed and not global_workers and (global_engine != "async"):
+        error("change-feed option needs the workers option, or the async engine")
+
+    if options.change_feed_window < 0:
+        error("change-feed-window option should not be negative")
+
+    if options.stat_cache_ttl < 0:
+        error("stat-cache-ttl option should not be negative")
+
+    if global_keep_alive < 0:
+        error("keep-alive option should not be negative")
+
+    if global_max_requests < 0:
+        error("max-requests option should not be negative")
+
+    if global_sendfile:
+        global_sendfile = find_sendfile()
+
+    # with wsgiref each feed holds a worker, so at most half the workers
+    # serve them; the async engine sends feeds from its loop
+    if options.change_feed:
+        feed_clients = 0
+        if global_engine != "async": feed_clients = max(1, global_workers / 2)
+        global_change_feed = Change_Feed(global_root, options.change_feed_window, feed_clients)
+        try:
+            global_change_feed.start()
+        except OSError, e:
+            error("can not watch for changes: %s" % e)
+
+    #-------------------------------------------------------------------------
+    # create the server, print some help
+    #-------------------------------------------------------------------------
+    if global_engine == "async":
+        global_httpd = Async_Server('localhost', global_port, app_main, global_workers or 4)
+    elif global_workers:
+        global_httpd = wsgiref.simple_server.make_server('localhost', global_port, app_main,
+            server_class=Thread_Pool_Server, handler_class=Request_Handler)
+        global_httpd.start_workers(global_workers)
+    else:
+        global_httpd = wsgiref.simple_server.make_server('localhost', global_port, app_main,
+            handler_class=Request_Handler)
+
+    print "Serving HTTP for root %s as http://localhost:%d/" % (global_root, global_port)
+    print "Press Enter to stop the server."
+    print
+
+    #-------------------------------------------------------------------------
+    # the async engine runs its own loop, which also watches stdin
+    #-------------------------------------------------------------------------
+    if global_engine == "async":
+        global_httpd.serve()
+        print "Shutting down."
+        if global_change_feed: global_change_feed.stop()
+        global_httpd.stop()
+        log_stats()
+        if global_digest_index: global_digest_index.close()
+        sys.stdin.readline()
+        sys.exit()
+
+    #-------------------------------------------------------------------------
+    # process server requests in a loop, waiting also for stdin input
+    # note: I don't think this works on windows
+    #-------------------------------------------------------------------------
+    h_stdin = sys.stdin.fileno()
+    h_httpd = global_httpd.fileno()
+    while True:
+        test_handles = [h_stdin, h_httpd]
+
+        (ready_read, ready_write, ready_error) = select.select(test_handles, [], test_handles)
+
+        if ready_error:
+            print
+            if h_stdin in ready_error: print "Error reading stdin."
+            if h_httpd in ready_error: print "Error reading socket."
+            sys.exit()
+
+        if h_stdin in ready_read:
+            os.close(h_httpd)
+            print "Shutting down."
+            if global_change_feed: global_change_feed.stop()
+            if global_workers: global_httpd.stop_workers()
+            log_stats()
+            if global_digest_index: global_digest_index.close()
+            sys.stdin.readline()
+            sys.exit()
 
-    if h_httpd in ready_read:
-        global_httpd.handle_request()
+        if h_httpd in ready_read:
+            global_httpd.handle_request()
@@ -80,8 +80,18 @@ moduleNames = """
     test_list
     test_redirect
     test_read
+    test_range
+    test_cache
     test_write
     test_cross_origin
+    test_workers
+    test_keep_alive
+    test_stat_cache
+    test_gzip
+    test_cache_rules
+    test_etag_content
+    test_change_feed
+    test_async
     test_browser
 """.split()
 
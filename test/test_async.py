@@ -0,0 +1,214 @@
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import socket
+import httplib
+import unittest
+
+import utils
+
+false = False
+true  = True
+
+#-------------------------------------------------------------------
+class Test(unittest.TestCase):
+    
+    #---------------------------------------------------------------
+    def setUp(self):
+        print
+        self.port   = utils.get_port() + 1
+        self.client = utils.Client(self.port)
+        utils.delete_dir("")
+        utils.create_dir("")
+
+        self.server = utils.Server(["--engine", "async", "--max-body-bytes", "100000", "--max-requests", "5"], self.port)
+        self.server.start()
+        
+    def tearDown(self):
+        self.server.stop()
+        utils.delete_dir("")
+
+    #---------------------------------------------------------------
+    def test_read_write_list(self):
+
+        file1contents = "file 1 contents"
+
+        headers = {"If-None-Match": "*"}
+        response = self.client.request("PUT", "/file.txt", headers, file1contents)
+        (status, reason, body, headers) = response
+
+        self.assertEqual(201, status)
+        etag = utils.get_header("etag", headers)
+
+        response = self.client.request("GET", "/file.txt")
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+        self.assertEqual(file1contents, body)
+        self.assertEqual(etag, utils.get_header("etag", headers))
+
+        response = self.client.request("GET", "/")
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+        body = eval(body)
+        self.assertEqual("file.txt", body["dir"][0]["name"])
+
+        utils.create_dir("dir1")
+        response = self.client.request("GET", "/dir1")
+        (status, reason, body, headers) = response
+
+        self.assertEqual(307, status)
+
+    #---------------------------------------------------------------
+    def test_chunked(self):
+
+        chunks = ["file 1 ", "contents", "x" * 50000]
+
+        response = utils.chunked_put("/file.txt", {"If-None-Match": "*"}, chunks, self.port)
+        self.assertTrue(response.startswith("HTTP/1.1 201"), response)
+        self.assertEqual("".join(chunks), utils.read_file("file.txt"))
+
+        response = utils.chunked_put("/file2.txt", {"If-None-Match": "*"}, ["x" * 50000, "x" * 50001], self.port)
+        self.assertTrue(response.startswith("HTTP/1.1 413"), response)
+
+        response = self.client.request("PUT", "/file2.txt", {"If-None-Match": "*"}, "x" * 100001)
+        self.assertEqual(413, response[0])
+
+        self.assertEqual(None, utils.read_file("file2.txt"))
+
+        # a chunked request is followed by others on the connection
+        sock = socket.create_connection(("localhost", self.port))
+        try:
+            sock.sendall(
+                "PUT /file3.txt HTTP/1.1\r\nIf-None-Match: *\r\nTransfer-Encoding: chunked\r\n\r\n" +
+                "4\r\nabcd\r\n0\r\n\r\n" +
+                "GET /file3.txt HTTP/1.1\r\nConnection: close\r\n\r\n"
+            )
+
+            response = ""
+            while True:
+                data = sock.recv(4096)
+                if not data: break
+                response += data
+        finally:
+            sock.close()
+
+        self.assertTrue(response.startswith("HTTP/1.1 201"), response)
+        self.assertTrue(response.endswith("\r\n\r\nabcd"), response)
+
+    #---------------------------------------------------------------
+    def test_keep_alive(self):
+
+        utils.write_file("file1.txt", "file 1 contents")
+        utils.write_file("file2.txt", "file 2 contents contents")
+
+        connection = httplib.HTTPConnection("localhost", self.port)
+        try:
+            connection.request("GET", "/file1.txt")
+            response = connection.getresponse()
+            self.assertEqual(200, response.status)
+            self.assertEqual("file 1 contents", response.read())
+            sock = connection.sock
+
+            connection.request("GET", "/")
+            response = connection.getresponse()
+            self.assertEqual(200, response.status)
+            self.assertEqual(2, len(eval(response.read())["dir"]))
+
+            connection.request("GET", "/file2.txt")
+            response = connection.getresponse()
+            self.assertEqual(200, response.status)
+            self.assertEqual("file 2 contents contents", response.read())
+
+            self.assertTrue(sock is connection.sock)
+        finally:
+            connection.close()
+
+    #---------------------------------------------------------------
+    def test_pipelining(self):
+
+        utils.write_file("file1.txt", "file 1 contents")
+        utils.write_file("file2.txt", "file 2 contents contents")
+
+        sock = socket.create_connection(("localhost", self.port))
+        try:
+            sock.settimeout(5)
+            sock.sendall(
+                "GET /file1.txt HTTP/1.1\r\nHost: localhost\r\n\r\n"
+                "GET /file2.txt HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+            )
+
+            response = sock.makefile().read()
+        finally:
+            sock.close()
+
+        self.assertEqual(2, response.count("HTTP/1.1 200"))
+        self.assertTrue(response.index("file 1 contents") < response.index("file 2 contents contents"))
+
+    #---------------------------------------------------------------
+    def test_max_requests(self):
+
+        utils.write_file("file.txt", "file contents")
+
+        response = utils.send_raw("GET /file.txt HTTP/1.1\r\nHost: localhost\r\n\r\n" * 7, self.port)
+
+        self.assertEqual(5, response.count("file contents"))
+        self.assertEqual(1, response.count("Connection: close"))
+
+    #---------------------------------------------------------------
+    def test_no_max_requests(self):
+
+        port   = self.port + 1
+        server = utils.Server(["--engine", "async", "--keep-alive", "1", "--max-requests", "0"], port)
+        server.start()
+        try:
+            utils.write_file("file.txt", "file contents")
+
+            response = utils.send_raw("GET /file.txt HTTP/1.1\r\nHost: localhost\r\n\r\n" * 7, port)
+
+            self.assertEqual(7, response.count("file contents"))
+            self.assertEqual(0, response.count("Connection: close"))
+        finally:
+            server.stop()
+
+    #---------------------------------------------------------------
+    def test_idle_connections(self):
+
+        utils.write_file("file.txt", "file contents")
+
+        idle = []
+        try:
+            for index in range(200):
+                idle.append(socket.create_connection(("localhost", self.port)))
+
+            response = self.client.request("GET", "/file.txt")
+            (status, reason, body, headers) = response
+
+            self.assertEqual(200, status)
+            self.assertEqual("file contents", body)
+        finally:
+            for sock in idle: sock.close()
@@ -0,0 +1,140 @@
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import unittest
+
+import utils
+
+false = False
+true  = True
+
+#-------------------------------------------------------------------
+class Test(unittest.TestCase):
+    
+    #---------------------------------------------------------------
+    def setUp(self):
+        print
+        self.port   = utils.get_port() + 1
+        self.client = utils.Client(self.port)
+        utils.delete_dir("")
+        utils.create_dir("")
+
+        self.server = utils.Server(["--cache-bytes", "100", "--cache-max-file", "40", "--list-cache-bytes", "1000"], self.port)
+        self.server.start()
+        
+    def tearDown(self):
+        self.server.stop()
+        utils.delete_dir("")
+
+    #---------------------------------------------------------------
+    def get(self, url, headers={}):
+        response = self.client.request("GET", url, headers)
+        (status, reason, body, headers) = response
+
+        return (status, body, utils.get_header("x-cache", headers), utils.get_header("etag", headers))
+
+    #---------------------------------------------------------------
+    def test_hit_miss(self):
+
+        utils.write_file("file.txt", "file contents")
+
+        self.assertEqual((200, "file contents", "MISS"), self.get("/file.txt")[:3])
+        self.assertEqual((200, "file contents", "HIT"),  self.get("/file.txt")[:3])
+
+    #---------------------------------------------------------------
+    def test_too_large(self):
+
+        utils.write_file("file.txt", "x" * 41)
+
+        self.assertEqual((200, "x" * 41, None), self.get("/file.txt")[:3])
+
+    #---------------------------------------------------------------
+    def test_eviction(self):
+
+        for name in ["a", "b", "c"]:
+            utils.write_file(name, name * 40)
+            self.assertEqual("MISS", self.get("/" + name)[2])
+
+        # a was least recently used, and didn't fit
+        self.assertEqual("HIT",  self.get("/c")[2])
+        self.assertEqual("HIT",  self.get("/b")[2])
+        self.assertEqual("MISS", self.get("/a")[2])
+
+    #---------------------------------------------------------------
+    def test_put_invalidates(self):
+
+        utils.write_file("file.txt", "file contents")
+        (status, body, cache, etag) = self.get("/file.txt")
+        self.assertEqual("HIT", self.get("/file.txt")[2])
+
+        headers = {"If-Match": etag}
+        response = self.client.request("PUT", "/file.txt", headers, "file contents - even more!")
+        (status, reason, body, headers) = response
+        self.assertEqual(200, status)
+
+        self.assertEqual((200, "file contents - even more!", "MISS"), self.get("/file.txt")[:3])
+
+    #---------------------------------------------------------------
+    def test_changed_behind_our_back(self):
+
+        utils.write_file("file.txt", "file contents")
+        self.get("/file.txt")
+
+        utils.write_file("file.txt", "file contents - even more!")
+        self.assertEqual((200, "file contents - even more!", "MISS"), self.get("/file.txt")[:3])
+
+    #---------------------------------------------------------------
+    def test_list(self):
+
+        utils.write_file("file.txt", "file contents")
+
+        (status, body, cache, etag) = self.get("/")
+        self.assertEqual((200, "MISS"), (status, cache))
+        self.assertEqual((200, body, "HIT", etag), self.get("/"))
+
+        self.assertEqual("MISS", self.get("/", {"Accept": "text/html"})[2])
+        self.assertEqual("MISS", self.get("/?limit=1")[2])
+        self.assertEqual("HIT",  self.get("/", {"Accept": "text/html"})[2])
+
+        headers = {"If-Match": self.get("/file.txt")[3]}
+        response = self.client.request("PUT", "/file.txt", headers, "file contents - even more!")
+        self.assertEqual(200, response[0])
+
+        (status, body, cache, etag) = self.get("/")
+        self.assertEqual((200, "MISS"), (status, cache))
+        self.assertEqual(len("file contents - even more!"), eval(body.replace("false", "False"))["dir"][0]["size"])
+
+        utils.write_file("file2.txt", "file 2 contents")
+        self.assertEqual("MISS", self.get("/")[2])
+
+    #---------------------------------------------------------------
+    def test_list_too_large(self):
+
+        for index in range(10):
+            utils.write_file("file-%d.txt" % index, "")
+
+        self.assertEqual("MISS", self.get("/")[2])
+        self.assertEqual("MISS", self.get("/")[2])
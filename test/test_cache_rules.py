@@ -0,0 +1,114 @@
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import tempfile
+import unittest
+
+import utils
+
+rules = r"""
+# fingerprinted assets never change
+regex  \.[0-9a-f]{8,}\.(js|css)$   public, max-age=31536000, immutable
+
+glob   /private/*                  no-store
+glob   *.html                      max-age=60
+type   image/*                     max-age=3600
+"""
+
+#-------------------------------------------------------------------
+# Cache-Control headers from --cache-rules
+#-------------------------------------------------------------------
+class Test(unittest.TestCase):
+
+    #---------------------------------------------------------------
+    def setUp(self):
+        print
+        self.port   = utils.get_port() + 1
+        self.client = utils.Client(self.port)
+        utils.delete_dir("")
+        utils.create_dir("")
+
+        (fd, self.rules_name) = tempfile.mkstemp()
+        os.write(fd, rules)
+        os.close(fd)
+
+        self.server = utils.Server(["--cache-rules", self.rules_name], self.port)
+        self.server.start()
+        
+    def tearDown(self):
+        self.server.stop()
+        utils.delete_dir("")
+        os.remove(self.rules_name)
+
+    #---------------------------------------------------------------
+    def cache_control(self, url, headers={}, method="GET"):
+        (status, reason, body, headers) = self.client.request(method, url, headers)
+        return (status, utils.get_header("cache-control", headers), utils.get_header("etag", headers))
+
+    #---------------------------------------------------------------
+    def test_rules(self):
+        for name in ["app.3f2a1b9c.js", "app.js", "private/app.3f2a1b9c.css", "private/notes.txt",
+                     "dir/index.html", "logo.png", "notes.txt"]:
+            if "/" in name: utils.create_dir(name.split("/")[0])
+            utils.write_file(name, "contents")
+
+        for (url, expected) in [
+            ("/app.3f2a1b9c.js",           "public, max-age=31536000, immutable"),
+            ("/app.js",                    "no-cache"),
+            ("/private/app.3f2a1b9c.css",  "public, max-age=31536000, immutable"),
+            ("/private/notes.txt",         "no-store"),
+            ("/dir/index.html",            "max-age=60"),
+            ("/logo.png",                  "max-age=3600"),
+            ("/notes.txt",                 "no-cache"),
+        ]:
+            (status, cache_control, etag) = self.cache_control(url)
+            self.assertEqual(200, status)
+            self.assertEqual(expected, cache_control, url)
+
+            (status, cache_control, etag) = self.cache_control(url, {}, "HEAD")
+            self.assertEqual(expected, cache_control, url)
+
+    #---------------------------------------------------------------
+    def test_not_modified_and_ranges(self):
+        utils.write_file("app.3f2a1b9c.js", "contents")
+
+        (status, cache_control, etag) = self.cache_control("/app.3f2a1b9c.js")
+
+        (status, cache_control, etag) = self.cache_control("/app.3f2a1b9c.js", {"If-None-Match": etag})
+        self.assertEqual(304, status)
+        self.assertEqual("public, max-age=31536000, immutable", cache_control)
+
+        (status, cache_control, etag) = self.cache_control("/app.3f2a1b9c.js", {"Range": "bytes=0-3"})
+        self.assertEqual(206, status)
+        self.assertEqual("public, max-age=31536000, immutable", cache_control)
+
+        # listings and errors aren't covered by the rules
+        (status, cache_control, etag) = self.cache_control("/")
+        self.assertEqual("no-cache", cache_control)
+
+        (status, cache_control, etag) = self.cache_control("/missing.3f2a1b9c.js")
+        self.assertEqual(404, status)
+        self.assertEqual("no-cache", cache_control)
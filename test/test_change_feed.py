@@ -0,0 +1,242 @@
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+import os
+import json
+import socket
+import unittest
+
+import utils
+
+false = False
+true  = True
+
+#-------------------------------------------------------------------
+# a client reading a change feed
+#-------------------------------------------------------------------
+class Feed:
+
+    def __init__(self, port, url, last_id=None):
+        self.sock = socket.create_connection(("localhost", port))
+        self.sock.settimeout(5)
+
+        request = "GET %s HTTP/1.0\r\nAccept: text/event-stream\r\n" % url
+        if last_id: request += "Last-Event-ID: %s\r\n" % last_id
+        self.sock.sendall(request + "\r\n")
+
+        self.buffer = ""
+        self.status = self.read_until("\r\n\r\n").split(" ")[1]
+
+    def read_until(self, end):
+        while end not in self.buffer:
+            data = self.sock.recv(4096)
+            if not data: raise EOFError("feed closed")
+            self.buffer += data
+
+        (result, end, self.buffer) = self.buffer.partition(end)
+        return result
+
+    # returns the next event as (id, event, data), skipping comments
+    def next_event(self):
+        while True:
+            fields = {}
+            for line in self.read_until("\n\n").split("\n"):
+                if line.startswith(":"): continue
+                (key, sep, value) = line.partition(": ")
+                fields[key] = value
+
+            if fields: return (fields["id"], fields["event"], json.loads(fields["data"]))
+
+    # returns (type, path, etag) for the next count changes
+    def next_changes(self, count):
+        changes = []
+        for index in range(count):
+            (id, event, data) = self.next_event()
+            self.last_id = id
+            changes.append((data["type"], data["path"], data["etag"]))
+        return changes
+
+    def close(self):
+        self.sock.close()
+
+#-------------------------------------------------------------------
+class Test(unittest.TestCase):
+
+    options = ["--workers", "4", "--change-feed", "--change-feed-window", "0.1"]
+    
+    #---------------------------------------------------------------
+    def setUp(self):
+        print
+        self.port   = utils.get_port() + 1
+        self.client = utils.Client(self.port)
+        utils.delete_dir("")
+        utils.create_dir("")
+
+        self.server = utils.Server(self.options, self.port)
+        self.server.start()
+
+        self.feeds = []
+        
+    def tearDown(self):
+        for feed in self.feeds: feed.close()
+        self.server.stop()
+        utils.delete_dir("")
+
+    #---------------------------------------------------------------
+    def open_feed(self, url, last_id=None):
+        feed = Feed(self.port, url, last_id)
+        self.feeds.append(feed)
+
+        if feed.status == "200":
+            (id, event, data) = feed.next_event()
+            self.assertEqual("ready", event)
+            feed.last_id = id
+
+        return feed
+
+    #---------------------------------------------------------------
+    def get_etag(self, url):
+        (status, reason, body, headers) = self.client.request("HEAD", url)
+        return utils.get_header("etag", headers)
+
+    #---------------------------------------------------------------
+    def test_changes(self):
+        utils.write_file("file.txt", "contents")
+
+        feed = self.open_feed("/")
+
+        utils.write_file("file.txt", "new contents")
+        self.assertEqual([("modified", "file.txt", self.get_etag("/file.txt"))], feed.next_changes(1))
+
+        utils.create_dir("dir")
+        self.assertEqual([("created", "dir", None)], feed.next_changes(1))
+
+        utils.write_file("dir/new.txt", "new")
+        self.assertEqual([("created", "dir/new.txt", self.get_etag("/dir/new.txt"))], feed.next_changes(1))
+
+        os.remove(utils.get_file_name("file.txt"))
+        self.assertEqual([("deleted", "file.txt", None)], feed.next_changes(1))
+
+        os.rename(utils.get_file_name("dir"), utils.get_file_name("moved"))
+        self.assertEqual([
+            ("deleted", "dir/new.txt",   None),
+            ("deleted", "dir",           None),
+            ("created", "moved",         None),
+            ("created", "moved/new.txt", self.get_etag("/moved/new.txt")),
+        ], feed.next_changes(4))
+
+    #---------------------------------------------------------------
+    def test_put(self):
+        feed = self.open_feed("/")
+
+        headers = {"If-None-Match": "*"}
+        (status, reason, body, headers) = self.client.request("PUT", "/file.txt", headers, "contents")
+        self.assertEqual(201, status)
+
+        self.assertEqual([("created", "file.txt", utils.get_header("etag", headers))], feed.next_changes(1))
+
+    #---------------------------------------------------------------
+    def test_subtree(self):
+        utils.create_dir("dir1/sub")
+        utils.create_dir("dir2")
+
+        feed = self.open_feed("/dir1/")
+
+        utils.write_file("dir2/file.txt", "contents")
+        utils.write_file("dir1/sub/file.txt", "contents")
+
+        # sub is reported after the feed opens if the feed's thread hadn't
+        # seen it being created yet
+        changes = feed.next_changes(1)
+        if changes == [("created", "sub", None)]: changes = feed.next_changes(1)
+
+        self.assertEqual([("created", "sub/file.txt", self.get_etag("/dir1/sub/file.txt"))], changes)
+
+    #---------------------------------------------------------------
+    def test_coalesced(self):
+        feed = self.open_feed("/")
+
+        utils.write_file("file.txt", "1")
+        utils.write_file("file.txt", "22")
+        utils.write_file("file.txt", "333")
+
+        utils.write_file("gone.txt", "contents")
+        os.remove(utils.get_file_name("gone.txt"))
+
+        utils.write_file("last.txt", "contents")
+
+        self.assertEqual([
+            ("created", "file.txt", self.get_etag("/file.txt")),
+            ("created", "last.txt", self.get_etag("/last.txt")),
+        ], feed.next_changes(2))
+
+    #---------------------------------------------------------------
+    def test_resume(self):
+        feed = self.open_feed("/")
+
+        utils.write_file("file1.txt", "contents")
+        feed.next_changes(1)
+        feed.close()
+
+        utils.write_file("file2.txt", "contents")
+        utils.write_file("file3.txt", "contents")
+
+        feed = self.open_feed("/", feed.last_id)
+        self.assertEqual(["file2.txt", "file3.txt"], [path for (kind, path, etag) in feed.next_changes(2)])
+
+        # an id from another run of the server
+        feed = Feed(self.port, "/", "1234-5")
+        self.feeds.append(feed)
+        self.assertEqual("reset", feed.next_event()[1])
+
+    #---------------------------------------------------------------
+    def test_too_many_feeds(self):
+        self.open_feed("/")
+        self.open_feed("/")
+
+        feed = self.open_feed("/")
+        self.assertEqual("503", feed.status)
+
+    #---------------------------------------------------------------
+    def test_not_enabled(self):
+        (status, reason, body, headers) = utils.Client().request("GET", "/", {"Accept": "text/event-stream"})
+        self.assertEqual(501, status)
+
+#-------------------------------------------------------------------
+class Test_Async(Test):
+
+    options = ["--engine", "async", "--change-feed", "--change-feed-window", "0.1"]
+
+    #---------------------------------------------------------------
+    # feeds are sent from the loop, so they don't use up the workers
+    def test_too_many_feeds(self):
+        feeds = [self.open_feed("/") for index in range(10)]
+        for feed in feeds: self.assertEqual("200", feed.status)
+
+        (status, reason, body, headers) = self.client.request("GET", "/")
+        self.assertEqual(200, status)
+
+        utils.write_file("file.txt", "contents")
+        for feed in feeds:
+            self.assertEqual([("created", "file.txt", self.get_etag("/file.txt"))], feed.next_changes(1))
@@ -0,0 +1,156 @@
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import time
+import shutil
+import anydbm
+import hashlib
+import tempfile
+import unittest
+
+import utils
+
+#-------------------------------------------------------------------
+# ETags made from file contents, with --etag content
+#-------------------------------------------------------------------
+class Test(unittest.TestCase):
+
+    #---------------------------------------------------------------
+    def setUp(self):
+        print
+        self.port   = utils.get_port() + 1
+        self.client = utils.Client(self.port)
+        utils.delete_dir("")
+        utils.create_dir("")
+
+        self.index_dir = tempfile.mkdtemp()
+        self.start_server()
+        
+    def tearDown(self):
+        self.server.stop()
+        utils.delete_dir("")
+        shutil.rmtree(self.index_dir)
+
+    #---------------------------------------------------------------
+    def start_server(self):
+        index_name = os.path.join(self.index_dir, "etags")
+        self.server = utils.Server(["--etag", "content", "--etag-index", index_name], self.port)
+        self.server.start()
+
+    #---------------------------------------------------------------
+    def get_etag(self, url, headers={}):
+        (status, reason, body, headers) = self.client.request("GET", url, headers)
+        return (status, utils.get_header("etag", headers))
+
+    #---------------------------------------------------------------
+    def digest(self, contents):
+        return '"%s"' % hashlib.sha1(contents).hexdigest()
+
+    #---------------------------------------------------------------
+    def test_touched(self):
+        utils.write_file("file.txt", "contents")
+
+        (status, etag) = self.get_etag("/file.txt")
+        self.assertEqual(self.digest("contents"), etag)
+
+        os.utime(utils.get_file_name("file.txt"), (1000000000, 1000000000))
+
+        (status, etag) = self.get_etag("/file.txt", {"If-None-Match": etag})
+        self.assertEqual(304, status)
+        self.assertEqual(self.digest("contents"), etag)
+
+    #---------------------------------------------------------------
+    def test_same_size_same_second(self):
+        utils.write_file("file.txt", "contents 1")
+        (status, etag1) = self.get_etag("/file.txt")
+
+        utils.write_file("file.txt", "contents 2")
+        (status, etag2) = self.get_etag("/file.txt", {"If-None-Match": etag1})
+
+        self.assertEqual(200, status)
+        self.assertEqual(self.digest("contents 2"), etag2)
+
+    #---------------------------------------------------------------
+    def test_put(self):
+        headers = {"If-None-Match": "*"}
+        (status, reason, body, headers) = self.client.request("PUT", "/file.txt", headers, "contents")
+        self.assertEqual(201, status)
+        self.assertEqual(self.digest("contents"), utils.get_header("etag", headers))
+
+        headers = {"If-Match": self.digest("contents")}
+        (status, reason, body, headers) = self.client.request("PUT", "/file.txt", headers, "new contents")
+        self.assertEqual(200, status)
+        self.assertEqual(self.digest("new contents"), utils.get_header("etag", headers))
+
+        (status, etag) = self.get_etag("/file.txt")
+        self.assertEqual(self.digest("new contents"), etag)
+
+    #---------------------------------------------------------------
+    def test_large_and_restart(self):
+        contents = "".join("line %d of a large file\n" % i for i in xrange(100000))
+        utils.write_file("large.txt", contents)
+
+        # the digest is worked out while the file is first sent
+        (status, etag) = self.get_etag("/large.txt")
+        self.assertEqual(200, status)
+        self.assertTrue(etag.startswith('W/"'), etag)
+
+        (status, etag) = self.get_etag("/large.txt")
+        self.assertEqual(self.digest(contents), etag)
+
+        # an updated large file can be updated again straight away
+        headers = {"If-Match": etag}
+        (status, reason, body, headers) = self.client.request("PUT", "/large.txt", headers, contents + "more\n")
+        self.assertEqual(200, status)
+        self.assertEqual(self.digest(contents + "more\n"), utils.get_header("etag", headers))
+
+        # digests are kept between runs; the server's stop() would delete the files
+        self.server.process.stdin.write("\n")
+        self.server.process.wait()
+        self.start_server()
+
+        (status, etag) = self.get_etag("/large.txt")
+        self.assertEqual(self.digest(contents + "more\n"), etag)
+
+    #---------------------------------------------------------------
+    def test_put_replaces_entry(self):
+        headers = {"If-None-Match": "*"}
+        (status, reason, body, headers) = self.client.request("PUT", "/file.txt", headers, "contents 0")
+
+        for index in range(1, 5):
+            headers = {"If-Match": utils.get_header("etag", headers)}
+            (status, reason, body, headers) = self.client.request("PUT", "/file.txt", headers, "contents %d" % index)
+            self.assertEqual(200, status)
+
+        self.server.process.stdin.write("\n")
+        self.server.process.wait()
+
+        index = anydbm.open(os.path.join(self.index_dir, "etags"), "r")
+        try:
+            self.assertEqual(1, len(index.keys()))
+            self.assertTrue(index[index.keys()[0]].endswith(hashlib.sha1("contents 4").hexdigest()))
+        finally:
+            index.close()
@@ -0,0 +1,179 @@
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import gzip
+import StringIO
+import unittest
+
+import utils
+
+#-------------------------------------------------------------------
+# files sent gzip'ed, with --gzip
+#-------------------------------------------------------------------
+class Test(unittest.TestCase):
+
+    options = ["--gzip", "--gzip-cache-bytes", "1000000"]
+    
+    #---------------------------------------------------------------
+    def setUp(self):
+        print
+        self.port   = utils.get_port() + 1
+        self.client = utils.Client(self.port)
+        utils.delete_dir("")
+        utils.create_dir("")
+
+        self.server = utils.Server(self.options, self.port)
+        self.server.start()
+        
+    def tearDown(self):
+        self.server.stop()
+        utils.delete_dir("")
+
+    #---------------------------------------------------------------
+    def get(self, url, headers={}, method="GET"):
+        (status, reason, body, headers) = self.client.request(method, url, headers)
+        return (status, body, dict(headers))
+
+    #---------------------------------------------------------------
+    def gunzip(self, body):
+        return gzip.GzipFile(fileobj=StringIO.StringIO(body)).read()
+
+    #---------------------------------------------------------------
+    def test_compressed(self):
+        contents = "some compressible text\n" * 100
+        utils.write_file("file.txt", contents)
+
+        (status, body, headers) = self.get("/file.txt", {"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(200, status)
+        self.assertEqual("gzip", headers.get("content-encoding"))
+        self.assertEqual("Accept-Encoding", headers.get("vary"))
+        self.assertEqual("text/plain", headers.get("content-type"))
+        self.assertEqual("MISS", headers.get("x-cache"))
+        self.assertEqual(str(len(body)), headers.get("content-length"))
+        self.assertTrue(len(body) < len(contents))
+        self.assertEqual(contents, self.gunzip(body))
+
+        gzip_etag = headers["etag"]
+
+        (status, body, headers) = self.get("/file.txt", {"Accept-Encoding": "gzip"})
+        self.assertEqual("HIT", headers.get("x-cache"))
+        self.assertEqual(contents, self.gunzip(body))
+        self.assertEqual(gzip_etag, headers["etag"])
+
+        (status, body, headers) = self.get("/file.txt", {"Accept-Encoding": "gzip"}, "HEAD")
+        self.assertEqual(200, status)
+        self.assertEqual("", body)
+        self.assertEqual("gzip", headers.get("content-encoding"))
+
+        # the plain file has a different ETag
+        (status, body, headers) = self.get("/file.txt")
+        self.assertEqual(200, status)
+        self.assertEqual(None, headers.get("content-encoding"))
+        self.assertEqual("Accept-Encoding", headers.get("vary"))
+        self.assertEqual(contents, body)
+        self.assertNotEqual(gzip_etag, headers["etag"])
+
+        (status, body, headers) = self.get("/file.txt", {"Accept-Encoding": "gzip", "If-None-Match": gzip_etag})
+        self.assertEqual(304, status)
+        self.assertEqual("Accept-Encoding", headers.get("vary"))
+
+        (status, body, headers) = self.get("/file.txt", {"If-None-Match": gzip_etag})
+        self.assertEqual(200, status)
+
+        # a changed file isn't sent from the cache
+        utils.write_file("file.txt", "different text\n" * 100)
+
+        (status, body, headers) = self.get("/file.txt", {"Accept-Encoding": "gzip"})
+        self.assertEqual("different text\n" * 100, self.gunzip(body))
+        self.assertNotEqual(gzip_etag, headers["etag"])
+
+    #---------------------------------------------------------------
+    def test_not_compressed(self):
+        contents = "some compressible text\n" * 100
+        utils.write_file("file.txt", contents)
+        utils.write_file("image.png", contents)
+        utils.write_file("small.txt", "small")
+
+        for (url, accept_encoding) in [
+            ("/file.txt",  "deflate"),
+            ("/file.txt",  "gzip;q=0"),
+            ("/file.txt",  "*;q=0.5, gzip;q=0"),
+            ("/image.png", "gzip"),
+            ("/small.txt", "gzip"),
+        ]:
+            (status, body, headers) = self.get(url, {"Accept-Encoding": accept_encoding})
+            self.assertEqual(200, status)
+            self.assertEqual(None, headers.get("content-encoding"), url + " " + accept_encoding)
+
+        (status, body, headers) = self.get("/image.png", {"Accept-Encoding": "gzip"})
+        self.assertEqual(None, headers.get("vary"))
+
+        (status, body, headers) = self.get("/file.txt", {"Accept-Encoding": "*"})
+        self.assertEqual("gzip", headers.get("content-encoding"))
+
+        # ranges are of the file as it is
+        (status, body, headers) = self.get("/file.txt", {"Accept-Encoding": "gzip", "Range": "bytes=0-3"})
+        self.assertEqual(206, status)
+        self.assertEqual(None, headers.get("content-encoding"))
+        self.assertEqual("some", body)
+
+    #---------------------------------------------------------------
+    def test_sidecar(self):
+        contents = "some compressible text\n" * 100
+        utils.write_file("file.js", contents)
+
+        sidecar = StringIO.StringIO()
+        file = gzip.GzipFile(fileobj=sidecar, mode="wb", compresslevel=9)
+        file.write(contents)
+        file.close()
+        utils.write_file("file.js.gz", sidecar.getvalue())
+
+        (status, body, headers) = self.get("/file.js", {"Accept-Encoding": "gzip"})
+        self.assertEqual(200, status)
+        self.assertEqual("gzip", headers.get("content-encoding"))
+        self.assertEqual(None, headers.get("x-cache"))
+        self.assertEqual(sidecar.getvalue(), body)
+
+        # an older sidecar isn't used
+        sidecar_name = utils.get_file_name("file.js.gz")
+        mtime = os.stat(utils.get_file_name("file.js")).st_mtime
+        os.utime(sidecar_name, (mtime - 10, mtime - 10))
+
+        (status, body, headers) = self.get("/file.js", {"Accept-Encoding": "gzip"})
+        self.assertEqual("gzip", headers.get("content-encoding"))
+        self.assertEqual("MISS", headers.get("x-cache"))
+        self.assertEqual(contents, self.gunzip(body))
+
+    #---------------------------------------------------------------
+    def test_large(self):
+        contents = "".join("line %d of a large file\n" % i for i in xrange(100000))
+        utils.write_file("large.txt", contents)
+
+        (status, body, headers) = self.get("/large.txt", {"Accept-Encoding": "gzip"})
+        self.assertEqual(200, status)
+        self.assertEqual("gzip", headers.get("content-encoding"))
+        self.assertEqual(None, headers.get("content-length"))
+        self.assertEqual(contents, self.gunzip(body))
@@ -0,0 +1,269 @@
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+import re
+import time
+import socket
+import httplib
+import unittest
+
+import utils
+
+false = False
+true  = True
+
+#-------------------------------------------------------------------
+class Test(unittest.TestCase):
+    
+    #---------------------------------------------------------------
+    def setUp(self):
+        print
+        self.port = utils.get_port() + 1
+        utils.delete_dir("")
+        utils.create_dir("")
+
+        options = ["--workers", "4", "--keep-alive", "1", "--max-requests", "5"]
+        self.server = utils.Server(options, self.port)
+        self.server.start()
+        
+    def tearDown(self):
+        self.server.stop()
+        utils.delete_dir("")
+
+    #---------------------------------------------------------------
+    def connect(self):
+        return httplib.HTTPConnection("localhost", self.port)
+
+    #---------------------------------------------------------------
+    def request(self, connection, method, url, headers={}, body=""):
+        connection.request(method, url, body, headers)
+        response = connection.getresponse()
+        return (response.status, response.read(), response)
+
+    #---------------------------------------------------------------
+    # send raw requests, reading until the server closes the connection
+    def send_raw(self, data):
+        connection = socket.create_connection(("localhost", self.port))
+        connection.settimeout(5)
+        connection.sendall(data)
+
+        response = ""
+        while True:
+            data = connection.recv(4096)
+            if not data: break
+            response += data
+        connection.close()
+
+        return response
+
+    #---------------------------------------------------------------
+    def test_reuse(self):
+        utils.create_dir("dir1")
+        utils.write_file("dir1/file.txt", "file contents")
+
+        connection = self.connect()
+        try:
+            (status, body, response) = self.request(connection, "GET", "/dir1/file.txt")
+            self.assertEqual(200, status)
+            self.assertEqual("file contents", body)
+            self.assertEqual(None, response.getheader("connection"))
+
+            sock = connection.sock
+            self.assertNotEqual(None, sock)
+
+            # listings have no Content-Length, so are sent chunked
+            (status, body, response) = self.request(connection, "GET", "/dir1/")
+            self.assertEqual(200, status)
+            self.assertEqual("chunked", response.getheader("transfer-encoding"))
+            self.assertTrue('"name": "file.txt"' in body)
+
+            (status, body, response) = self.request(connection, "HEAD", "/dir1/file.txt")
+            self.assertEqual(200, status)
+            self.assertEqual("", body)
+
+            (status, body, response) = self.request(connection, "GET", "/dir1/missing.txt")
+            self.assertEqual(404, status)
+
+            self.assertTrue(sock is connection.sock)
+        finally:
+            connection.close()
+
+    #---------------------------------------------------------------
+    def test_not_modified(self):
+        utils.write_file("file.txt", "file contents")
+
+        connection = self.connect()
+        try:
+            (status, body, response) = self.request(connection, "GET", "/file.txt")
+            etag = response.getheader("etag")
+
+            (status, body, response) = self.request(connection, "GET", "/file.txt", {"If-None-Match": etag})
+            self.assertEqual(304, status)
+            self.assertEqual(None, response.getheader("content-length"))
+
+            # a body on the 304 would be read as the next response
+            (status, body, response) = self.request(connection, "GET", "/file.txt")
+            self.assertEqual(200, status)
+            self.assertEqual("file contents", body)
+        finally:
+            connection.close()
+
+    #---------------------------------------------------------------
+    def test_unread_body(self):
+        connection = self.connect()
+        try:
+            # the body of a PUT refused without reading it is skipped
+            (status, body, response) = self.request(connection, "PUT", "/file.txt", {}, "x" * 1000)
+            self.assertEqual(412, status)
+
+            sock = connection.sock
+
+            headers = {"If-None-Match": "*"}
+            (status, body, response) = self.request(connection, "PUT", "/file.txt", headers, "new contents")
+            self.assertEqual(201, status)
+            self.assertEqual("new contents", utils.read_file("file.txt"))
+
+            self.assertTrue(sock is connection.sock)
+        finally:
+            connection.close()
+
+    #---------------------------------------------------------------
+    def test_pipelining(self):
+        utils.write_file("file1.txt", "file 1 contents")
+        utils.write_file("file2.txt", "file 2 contents")
+
+        response = self.send_raw(
+            "GET /file1.txt HTTP/1.1\r\nHost: localhost\r\n\r\n" +
+            "HEAD /file2.txt HTTP/1.1\r\nHost: localhost\r\n\r\n" +
+            "GET /missing.txt HTTP/1.1\r\nHost: localhost\r\n\r\n" +
+            "GET /file2.txt HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+        )
+
+        statuses = re.findall(r"HTTP/1.1 (\d+) ", response)
+        self.assertEqual(["200", "200", "404", "200"], statuses)
+
+        self.assertEqual(1, response.count("file 1 contents"))
+        self.assertEqual(1, response.count("file 2 contents"))
+        self.assertTrue(response.endswith("\r\n\r\nfile 2 contents"))
+        self.assertTrue(response.index("file 1 contents") < response.index("NOT FOUND"))
+
+    #---------------------------------------------------------------
+    # a body whose end can't be found closes the connection, so nothing
+    # after it is read as another request
+    def test_negative_length(self):
+        utils.write_file("file1.txt", "file 1 contents")
+        utils.write_file("file2.txt", "file 2 contents")
+
+        response = self.send_raw(
+            "GET /file1.txt HTTP/1.1\r\nHost: localhost\r\nContent-Length: -1\r\n\r\n" +
+            "GET /file2.txt HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+        )
+
+        statuses = re.findall(r"HTTP/1.1 (\d+) ", response)
+        self.assertEqual(["200"], statuses)
+        self.assertEqual(0, response.count("file 2 contents"))
+
+    #---------------------------------------------------------------
+    def test_max_requests(self):
+        utils.write_file("file.txt", "file contents")
+
+        response = self.send_raw("GET /file.txt HTTP/1.1\r\nHost: localhost\r\n\r\n" * 7)
+
+        self.assertEqual(5, response.count("file contents"))
+        self.assertEqual(1, response.count("Connection: close"))
+
+    #---------------------------------------------------------------
+    def test_no_max_requests(self):
+        port   = self.port + 1
+        server = utils.Server(["--workers", "4", "--keep-alive", "1", "--max-requests", "0"], port)
+        server.start()
+        try:
+            utils.write_file("file.txt", "file contents")
+
+            response = utils.send_raw("GET /file.txt HTTP/1.1\r\nHost: localhost\r\n\r\n" * 7, port)
+
+            self.assertEqual(7, response.count("file contents"))
+            self.assertEqual(0, response.count("Connection: close"))
+        finally:
+            server.stop()
+
+    #---------------------------------------------------------------
+    def test_file_shrunk(self):
+        port   = self.port + 1
+        server = utils.Server(["--workers", "4", "--stat-cache", "ttl", "--stat-cache-ttl", "30"], port)
+        server.start()
+        try:
+            utils.write_file("file.txt", "x" * 100)
+
+            response = utils.send_raw("GET /file.txt HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n", port)
+            self.assertTrue("Content-Length: 100" in response, response)
+
+            # the cached stat still says 100 bytes
+            utils.write_file("file.txt", "x" * 10)
+
+            response = utils.send_raw("GET /file.txt HTTP/1.1\r\nHost: localhost\r\n\r\n" * 2, port)
+            self.assertTrue("Content-Length: 100" in response, response)
+            self.assertEqual(1, response.count("HTTP/1.1 200"))
+        finally:
+            server.stop()
+
+    #---------------------------------------------------------------
+    def test_idle_timeout(self):
+        utils.write_file("file.txt", "file contents")
+
+        start    = time.time()
+        response = self.send_raw("GET /file.txt HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        elapsed  = time.time() - start
+
+        self.assertTrue(response.endswith("file contents"))
+        self.assertTrue(elapsed >= 0.9)
+        self.assertTrue(elapsed < 4)
+
+    #---------------------------------------------------------------
+    def test_http_1_0(self):
+        utils.write_file("file.txt", "file contents")
+
+        response = self.send_raw(
+            "GET /file.txt HTTP/1.0\r\nConnection: keep-alive\r\n\r\n" +
+            "GET /file.txt HTTP/1.0\r\n\r\n"
+        )
+
+        self.assertEqual(2, response.count("file contents"))
+        self.assertEqual(1, response.count("Connection: keep-alive"))
+
+        # without a Content-Length, an HTTP/1.0 response ends at the close
+        response = self.send_raw("GET / HTTP/1.0\r\nConnection: keep-alive\r\n\r\n")
+        self.assertTrue(response.startswith("HTTP/1.1 200"))
+        self.assertTrue("Connection: close" in response)
+        self.assertTrue(response.endswith("]}\n"))
+
+    #---------------------------------------------------------------
+    def test_no_keep_alive_without_workers(self):
+        utils.write_file("file.txt", "file contents")
+
+        # the server shared by the other tests has no workers
+        response = utils.send_raw("GET /file.txt HTTP/1.1\r\nHost: localhost\r\n\r\n" * 2)
+
+        self.assertTrue(response.startswith("HTTP/1.0 200"))
+        self.assertEqual(1, response.count("file contents"))
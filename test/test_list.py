@@ -174,6 +174,293 @@ class Test(unittest.TestCase):
         self.assertEqual("file1.txt",    body[0]["name"])
         self.assertEqual(False,          body[0]["is_dir"])
 
+    #---------------------------------------------------------------
+    def test_many_files(self):
+
+        count = 1000
+        for index in range(count):
+            utils.write_file("file-%04d.txt" % index, "x" * index)
+
+        response = self.client.request("GET", "/")
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+
+        body = eval(body)
+        body = body["dir"]
+
+        self.assertEqual(count, len(body))
+
+        for index in range(count):
+            self.assertEqual("file-%04d.txt" % index, body[index]["name"])
+            self.assertEqual(index,                   body[index]["size"])
+
+        response = self.client.request("GET", "/", {"Accept": "text/html"})
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+        self.assertEqual(count, body.count("<tr>"))
+        self.assertTrue(body.endswith("</html>\n"))
+
+    #---------------------------------------------------------------
+    def list_names(self, path):
+        response = self.client.request("GET", path)
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+
+        body = eval(body)
+        names = [entry["name"] for entry in body["dir"]]
+
+        return (names, body.get("next"))
+
+    #---------------------------------------------------------------
+    def test_pages(self):
+
+        names = ["file-%02d.txt" % index for index in range(25)]
+        for name in names:
+            utils.write_file(name, name)
+
+        listed = []
+        path   = "/?limit=10"
+        while True:
+            (page, next) = self.list_names(path)
+            listed.extend(page)
+            if not next: break
+
+            self.assertEqual(10, len(page))
+            path = "/?limit=10&cursor=%s" % next
+
+        self.assertEqual(names, listed)
+
+        # the same page and cursor, as long as the directory is unchanged
+        (page1, next1) = self.list_names("/?limit=10")
+        (page2, next2) = self.list_names("/?limit=10")
+        self.assertEqual(page1, page2)
+        self.assertEqual(next1, next2)
+
+        # the next page follows the cursor's entry, even if others change
+        utils.write_file("file-00a.txt", "")
+        (page, next) = self.list_names("/?limit=5&cursor=%s" % next1)
+        self.assertEqual(names[10:15], page)
+
+        response = self.client.request("GET", "/?limit=10", {"Accept": "text/html"})
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+        self.assertEqual(10, body.count("<tr>"))
+        self.assertTrue("<a href='?limit=10&amp;cursor=" in body)
+
+    #---------------------------------------------------------------
+    def test_sort(self):
+
+        utils.write_file("b.txt", "xxx")
+        utils.write_file("a.txt", "xxxxx")
+        utils.write_file("c.txt", "x")
+
+        (names, next) = self.list_names("/?order=desc")
+        self.assertEqual(["c.txt", "b.txt", "a.txt"], names)
+
+        (names, next) = self.list_names("/?sort=size")
+        self.assertEqual(["c.txt", "b.txt", "a.txt"], names)
+
+        (names, next) = self.list_names("/?sort=size&order=desc&limit=2")
+        self.assertEqual(["a.txt", "b.txt"], names)
+
+        (names, next) = self.list_names("/?sort=size&order=desc&limit=2&cursor=%s" % next)
+        self.assertEqual(["c.txt"], names)
+        self.assertEqual(None, next)
+
+        os.utime(utils.get_file_name("a.txt"), (1000, 1000))
+        os.utime(utils.get_file_name("b.txt"), (3000, 3000))
+        os.utime(utils.get_file_name("c.txt"), (2000, 2000))
+
+        (names, next) = self.list_names("/?sort=date")
+        self.assertEqual(["a.txt", "c.txt", "b.txt"], names)
+
+    #---------------------------------------------------------------
+    def test_filter(self):
+
+        for name in ["a.txt", "a.html", "b.txt", "ab.txt"]:
+            utils.write_file(name, name)
+
+        (names, next) = self.list_names("/?glob=*.txt")
+        self.assertEqual(["a.txt", "ab.txt", "b.txt"], names)
+
+        (names, next) = self.list_names("/?prefix=a")
+        self.assertEqual(["a.html", "a.txt", "ab.txt"], names)
+
+        (names, next) = self.list_names("/?prefix=a&glob=*.txt&limit=1")
+        self.assertEqual(["a.txt"], names)
+
+        (names, next) = self.list_names("/?prefix=a&glob=*.txt&limit=1&cursor=%s" % next)
+        self.assertEqual(["ab.txt"], names)
+
+    #---------------------------------------------------------------
+    def test_bad_query(self):
+
+        for query in ["limit=0", "limit=x", "sort=color", "order=up", "cursor=x", "limit=1&limit=2", "dates=yes"]:
+            response = self.client.request("GET", "/?" + query)
+            (status, reason, body, headers) = response
+
+            self.assertEqual(400, status, query)
+
+        # a cursor for one sort can't be used with another
+        utils.write_file("a.txt", "")
+        utils.write_file("b.txt", "")
+        (names, next) = self.list_names("/?limit=1")
+
+        response = self.client.request("GET", "/?sort=size&cursor=%s" % next)
+        (status, reason, body, headers) = response
+
+        self.assertEqual(400, status)
+
+    #---------------------------------------------------------------
+    def test_etag(self):
+
+        utils.write_file("file1.txt", "file 1 contents")
+
+        response = self.client.request("GET", "/")
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+        etag = utils.get_header("etag", headers)
+        self.assertTrue(etag)
+
+        response = self.client.request("GET", "/", {"If-None-Match": etag})
+        (status, reason, body, headers) = response
+
+        self.assertEqual(304, status)
+        self.assertEqual("", body)
+        self.assertEqual("Accept", utils.get_header("vary", headers))
+
+        # other formats and queries are other listings
+        response = self.client.request("GET", "/", {"Accept": "text/html"})
+        self.assertNotEqual(etag, utils.get_header("etag", response[3]))
+
+        response = self.client.request("GET", "/?limit=1")
+        self.assertNotEqual(etag, utils.get_header("etag", response[3]))
+
+        # a file written in place doesn't change the directory's date
+        headers  = {"If-Match": utils.get_header("etag", self.client.request("GET", "/file1.txt")[3])}
+        response = self.client.request("PUT", "/file1.txt", headers, "file 1 new contents")
+        self.assertEqual(200, response[0])
+
+        response = self.client.request("GET", "/", {"If-None-Match": etag})
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+        self.assertEqual(len("file 1 new contents"), eval(body)["dir"][0]["size"])
+
+        etag = utils.get_header("etag", headers)
+
+        # files created behind the server's back change the directory's date
+        utils.write_file("file2.txt", "file 2 contents")
+
+        response = self.client.request("GET", "/", {"If-None-Match": etag})
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+        self.assertEqual(2, len(eval(body)["dir"]))
+
+    #---------------------------------------------------------------
+    def test_columns(self):
+
+        utils.create_dir("dir1")
+        utils.write_file("file1.txt", "file 1 contents")
+        utils.write_file("file2.txt", "file 2 contents contents")
+
+        response = self.client.request("GET", "/")
+        rows = eval(response[2])["dir"]
+
+        accept = {"Accept": "application/vnd.slowebs.columns+json"}
+
+        response = self.client.request("GET", "/", accept)
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+        self.assertEqual("application/vnd.slowebs.columns+json", utils.get_header("content-type", headers))
+
+        body = eval(body)
+
+        self.assertEqual(["dir1", "file1.txt", "file2.txt"], body["name"])
+        self.assertEqual([True, False, False],               body["is_dir"])
+        self.assertEqual([row["size"] for row in rows][1:],  body["size"][1:])
+        self.assertEqual([int(row["date_ms_utc"]) for row in rows], body["date_ms_utc"])
+        self.assertFalse("date_rfc3339" in body)
+        self.assertFalse("next" in body)
+
+        response = self.client.request("GET", "/?dates=1&limit=2", accept)
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+
+        body = eval(body)
+
+        self.assertEqual(["dir1", "file1.txt"], body["name"])
+        self.assertEqual([row["date_print_local"] for row in rows][:2], body["date_print_local"])
+        self.assertEqual([row["date_rfc3339"] for row in rows][:2],     body["date_rfc3339"])
+
+        response = self.client.request("GET", "/?dates=1&limit=2&cursor=%s" % body["next"], accept)
+        body = eval(response[2])
+
+        self.assertEqual(["file2.txt"], body["name"])
+
+        # the compact format is only sent when asked for
+        for accept in ["*/*", "application/*"]:
+            response = self.client.request("GET", "/", {"Accept": accept})
+            self.assertEqual("application/json", utils.get_header("content-type", response[3]))
+
+    #---------------------------------------------------------------
+    def list_tree(self, path):
+        response = self.client.request("GET", path)
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+        self.assertEqual("application/x-ndjson", utils.get_header("content-type", headers))
+        self.assertTrue(body.endswith("\n"))
+
+        return [eval(line) for line in body.splitlines()]
+
+    #---------------------------------------------------------------
+    def test_recursive(self):
+
+        utils.create_dir("a")
+        utils.create_dir("a/b")
+        utils.create_dir("a/b/c")
+        utils.create_dir("d")
+        utils.write_file("a/x.js", "x")
+        utils.write_file("a/b/y.txt", "yy")
+        utils.write_file("a/b/c/z.js", "zzz")
+        utils.write_file("top.txt", "top")
+        os.symlink(utils.get_file_name("a"), utils.get_file_name("link"))
+
+        records = self.list_tree("/?recursive=1")
+
+        paths = [record["path"] for record in records]
+        self.assertEqual(["a", "a/b", "a/b/c", "a/b/c/z.js", "a/b/y.txt", "a/x.js", "d", "link", "top.txt"], paths)
+
+        record = records[paths.index("a/b/y.txt")]
+        self.assertEqual(False, record["is_dir"])
+        self.assertEqual(2,     record["size"])
+        self.assertFalse("date_rfc3339" in record)
+
+        self.assertEqual(True, records[paths.index("link")]["is_dir"])
+
+        records = self.list_tree("/a/?recursive=1&depth=2&dates=1")
+        self.assertEqual(["b", "b/c", "b/y.txt", "x.js"], [record["path"] for record in records])
+        self.assertTrue("date_rfc3339" in records[0])
+
+        records = self.list_tree("/?recursive=1&include=*.js")
+        self.assertEqual(["a/b/c/z.js", "a/x.js"], [record["path"] for record in records])
+
+        records = self.list_tree("/?recursive=1&exclude=b&exclude=link&include=*.js&include=*.txt")
+        self.assertEqual(["a/x.js", "top.txt"], [record["path"] for record in records])
+
+        for query in ["recursive=1&limit=10", "recursive=1&sort=size", "depth=2", "include=*.js", "recursive=1&depth=0"]:
+            response = self.client.request("GET", "/?" + query)
+            self.assertEqual(400, response[0], query)
+
     #---------------------------------------------------------------
     def test_not_found(self):
 
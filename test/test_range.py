@@ -0,0 +1,144 @@
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+import os
+import re
+import sys
+import unittest
+
+import utils
+
+false = False
+true  = True
+
+#-------------------------------------------------------------------
+class Test(unittest.TestCase):
+    
+    #---------------------------------------------------------------
+    def setUp(self):
+        print
+        self.client = utils.Client()
+        utils.delete_dir("")
+        utils.create_dir("")
+
+        self.contents = "0123456789abcdefghijklmnopqrstuvwxyz"
+        utils.write_file("file.txt", self.contents)
+        
+    def tearDown(self):
+        utils.delete_dir("")
+
+    #---------------------------------------------------------------
+    def test_accept_ranges(self):
+
+        response = self.client.request("GET", "/file.txt")
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+        self.assertEqual("bytes", utils.get_header("accept-ranges", headers))
+
+    #---------------------------------------------------------------
+    def test_single(self):
+
+        for (range, first, last) in [("bytes=0-9", 0, 9), ("bytes=30-", 30, 35), ("bytes=-6", 30, 35), ("bytes=10-1000", 10, 35)]:
+            response = self.client.request("GET", "/file.txt", {"Range": range})
+            (status, reason, body, headers) = response
+
+            content_range  = utils.get_header("content-range",  headers)
+            content_length = utils.get_header("content-length", headers)
+
+            self.assertEqual(206, status)
+            self.assertEqual(self.contents[first:last+1], body)
+            self.assertEqual(last - first + 1, int(content_length))
+            self.assertEqual("bytes %d-%d/%d" % (first, last, len(self.contents)), content_range)
+
+    #---------------------------------------------------------------
+    def test_multiple(self):
+
+        response = self.client.request("GET", "/file.txt", {"Range": "bytes=0-1,10-11,-2"})
+        (status, reason, body, headers) = response
+
+        content_type   = utils.get_header("content-type",   headers)
+        content_length = utils.get_header("content-length", headers)
+
+        self.assertEqual(206, status)
+        self.assertEqual(len(body), int(content_length))
+
+        match = re.match(r'^multipart/byteranges; boundary=(\w+)$', content_type)
+        self.assertTrue(match != None)
+        boundary = match.group(1)
+
+        parts = body.split("\r\n--%s" % boundary)
+        self.assertEqual("", parts[0])
+        self.assertEqual("--\r\n", parts[-1])
+
+        parts = [part.split("\r\n\r\n", 1) for part in parts[1:-1]]
+        self.assertEqual(["01", "ab", "yz"], [part[1] for part in parts])
+        self.assertTrue("Content-Range: bytes 10-11/36" in parts[1][0])
+
+    #---------------------------------------------------------------
+    def test_not_satisfiable(self):
+
+        response = self.client.request("GET", "/file.txt", {"Range": "bytes=100-200"})
+        (status, reason, body, headers) = response
+
+        self.assertEqual(416, status)
+        self.assertEqual("bytes */36", utils.get_header("content-range", headers))
+
+    #---------------------------------------------------------------
+    def test_ignored(self):
+
+        for range in ["bytes=9-1", "lines=0-1", "bytes=x-y"]:
+            response = self.client.request("GET", "/file.txt", {"Range": range})
+            (status, reason, body, headers) = response
+
+            self.assertEqual(200, status)
+            self.assertEqual(self.contents, body)
+
+        response = self.client.request("HEAD", "/file.txt", {"Range": "bytes=0-1"})
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+
+    #---------------------------------------------------------------
+    def test_if_range(self):
+
+        response = self.client.request("GET", "/file.txt")
+        (status, reason, body, headers) = response
+
+        etag          = utils.get_header("etag",          headers)
+        last_modified = utils.get_header("last-modified", headers)
+
+        for if_range in [etag, last_modified]:
+            response = self.client.request("GET", "/file.txt", {"Range": "bytes=0-1", "If-Range": if_range})
+            (status, reason, body, headers) = response
+
+            self.assertEqual(206, status)
+            self.assertEqual("01", body)
+
+        for if_range in ['"not-the-etag"', "W/" + etag, "Thu, 01 Jan 1970 00:00:00 GMT"]:
+            response = self.client.request("GET", "/file.txt", {"Range": "bytes=0-1", "If-Range": if_range})
+            (status, reason, body, headers) = response
+
+            self.assertEqual(200, status)
+            self.assertEqual(self.contents, body)
@@ -141,4 +141,108 @@ class Test(unittest.TestCase):
         (status, reason, body, headers) = response
 
         self.assertEqual(status, 200)
-        self.assertEquals(file1contents, body)
\ No newline at end of file
+        self.assertEquals(file1contents, body)
+
+    #---------------------------------------------------------------
+    def test_ifnonematch_lists(self):
+
+        utils.write_file("file.txt", "file 1 contents")
+
+        (status, reason, body, headers) = self.client.request("GET", "/file.txt")
+        etag = utils.get_header("etag", headers)
+
+        for (if_none_match, expected) in [
+            ('"other", %s' % etag,  304),
+            ('"other",%s,"more"' % etag, 304),
+            ('W/%s' % etag,         304),
+            ('*',                   304),
+            ('"other", W/"more"',   200),
+            (etag[1:-1],            200),
+        ]:
+            for method in ["GET", "HEAD"]:
+                headers = {"If-None-Match": if_none_match}
+                (status, reason, body, headers) = self.client.request(method, "/file.txt", headers)
+                self.assertEqual(expected, status, "%s %s" % (method, if_none_match))
+
+            if expected == 304:
+                self.assertEqual(etag, utils.get_header("etag", headers))
+
+        (status, reason, body, headers) = self.client.request("GET", "/missing.txt", {"If-None-Match": "*"})
+        self.assertEqual(404, status)
+
+    #---------------------------------------------------------------
+    def test_ifmodifiedsince(self):
+
+        utils.write_file("file.txt", "file 1 contents")
+        os.utime(utils.get_file_name("file.txt"), (1000000000, 1000000000))
+
+        (status, reason, body, headers) = self.client.request("GET", "/file.txt")
+        last_modified = utils.get_header("last-modified", headers)
+        etag          = utils.get_header("etag", headers)
+        self.assertEqual("Sun, 09 Sep 2001 01:46:40 GMT", last_modified)
+
+        for (if_modified_since, expected) in [
+            (last_modified,                        304),
+            ("Sun, 09 Sep 2001 01:46:41 GMT",      304),
+            ("Sunday, 09-Sep-01 01:46:40 GMT",     304),
+            ("Sun Sep  9 01:46:40 2001",           304),
+            ("Sun, 09 Sep 2001 01:46:39 GMT",      200),
+            ("not a date",                         200),
+        ]:
+            headers = {"If-Modified-Since": if_modified_since}
+            (status, reason, body, headers) = self.client.request("GET", "/file.txt", headers)
+            self.assertEqual(expected, status, if_modified_since)
+
+        # If-None-Match wins over If-Modified-Since
+        headers = {"If-Modified-Since": last_modified, "If-None-Match": '"other"'}
+        (status, reason, body, headers) = self.client.request("GET", "/file.txt", headers)
+        self.assertEqual(200, status)
+
+        # If-Match and If-Unmodified-Since are checked for GETs too
+        headers = {"If-Match": '"other"'}
+        (status, reason, body, headers) = self.client.request("GET", "/file.txt", headers)
+        self.assertEqual(412, status)
+
+        headers = {"If-Match": '"other", %s' % etag}
+        (status, reason, body, headers) = self.client.request("GET", "/file.txt", headers)
+        self.assertEqual(200, status)
+
+        headers = {"If-Unmodified-Since": "Sun, 09 Sep 2001 01:46:39 GMT"}
+        (status, reason, body, headers) = self.client.request("GET", "/file.txt", headers)
+        self.assertEqual(412, status)
+
+        headers = {"If-Unmodified-Since": last_modified}
+        (status, reason, body, headers) = self.client.request("GET", "/file.txt", headers)
+        self.assertEqual(200, status)
+
+    #---------------------------------------------------------------
+    def test_large(self):
+
+        file1contents = "".join([chr(index % 256) for index in range(1000 * 1000)])
+        utils.write_file("file.bin", file1contents)
+
+        response = self.client.request("GET", "/file.bin")
+        (status, reason, body, headers) = response
+
+        content_length = utils.get_header("content-length", headers)
+
+        self.assertEqual(200, status)
+        self.assertEqual(len(file1contents), int(content_length))
+        self.assertTrue(file1contents == body)
+
+    #---------------------------------------------------------------
+    def test_head(self):
+
+        file1contents = "file 1 contents"
+        utils.write_file("file.txt", file1contents)
+
+        response = self.client.request("HEAD", "/file.txt")
+        (status, reason, body, headers) = response
+
+        content_length = utils.get_header("content-length", headers)
+        etag           = utils.get_header("etag",           headers)
+
+        self.assertEqual(200, status)
+        self.assertEqual("", body)
+        self.assertEqual(len(file1contents), int(content_length))
+        self.assertTrue(etag != None)
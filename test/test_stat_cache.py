@@ -0,0 +1,234 @@
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import time
+import json
+import unittest
+
+import utils
+
+false = False
+true  = True
+
+#-------------------------------------------------------------------
+# files changed behind the server's back, while it caches stats
+#-------------------------------------------------------------------
+class Test(unittest.TestCase):
+
+    options = ["--stat-cache", "inotify", "--list-cache-bytes", "100000"]
+    inotify = True
+    
+    #---------------------------------------------------------------
+    def setUp(self):
+        print
+        self.port   = utils.get_port() + 1
+        self.client = utils.Client(self.port)
+        utils.delete_dir("")
+        utils.create_dir("")
+
+        self.server = utils.Server(self.options, self.port)
+        self.server.start()
+        
+    def tearDown(self):
+        self.server.stop()
+        utils.delete_dir("")
+
+    #---------------------------------------------------------------
+    def get(self, url, headers={}):
+        (status, reason, body, headers) = self.client.request("GET", url, headers)
+        return (status, body, utils.get_header("etag", headers))
+
+    #---------------------------------------------------------------
+    def list_sizes(self, url):
+        (status, body, etag) = self.get(url)
+        self.assertEqual(200, status)
+
+        sizes = dict((entry["name"], entry["size"]) for entry in json.loads(body)["dir"])
+        return (sizes, etag)
+
+    #---------------------------------------------------------------
+    def test_modified(self):
+        utils.write_file("file.txt", "contents")
+
+        (status, body, etag1) = self.get("/file.txt")
+        self.assertEqual("contents", body)
+
+        utils.write_file("file.txt", "new contents")
+
+        (status, body, etag2) = self.get("/file.txt")
+        self.assertEqual(200, status)
+        self.assertEqual("new contents", body)
+        self.assertNotEqual(etag1, etag2)
+
+        # same size, new date
+        os.utime(utils.get_file_name("file.txt"), (1000000000, 1000000000))
+
+        (status, body, etag3) = self.get("/file.txt")
+        self.assertEqual('"1000000000-12"', etag3)
+
+        (status, body, etag) = self.get("/file.txt", {"If-None-Match": etag2})
+        self.assertEqual(200, status)
+
+    #---------------------------------------------------------------
+    def test_deleted_and_created(self):
+        utils.write_file("file.txt", "contents")
+
+        (status, body, etag) = self.get("/file.txt")
+        self.assertEqual(200, status)
+
+        os.remove(utils.get_file_name("file.txt"))
+
+        (status, body, etag) = self.get("/file.txt")
+        self.assertEqual(404, status)
+
+        (status, body, etag) = self.get("/other.txt")
+        self.assertEqual(404, status)
+
+        utils.write_file("other.txt", "other contents")
+
+        (status, body, etag) = self.get("/other.txt")
+        self.assertEqual(200, status)
+        self.assertEqual("other contents", body)
+
+    #---------------------------------------------------------------
+    def test_listing(self):
+        utils.create_dir("dir")
+        utils.write_file("dir/a.txt", "a")
+
+        (sizes, etag1) = self.list_sizes("/dir/")
+        self.assertEqual({"a.txt": 1}, sizes)
+
+        utils.write_file("dir/b.txt", "bb")
+
+        (sizes, etag2) = self.list_sizes("/dir/")
+        self.assertEqual({"a.txt": 1, "b.txt": 2}, sizes)
+        self.assertNotEqual(etag1, etag2)
+
+        # a file written in place doesn't change its directory's date;
+        # only inotify says the listing changed
+        if self.inotify:
+            utils.write_file("dir/a.txt", "aaa")
+
+            (sizes, etag3) = self.list_sizes("/dir/")
+            self.assertEqual({"a.txt": 3, "b.txt": 2}, sizes)
+            self.assertNotEqual(etag2, etag3)
+
+        os.remove(utils.get_file_name("dir/a.txt"))
+        utils.write_file("dir/a.txt", "aaa")
+
+        os.remove(utils.get_file_name("dir/b.txt"))
+
+        (sizes, etag4) = self.list_sizes("/dir/")
+        self.assertEqual({"a.txt": 3}, sizes)
+
+    #---------------------------------------------------------------
+    def test_dir_moved(self):
+        utils.create_dir("dir1/sub")
+        utils.write_file("dir1/sub/file.txt", "contents")
+
+        (status, body, etag) = self.get("/dir1/sub/file.txt")
+        self.assertEqual(200, status)
+
+        os.rename(utils.get_file_name("dir1"), utils.get_file_name("dir2"))
+
+        (status, body, etag) = self.get("/dir1/sub/file.txt")
+        self.assertEqual(404, status)
+
+        (status, body, etag) = self.get("/dir2/sub/file.txt")
+        self.assertEqual("contents", body)
+
+        utils.write_file("dir2/sub/file.txt", "new contents")
+
+        (status, body, etag) = self.get("/dir2/sub/file.txt")
+        self.assertEqual("new contents", body)
+
+        utils.create_dir("dir1/sub")
+        utils.write_file("dir1/sub/file.txt", "other contents")
+
+        (status, body, etag) = self.get("/dir1/sub/file.txt")
+        self.assertEqual("other contents", body)
+
+    #---------------------------------------------------------------
+    def test_dir_replaced(self):
+        utils.create_dir("name")
+        utils.write_file("name/file.txt", "contents")
+
+        (sizes, etag) = self.list_sizes("/name/")
+        self.assertEqual({"file.txt": 8}, sizes)
+
+        utils.delete_dir("name")
+        utils.write_file("name", "now a file")
+
+        (status, body, etag) = self.get("/name")
+        self.assertEqual(200, status)
+        self.assertEqual("now a file", body)
+
+        (status, body, etag) = self.get("/name/")
+        self.assertEqual(404, status)
+
+    #---------------------------------------------------------------
+    def test_put(self):
+        utils.write_file("file.txt", "contents")
+
+        (status, body, etag) = self.get("/file.txt")
+
+        headers = {"If-Match": etag}
+        (status, reason, body, headers) = self.client.request("PUT", "/file.txt", headers, "new contents")
+        self.assertEqual(200, status)
+
+        (status, body, etag) = self.get("/file.txt")
+        self.assertEqual("new contents", body)
+
+    #---------------------------------------------------------------
+    # a link's target changing has no event where the link is watched
+    def test_link_target_changed(self):
+        utils.create_dir("a")
+        utils.create_dir("b")
+        utils.write_file("b/file.txt", "1")
+        os.symlink("../b/file.txt", utils.get_file_name("a/link.txt"))
+
+        (status, body, etag1) = self.get("/a/link.txt")
+        self.assertEqual("1", body)
+
+        utils.write_file("b/file.txt", "55555")
+        time.sleep(1.2)
+
+        (status, body, etag2) = self.get("/a/link.txt")
+        self.assertEqual(200, status)
+        self.assertEqual("55555", body)
+        self.assertNotEqual(etag1, etag2)
+
+#-------------------------------------------------------------------
+# without inotify, stats are cached for a time
+#-------------------------------------------------------------------
+class Test_TTL(Test):
+
+    options = ["--stat-cache", "ttl", "--stat-cache-ttl", "0.2", "--list-cache-bytes", "100000"]
+    inotify = False
+
+    def get(self, url, headers={}):
+        time.sleep(0.3)
+        return Test.get(self, url, headers)
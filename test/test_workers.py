@@ -0,0 +1,92 @@
+#-----------------------------------------------------------------------------
+# The MIT License
+# 
+# Copyright (c) 2009 Patrick Mueller
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#-----------------------------------------------------------------------------
+
+import os
+import sys
+import socket
+import unittest
+
+import utils
+
+false = False
+true  = True
+
+#-------------------------------------------------------------------
+class Test(unittest.TestCase):
+    
+    #---------------------------------------------------------------
+    def setUp(self):
+        print
+        self.port   = utils.get_port() + 1
+        self.client = utils.Client(self.port)
+        utils.delete_dir("")
+        utils.create_dir("")
+
+        self.server = utils.Server(["--workers", "4"], self.port)
+        self.server.start()
+        
+    def tearDown(self):
+        self.server.stop()
+        utils.delete_dir("")
+
+    #---------------------------------------------------------------
+    def test_slow_client_does_not_block(self):
+
+        file1contents = "file 1 contents"
+        utils.write_file("file.txt", file1contents)
+
+        # a client which has only sent part of its request
+        slow = socket.create_connection(("localhost", self.port))
+        slow.sendall("GET /file.txt HTTP/1.0\r\n")
+
+        try:
+            response = self.client.request("GET", "/file.txt")
+            (status, reason, body, headers) = response
+
+            self.assertEqual(200, status)
+            self.assertEqual(file1contents, body)
+
+            slow.sendall("\r\n")
+            slow.settimeout(5)
+            response = slow.makefile().read()
+
+            self.assertTrue(response.startswith("HTTP/1.1 200"))
+            self.assertTrue(response.endswith(file1contents))
+        finally:
+            slow.close()
+
+    #---------------------------------------------------------------
+    def test_many_requests(self):
+
+        utils.create_dir("dir1")
+        utils.write_file("dir1/file.txt", "file contents")
+
+        for index in range(20):
+            response = self.client.request("GET", "/dir1/")
+            (status, reason, body, headers) = response
+            self.assertEqual(200, status)
+
+            response = self.client.request("GET", "/dir1/file.txt")
+            (status, reason, body, headers) = response
+            self.assertEqual(200, status)
@@ -25,6 +25,7 @@
 import os
 import re
 import sys
+import tempfile
 import unittest
 
 import utils
@@ -133,3 +134,314 @@ class Test(unittest.TestCase):
         self.assertEqual(200, status)
         self.assertTrue(etag1 != etag2)
         
+
+        response = self.client.request("GET", "/file.txt")
+        (status, reason, body, headers) = response
+
+        self.assertEqual(file1contents, body)
+        self.assertEqual(etag2, utils.get_header("etag", headers))
+
+    #---------------------------------------------------------------
+    def test_update_conditions(self):
+
+        utils.write_file("file.txt", "file 1 contents")
+        os.utime(utils.get_file_name("file.txt"), (1000000000, 1000000000))
+
+        response = self.client.request("GET", "/file.txt")
+        etag = utils.get_header("etag", response[3])
+
+        for (if_match, expected) in [
+            ('W/%s' % etag,         412),
+            ('"other"',             412),
+            ('"other", %s' % etag,  200),
+            ('*',                   200),
+        ]:
+            utils.write_file("file.txt", "file 1 contents")
+            os.utime(utils.get_file_name("file.txt"), (1000000000, 1000000000))
+
+            headers = {"If-Match": if_match}
+            (status, reason, body, headers) = self.client.request("PUT", "/file.txt", headers, "new contents")
+            self.assertEqual(expected, status, if_match)
+
+        utils.write_file("file.txt", "file 1 contents")
+        os.utime(utils.get_file_name("file.txt"), (1000000000, 1000000000))
+
+        # If-Unmodified-Since only counts without If-Match
+        headers = {"If-Match": etag, "If-Unmodified-Since": "Sun, 09 Sep 2001 01:46:39 GMT"}
+        (status, reason, body, headers) = self.client.request("PUT", "/file.txt", headers, "new contents")
+        self.assertEqual(200, status)
+        self.assertEqual("new contents", utils.read_file("file.txt"))
+
+    #---------------------------------------------------------------
+    def test_large(self):
+
+        contents = "".join([chr(index % 256) for index in range(256)]) * 4096 * 5
+
+        headers = {"If-None-Match": "*"}
+        response = self.client.request("PUT", "/file.bin", headers, contents)
+        (status, reason, body, headers) = response
+
+        self.assertEqual(201, status)
+        self.assertEqual(contents, utils.read_file("file.bin"))
+
+    #---------------------------------------------------------------
+    def test_mode(self):
+
+        headers = {"If-None-Match": "*"}
+        response = self.client.request("PUT", "/file.txt", headers, "file 1 contents")
+        (status, reason, body, headers) = response
+
+        self.assertEqual(201, status)
+
+        umask = os.umask(0)
+        os.umask(umask)
+
+        file_name = utils.get_file_name("file.txt")
+        self.assertEqual(0666 & ~umask, os.stat(file_name).st_mode & 0777)
+
+        os.chmod(file_name, 0640)
+
+        headers = {"If-Match": utils.get_header("etag", headers)}
+        response = self.client.request("PUT", "/file.txt", headers, "file 1 contents - even more!")
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+        self.assertEqual(0640, os.stat(file_name).st_mode & 0777)
+
+    #---------------------------------------------------------------
+    def test_short_body(self):
+
+        utils.write_file("file.txt", "file 1 contents")
+
+        response = self.client.request("GET", "/file.txt")
+        etag = utils.get_header("etag", response[3])
+
+        response = utils.send_raw(
+            "PUT /file.txt HTTP/1.0\r\n" +
+            "If-Match: %s\r\n" % etag +
+            "Content-Length: 100\r\n" +
+            "\r\n" +
+            "only ten b"
+        )
+
+        self.assertTrue(response.startswith("HTTP/1.0 400"), response)
+
+        self.assertEqual("file 1 contents", utils.read_file("file.txt"))
+        self.assertEqual(["file.txt"], os.listdir(utils.get_root()))
+
+    #---------------------------------------------------------------
+    def test_negative_length(self):
+
+        utils.write_file("file.txt", "file 1 contents")
+
+        response = self.client.request("GET", "/file.txt")
+        etag = utils.get_header("etag", response[3])
+
+        response = utils.send_raw(
+            "PUT /file.txt HTTP/1.0\r\n" +
+            "If-Match: %s\r\n" % etag +
+            "Content-Length: -1\r\n" +
+            "\r\n"
+        )
+
+        self.assertTrue(response.startswith("HTTP/1.0 400"), response)
+
+        self.assertEqual("file 1 contents", utils.read_file("file.txt"))
+        self.assertEqual(["file.txt"], os.listdir(utils.get_root()))
+
+    #---------------------------------------------------------------
+    def test_chunked(self):
+
+        chunks = ["file 1 ", "contents", "x" * 100000]
+
+        response = utils.chunked_put("/file.txt", {"If-None-Match": "*"}, chunks)
+        self.assertTrue(response.startswith("HTTP/1.0 201"), response)
+        self.assertEqual("".join(chunks), utils.read_file("file.txt"))
+
+        etag = utils.get_header("etag", self.client.request("GET", "/file.txt")[3])
+
+        # chunk extensions and trailers are ignored
+        response = utils.send_raw(
+            "PUT /file.txt HTTP/1.1\r\n" +
+            "Connection: close\r\n" +
+            "If-Match: %s\r\n" % etag +
+            "Transfer-Encoding: chunked\r\n" +
+            "\r\n" +
+            "5;name=value\r\nfile \r\n" +
+            "A\r\n2 contents\r\n" +
+            "0\r\n" +
+            "Trailer: value\r\n" +
+            "\r\n"
+        )
+        self.assertTrue(response.startswith("HTTP/1.0 200"), response)
+        self.assertEqual("file 2 contents", utils.read_file("file.txt"))
+
+    #---------------------------------------------------------------
+    def test_chunked_bad(self):
+
+        response = utils.send_raw(
+            "PUT /file.txt HTTP/1.1\r\n" +
+            "Connection: close\r\n" +
+            "If-None-Match: *\r\n" +
+            "Transfer-Encoding: chunked\r\n" +
+            "\r\n" +
+            "zz\r\nfile \r\n"
+        )
+        self.assertTrue(response.startswith("HTTP/1.0 400"), response)
+
+        response = utils.send_raw(
+            "PUT /file.txt HTTP/1.1\r\n" +
+            "Connection: close\r\n" +
+            "If-None-Match: *\r\n" +
+            "Transfer-Encoding: chunked\r\n" +
+            "\r\n" +
+            "10\r\nfile \r\n"
+        )
+        self.assertTrue(response.startswith("HTTP/1.0 400"), response)
+
+        response = utils.send_raw(
+            "PUT /file.txt HTTP/1.1\r\n" +
+            "Connection: close\r\n" +
+            "If-None-Match: *\r\n" +
+            "Transfer-Encoding: gzip\r\n" +
+            "\r\n"
+        )
+        self.assertTrue(response.startswith("HTTP/1.0 501"), response)
+
+        self.assertEqual([], os.listdir(utils.get_root()))
+
+    #---------------------------------------------------------------
+    def test_max_body_bytes(self):
+
+        port   = int(utils.get_port()) + 1
+        client = utils.Client(port)
+        server = utils.Server(["--max-body-bytes", "100"], port)
+        server.start()
+        try:
+            headers = {"If-None-Match": "*"}
+            response = client.request("PUT", "/file.txt", headers, "x" * 101)
+            self.assertEqual(413, response[0])
+
+            response = utils.chunked_put("/file.txt", headers, ["x" * 50, "x" * 51], port)
+            self.assertTrue(response.startswith("HTTP/1.0 413"), response)
+
+            self.assertEqual([], os.listdir(utils.get_root()))
+
+            response = utils.chunked_put("/file.txt", headers, ["x" * 50, "x" * 50], port)
+            self.assertTrue(response.startswith("HTTP/1.0 201"), response)
+        finally:
+            server.stop()
+
+    #---------------------------------------------------------------
+    def test_temp_files_hidden(self):
+
+        utils.write_file(".slowebs-tmp-abc", "left over")
+
+        response = self.client.request("GET", "/.slowebs-tmp-abc")
+        self.assertEqual(404, response[0])
+
+        response = self.client.request("GET", "/")
+        self.assertEqual(0, len(eval(response[2])["dir"]))
+
+        headers = {"If-None-Match": "*"}
+        response = self.client.request("PUT", "/.slowebs-tmp-def", headers, "contents")
+        self.assertEqual(404, response[0])
+
+    #---------------------------------------------------------------
+    def test_fsync(self):
+
+        port   = int(utils.get_port()) + 1
+        client = utils.Client(port)
+        server = utils.Server(["--fsync", "dir"], port)
+        server.start()
+        try:
+            headers = {"If-None-Match": "*"}
+            response = client.request("PUT", "/file.txt", headers, "file 1 contents")
+            (status, reason, body, headers) = response
+
+            self.assertEqual(201, status)
+
+            headers = {"If-Match": utils.get_header("etag", headers)}
+            response = client.request("PUT", "/file.txt", headers, "file 1 contents - even more!")
+            (status, reason, body, headers) = response
+
+            self.assertEqual(200, status)
+            self.assertEqual("file 1 contents - even more!", utils.read_file("file.txt"))
+        finally:
+            server.stop()
+
+    #---------------------------------------------------------------
+    def test_elide_writes(self):
+
+        port   = int(utils.get_port()) + 1
+        client = utils.Client(port)
+        server = utils.Server(["--elide-writes"], port)
+        server.start()
+        try:
+            utils.write_file("file.txt", "file 1 contents")
+            file_name = utils.get_file_name("file.txt")
+            os.utime(file_name, (1000000000, 1000000000))
+            inode = os.stat(file_name).st_ino
+
+            etag = utils.get_header("etag", client.request("GET", "/file.txt", {}, "")[3])
+
+            headers = {"If-Match": etag}
+            (status, reason, body, headers) = client.request("PUT", "/file.txt", headers, "file 1 contents")
+            self.assertEqual(200, status)
+            self.assertEqual(etag, utils.get_header("etag", headers))
+            self.assertEqual(1000000000, os.stat(file_name).st_mtime)
+            self.assertEqual(inode, os.stat(file_name).st_ino)
+
+            response = utils.chunked_put("/file.txt", {"If-Match": etag}, ["file 1 ", "contents"], port)
+            self.assertTrue(response.startswith("HTTP/1.0 200"), response)
+            self.assertTrue(etag in response, response)
+            self.assertEqual(inode, os.stat(file_name).st_ino)
+
+            # same size, different contents
+            headers = {"If-Match": etag}
+            (status, reason, body, headers) = client.request("PUT", "/file.txt", headers, "file 2 contents")
+            self.assertEqual(200, status)
+            self.assertNotEqual(etag, utils.get_header("etag", headers))
+            self.assertEqual("file 2 contents", utils.read_file("file.txt"))
+
+            headers = {"If-Match": utils.get_header("etag", headers)}
+            (status, reason, body, headers) = client.request("PUT", "/file.txt", headers, "file 2 contents, longer")
+            self.assertEqual(200, status)
+            self.assertEqual("file 2 contents, longer", utils.read_file("file.txt"))
+
+            self.assertEqual(["file.txt"], os.listdir(utils.get_root()))
+        finally:
+            server.stop()
+
+    #---------------------------------------------------------------
+    def test_symlink(self):
+
+        utils.write_file("real.txt", "file 1 contents")
+        os.symlink("real.txt", utils.get_file_name("link.txt"))
+
+        etag = utils.get_header("etag", self.client.request("GET", "/link.txt")[3])
+
+        headers = {"If-Match": etag}
+        response = self.client.request("PUT", "/link.txt", headers, "file 1 contents - even more!")
+        (status, reason, body, headers) = response
+
+        self.assertEqual(200, status)
+        self.assertTrue(os.path.islink(utils.get_file_name("link.txt")))
+        self.assertEqual("file 1 contents - even more!", utils.read_file("real.txt"))
+        self.assertEqual(["link.txt", "real.txt"], sorted(os.listdir(utils.get_root())))
+
+        # links out of the root aren't written through
+        (fd, outside_name) = tempfile.mkstemp()
+        try:
+            os.write(fd, "outside contents")
+            os.close(fd)
+            os.symlink(outside_name, utils.get_file_name("outside.txt"))
+
+            etag = utils.get_header("etag", self.client.request("GET", "/outside.txt")[3])
+
+            headers = {"If-Match": etag}
+            response = self.client.request("PUT", "/outside.txt", headers, "new contents")
+            self.assertEqual(403, response[0])
+            self.assertEqual("outside contents", open(outside_name).read())
+        finally:
+            os.remove(outside_name)
@@ -26,6 +26,7 @@ import os
 import sys
 import time
 import shutil
+import socket
 import httplib
 import subprocess
 
@@ -49,17 +50,20 @@ class Server:
     #-------------------------------------------------------------------------
     # initialize
     #-------------------------------------------------------------------------
-    def __init__(self):
-        self.port      = str(get_port())
+    def __init__(self, options=(), port=None):
+        if port is None: port = get_port()
+
+        self.port      = str(port)
         self.root      = get_root()
         self.mimetypes = get_mimetypes()
+        self.options   = tuple(options)
     
     #-------------------------------------------------------------------------
     # start a server
     #-------------------------------------------------------------------------
     def start(self):
 #        print "Server.start():"
-        args = ("python", "../slowebs.py", self.port, self.root, self.mimetypes)
+        args = ("python", "../slowebs.py") + self.options + (self.port, self.root, self.mimetypes)
         self.process = subprocess.Popen(args, 
             executable="python", 
             stdin=subprocess.PIPE,
@@ -89,8 +93,10 @@ class Client:
     #-------------------------------------------------------------------------
     # initialize
     #-------------------------------------------------------------------------
-    def __init__(self):
-        self.port = get_port()
+    def __init__(self, port=None):
+        if port is None: port = get_port()
+
+        self.port = port
         
     #-------------------------------------------------------------------------
     # issue a request, returns (status, reason, body, headers)
@@ -112,6 +118,40 @@ class Client:
         
         return result
 
+#-----------------------------------------------------------------------------
+# send raw request data, returning the raw response once the server closes
+#-----------------------------------------------------------------------------
+def send_raw(data, port=None):
+    if port is None: port = get_port()
+
+    connection = socket.create_connection(("localhost", int(port)))
+    connection.sendall(data)
+    connection.shutdown(socket.SHUT_WR)
+
+    response = ""
+    while True:
+        data = connection.recv(4096)
+        if not data: break
+        response += data
+    connection.close()
+
+    return response
+
+#-----------------------------------------------------------------------------
+# make a chunked PUT request, with the body sent in the given chunks
+#-----------------------------------------------------------------------------
+def chunked_put(url, headers, chunks, port=None):
+    request = "PUT %s HTTP/1.1\r\nConnection: close\r\nTransfer-Encoding: chunked\r\n" % url
+    for (key, value) in headers.items():
+        request += "%s: %s\r\n" % (key, value)
+    request += "\r\n"
+
+    for chunk in chunks:
+        request += "%x\r\n%s\r\n" % (len(chunk), chunk)
+    request += "0\r\n\r\n"
+
+    return send_raw(request, port)
+
 #-----------------------------------------------------------------------------
 # get server url base
 #-----------------------------------------------------------------------------